@@ -1,11 +1,163 @@
+import itertools
 import os
+import queue
+import threading
+import time
 import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
-from pathlib import Path
-import random
-import re
-from datetime import datetime
-from typing import List, Tuple, Optional
+from dataclasses import replace
+from tkinter import filedialog, messagebox, simpledialog, ttk
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from renamer import RenameCancelled, RenameConfig, RenameEngine, RenamePlan, RenameResult, RenamerError
+from renamer.jobs import DEFAULT_JOBS, JobManifest, JobReport, JobRunner
+from renamer.journal import Journal, recover, redo_last, undo_last
+from renamer.metrics import PROFILE_MODES, Metrics, profiled
+from renamer.rules import (RULE_KINDS, RuleError, compile_rules, delete_preset, describe_rule, get_preset,
+                           load_presets, save_preset)
+
+if TYPE_CHECKING:
+    from renamer.aio import AsyncBackend
+
+POLL_INTERVAL_MS = 50  # How often the Tk loop drains the worker queue
+PROGRESS_INTERVAL = 0.1  # Seconds between progress updates sent by the worker
+
+# What the two Add Rule fields mean for each rule kind
+RULE_HINTS = {
+    "replace": "Regex to find, and its replacement (\\1 for groups)",
+    "strip": "Characters to remove, and where: all (default), ends, start or end",
+    "transliterate": "Characters and their replacements of equal length, or 'ascii' in the first field",
+    "trim": "Maximum length of the name; the extension is kept",
+    "case": "upper, lower or title, and optionally a regex whose first group (or match) is changed",
+}
+
+
+class VirtualTable:
+    """Treeview that only materializes the rows currently on screen.
+    
+    Row data stays in the caller's sequence and is fetched through get_row;
+    scrolling re-fills a small pool of Treeview items instead of inserting
+    one item per row, so showing a million rows costs the same as twenty.
+    """
+    
+    def __init__(self, parent: tk.Widget, columns: Sequence[Tuple[str, str, int]], height: int = 12) -> None:
+        self.tree = ttk.Treeview(parent, columns=[c[0] for c in columns], show="headings",
+                                 height=height, selectmode="browse")
+        for name, heading, width in columns:
+            self.tree.heading(name, text=heading)
+            self.tree.column(name, width=width)
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.yview)
+        
+        self.count = 0
+        self.get_row: Callable[[int], Tuple[str, ...]] = lambda index: ()
+        self.top = 0  # Index of the first visible row
+        self.visible = height
+        self.selected: Optional[int] = None
+        self.metrics: Optional[Metrics] = None  # Times refreshes as "table_refresh" when set
+        self.header_height = 0
+        self.row_height = 0
+        
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, "units", 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-1, "units", 3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(1, "units", 3))
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.scroll(-1, "pages"))
+        self.tree.bind("<Next>", lambda e: self.scroll(1, "pages"))
+    
+    def set_rows(self, count: int, get_row: Callable[[int], Tuple[str, ...]]) -> None:
+        """Show count rows, row i being get_row(i)"""
+        self.count = count
+        self.get_row = get_row
+        self.top = 0
+        self.selected = None
+        self.refresh()
+    
+    def clear(self) -> None:
+        self.set_rows(0, lambda index: ())
+    
+    def yview(self, *args: str) -> None:
+        """Scrollbar command"""
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * self.count)
+            self.refresh()
+        elif args[0] == "scroll":
+            self.scroll(int(args[1]), args[2])
+    
+    def scroll(self, amount: int, what: str, step: int = 1) -> str:
+        self.top += amount * (self.visible if what == "pages" else step)
+        self.refresh()
+        return "break"
+    
+    def move_selection(self, delta: int) -> str:
+        if self.count:
+            current = self.selected if self.selected is not None else self.top - delta
+            self.see(max(0, min(self.count - 1, current + delta)))
+        return "break"
+    
+    def see(self, index: int) -> None:
+        """Scroll so that row index is visible and select it"""
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.visible:
+            self.top = index - self.visible + 1
+        self.selected = index
+        self.refresh()
+    
+    def on_select(self, event: tk.Event) -> None:
+        selection = self.tree.selection()
+        if selection:
+            self.selected = self.top + int(selection[0])
+    
+    def on_resize(self, event: tk.Event) -> None:
+        if self.row_height:
+            visible = max(1, (event.height - self.header_height) // self.row_height)
+            if visible != self.visible:
+                self.visible = visible
+                self.refresh()
+    
+    def refresh(self) -> None:
+        """Fill the item pool with the rows of the current window"""
+        start = time.perf_counter()
+        self.top = max(0, min(self.top, self.count - self.visible))
+        rows = max(0, min(self.visible, self.count - self.top))
+        
+        children = self.tree.get_children()
+        if len(children) > rows:
+            self.tree.delete(*children[rows:])
+        for slot in range(len(children), rows):
+            self.tree.insert("", tk.END, iid=str(slot))
+        for slot in range(rows):
+            self.tree.item(str(slot), values=self.get_row(self.top + slot))
+        
+        if self.selected is not None and self.top <= self.selected < self.top + rows:
+            self.tree.selection_set(str(self.selected - self.top))
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+        
+        if self.count:
+            self.scrollbar.set(self.top / self.count, (self.top + rows) / self.count)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        
+        # Measure the real row geometry once rows exist, so resizing fits the window exactly
+        if rows and not self.row_height:
+            bbox = self.tree.bbox("0")
+            if bbox:
+                self.header_height, self.row_height = bbox[1], bbox[3]
+        if self.metrics:
+            self.metrics.observe("operation_seconds", time.perf_counter() - start, operation="table_refresh")
+    
+    def find(self, text: str, start: int) -> Optional[int]:
+        """Index of the first row at or after start (wrapping) containing text, ignoring case"""
+        needle = text.lower()
+        get_row = self.get_row
+        for index in itertools.chain(range(start, self.count), range(0, min(start, self.count))):
+            for value in get_row(index):
+                if needle in value.lower():
+                    return index
+        return None
 
 
 class EnhancedFileFolderRenamer:
@@ -28,9 +180,42 @@ class EnhancedFileFolderRenamer:
         self.recursive = tk.BooleanVar(value=False)
         self.file_filter = tk.StringVar(value="*")
         self.case_option = tk.StringVar(value="none")
-        
-        # Rename history for undo functionality
-        self.rename_history: List[List[Tuple[str, str]]] = []
+        self.use_index = tk.BooleanVar(value=False)
+        self.on_collision = tk.StringVar(value="skip")  # skip, suffix, unique
+        self.backend = tk.StringVar(value="threads")  # threads, async
+        self.seed = tk.StringVar()  # Blank picks a new seed for every preview
+        self.collect_metrics = tk.BooleanVar(value=False)
+        self.profile_mode = tk.StringVar(value="off")  # off, cpu, memory
+        self.goto_row = tk.StringVar()
+        self.search_text = tk.StringVar()
+        
+        # Plan shown in the preview table; Rename executes it as long as the options are unchanged
+        self.preview_plan: Optional[RenamePlan] = None
+        
+        # On-disk rename journal for undo/redo and crash recovery
+        self.journal = Journal()
+        
+        # Timings collected across runs while Collect Metrics is on
+        self.metrics = Metrics()
+        
+        # Multi-root batch: manifest jobs (directory plus per-root overrides) and the last report
+        self.batch_jobs: List[Dict[str, Any]] = []
+        self.batch_workers = tk.IntVar(value=DEFAULT_JOBS)
+        self.batch_report: Optional[JobReport] = None
+        self.batch_listbox: Optional[tk.Listbox] = None
+        self.batch_report_list: Optional[tk.Listbox] = None
+        
+        # Rename rules applied after the pattern, in order
+        self.rules: List[Dict[str, Any]] = []
+        self.rule_kind = tk.StringVar(value="replace")
+        self.rule_first = tk.StringVar()
+        self.rule_second = tk.StringVar()
+        self.rule_hint = tk.StringVar()
+        self.rule_preset = tk.StringVar()
+        self.rule_sample = tk.StringVar(value="My Photo (copy) Ünïcode.jpg")
+        self.rule_result = tk.StringVar()
+        self.rules_listbox: Optional[tk.Listbox] = None
+        self.preset_combo: Optional[ttk.Combobox] = None
         
         # Customizable lists - generic names for general use
         self.custom_list1: List[str] = []  # Custom words list 1
@@ -44,7 +229,15 @@ class EnhancedFileFolderRenamer:
         self.list1_listbox: Optional[tk.Listbox] = None
         self.list2_listbox: Optional[tk.Listbox] = None
         
+        # Background task state; engine work runs on a worker thread
+        self.action_buttons: List[ttk.Button] = []
+        self.cancel_button: Optional[ttk.Button] = None
+        self.cancel_task: Optional[Callable[[], None]] = None
+        self.worker_queue: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        self.last_progress = 0.0
+        
         self.create_widgets()
+        self.root.after(100, self.check_interrupted)
         
     def create_widgets(self) -> None:
         # Create notebook for tabs
@@ -59,6 +252,14 @@ class EnhancedFileFolderRenamer:
         custom_frame = ttk.Frame(self.notebook, padding="10")
         self.notebook.add(custom_frame, text="Custom Lists")
         
+        # Batch jobs tab
+        batch_frame = ttk.Frame(self.notebook, padding="10")
+        self.notebook.add(batch_frame, text="Batch Jobs")
+        
+        # Rules tab
+        rules_frame = ttk.Frame(self.notebook, padding="10")
+        self.notebook.add(rules_frame, text="Rules")
+        
         # Pattern help tab
         help_frame = ttk.Frame(self.notebook, padding="10")
         self.notebook.add(help_frame, text="Pattern Help")
@@ -66,6 +267,8 @@ class EnhancedFileFolderRenamer:
         # Setup all tabs
         self.setup_main_tab(main_frame)
         self.setup_custom_data_tab(custom_frame)
+        self.setup_batch_tab(batch_frame)
+        self.setup_rules_tab(rules_frame)
         self.setup_pattern_help(help_frame)
         
     def setup_main_tab(self, main_frame: ttk.Frame) -> None:
@@ -119,16 +322,43 @@ class EnhancedFileFolderRenamer:
         case_combo = ttk.Combobox(options_frame, textvariable=self.case_option, 
                                   values=["none", "uppercase", "lowercase", "title"], width=10, state="readonly")
         case_combo.grid(row=5, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(options_frame, text="Only Rescan Changed Folders", variable=self.use_index).grid(row=5, column=2, sticky=tk.W, pady=2, padx=20)
+        
+        # Name clash option
+        ttk.Label(options_frame, text="If Name Is Taken:").grid(row=6, column=0, sticky=tk.W, pady=2)
+        collision_combo = ttk.Combobox(options_frame, textvariable=self.on_collision,
+                                       values=["skip", "suffix", "unique"], width=10, state="readonly")
+        collision_combo.grid(row=6, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(options_frame, text="(suffix adds _2, _3, ...; unique avoids repeating random picks)").grid(row=6, column=2, sticky=tk.W, padx=5, pady=2)
+        
+        # Diagnostics
+        ttk.Label(options_frame, text="Profile:").grid(row=7, column=0, sticky=tk.W, pady=2)
+        profile_combo = ttk.Combobox(options_frame, textvariable=self.profile_mode,
+                                     values=list(PROFILE_MODES), width=10, state="readonly")
+        profile_combo.grid(row=7, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(options_frame, text="Collect Metrics", variable=self.collect_metrics,
+                        command=self.toggle_metrics).grid(row=7, column=2, sticky=tk.W, pady=2, padx=20)
+        ttk.Checkbutton(options_frame, text="Network Share Mode (many renames in flight)", variable=self.backend,
+                        onvalue="async", offvalue="threads").grid(row=8, column=0, columnspan=3, sticky=tk.W, pady=2)
+        
+        # Random seed, to reproduce the random tokens and versions of an earlier preview
+        ttk.Label(options_frame, text="Random Seed:").grid(row=9, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(options_frame, textvariable=self.seed, width=15).grid(row=9, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(options_frame, text="(blank for a new one each preview)").grid(row=9, column=2, sticky=tk.W, padx=5, pady=2)
         
         # Buttons
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=3, column=0, columnspan=4, pady=10)
         
-        ttk.Button(button_frame, text="Preview", command=self.preview).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="Rename", command=self.rename).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="Undo Last", command=self.undo_last_rename).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="Clear", command=self.clear).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="Insert Pattern", command=self.insert_pattern).pack(side=tk.LEFT, padx=5)
+        for text, command in (("Preview", self.preview), ("Rename", self.rename),
+                              ("Undo Last", self.undo_last_rename), ("Redo", self.redo_last_rename),
+                              ("Clear", self.clear), ("Save Plan", self.save_plan), ("Load Plan", self.load_plan),
+                              ("Insert Pattern", self.insert_pattern), ("Save Metrics", self.save_metrics)):
+            button = ttk.Button(button_frame, text=text, command=command)
+            button.pack(side=tk.LEFT, padx=5)
+            self.action_buttons.append(button)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel, state="disabled")
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
         
         # Progress bar
         self.progress = ttk.Progressbar(main_frame, mode='determinate', length=400)
@@ -137,19 +367,24 @@ class EnhancedFileFolderRenamer:
         # Preview area
         ttk.Label(main_frame, text="Preview:").grid(row=5, column=0, sticky=tk.W, pady=5)
         
-        # Treeview for preview
-        columns = ("current", "new")
-        self.preview_tree = ttk.Treeview(main_frame, columns=columns, show="headings", height=12)
-        self.preview_tree.heading("current", text="Current Name")
-        self.preview_tree.heading("new", text="New Name")
-        self.preview_tree.column("current", width=350)
-        self.preview_tree.column("new", width=350)
-        self.preview_tree.grid(row=6, column=0, columnspan=4, pady=5, sticky=(tk.W, tk.E, tk.N, tk.S))
-        
-        # Scrollbar for treeview
-        scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=self.preview_tree.yview)
-        scrollbar.grid(row=6, column=4, sticky=(tk.N, tk.S), pady=5)
-        self.preview_tree.configure(yscrollcommand=scrollbar.set)
+        # Jump to row / search by name
+        find_frame = ttk.Frame(main_frame)
+        find_frame.grid(row=5, column=1, columnspan=3, sticky=tk.E, pady=5)
+        ttk.Label(find_frame, text="Row:").pack(side=tk.LEFT)
+        row_entry = ttk.Entry(find_frame, textvariable=self.goto_row, width=8)
+        row_entry.pack(side=tk.LEFT, padx=5)
+        row_entry.bind("<Return>", lambda e: self.jump_to_row())
+        ttk.Button(find_frame, text="Go", command=self.jump_to_row).pack(side=tk.LEFT, padx=5)
+        ttk.Label(find_frame, text="Find:").pack(side=tk.LEFT, padx=(15, 0))
+        find_entry = ttk.Entry(find_frame, textvariable=self.search_text, width=20)
+        find_entry.pack(side=tk.LEFT, padx=5)
+        find_entry.bind("<Return>", lambda e: self.find_next())
+        ttk.Button(find_frame, text="Find Next", command=self.find_next).pack(side=tk.LEFT, padx=5)
+        
+        # Virtualized table for preview; rows are read from self.preview_plan on demand
+        self.preview_table = VirtualTable(main_frame, [("current", "Current Name", 350), ("new", "New Name", 350)])
+        self.preview_table.tree.grid(row=6, column=0, columnspan=4, pady=5, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.preview_table.scrollbar.grid(row=6, column=4, sticky=(tk.N, tk.S), pady=5)
         
         # Status bar
         self.status_var = tk.StringVar(value="Ready")
@@ -227,6 +462,319 @@ class EnhancedFileFolderRenamer:
                                foreground="gray")
         info_label.pack(side=tk.BOTTOM, pady=10)
     
+    def setup_batch_tab(self, batch_frame: ttk.Frame) -> None:
+        """Setup the Batch Jobs tab: many root folders renamed with the Main tab's options"""
+        folders_frame = ttk.LabelFrame(batch_frame, text="Folders (renamed with the Main tab options)",
+                                       padding="10")
+        folders_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        list_frame = ttk.Frame(folders_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        self.batch_listbox = tk.Listbox(list_frame, height=10, selectmode=tk.EXTENDED)
+        batch_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.batch_listbox.yview)
+        self.batch_listbox.configure(yscrollcommand=batch_scrollbar.set)
+        self.batch_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        batch_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        button_frame = ttk.Frame(folders_frame)
+        button_frame.pack(fill=tk.X, pady=5)
+        for text, command in (("Add Folder", self.add_batch_folder), ("Remove", self.remove_batch_folders),
+                              ("Load Manifest", self.load_manifest), ("Save Manifest", self.save_manifest)):
+            ttk.Button(button_frame, text=text, command=command).pack(side=tk.LEFT, padx=2)
+        ttk.Label(button_frame, text="Folders at a time:").pack(side=tk.LEFT, padx=(15, 2))
+        ttk.Spinbox(button_frame, from_=1, to=64, textvariable=self.batch_workers, width=5).pack(side=tk.LEFT)
+        run_button = ttk.Button(button_frame, text="Run All", command=self.run_batch)
+        run_button.pack(side=tk.LEFT, padx=(15, 2))
+        self.action_buttons.append(run_button)
+        
+        report_frame = ttk.LabelFrame(batch_frame, text="Results", padding="10")
+        report_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.batch_report_list = tk.Listbox(report_frame, height=10, font=("Courier", 9))
+        self.batch_report_list.pack(fill=tk.BOTH, expand=True)
+        report_buttons = ttk.Frame(report_frame)
+        report_buttons.pack(fill=tk.X, pady=5)
+        ttk.Button(report_buttons, text="Save Report", command=self.save_batch_report).pack(side=tk.LEFT, padx=2)
+        ttk.Label(report_buttons, textvariable=self.status_var).pack(side=tk.LEFT, padx=10)
+    
+    def setup_rules_tab(self, rules_frame: ttk.Frame) -> None:
+        """Setup the Rules tab: search/replace and cleanup rules run on every new name"""
+        chain_frame = ttk.LabelFrame(rules_frame, text="Rules (applied after the pattern, top to bottom)",
+                                     padding="10")
+        chain_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        list_frame = ttk.Frame(chain_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        self.rules_listbox = tk.Listbox(list_frame, height=10, selectmode=tk.SINGLE)
+        rules_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.rules_listbox.yview)
+        self.rules_listbox.configure(yscrollcommand=rules_scrollbar.set)
+        self.rules_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        rules_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        button_frame = ttk.Frame(chain_frame)
+        button_frame.pack(fill=tk.X, pady=5)
+        for text, command in (("Move Up", lambda: self.move_rule(-1)), ("Move Down", lambda: self.move_rule(1)),
+                              ("Remove", self.remove_rule), ("Clear All", self.clear_rules)):
+            ttk.Button(button_frame, text=text, command=command).pack(side=tk.LEFT, padx=2)
+        
+        # New rule: the meaning of the two fields depends on the kind
+        add_frame = ttk.LabelFrame(rules_frame, text="Add Rule", padding="10")
+        add_frame.pack(fill=tk.X, padx=5, pady=5)
+        kind_combo = ttk.Combobox(add_frame, textvariable=self.rule_kind, values=list(RULE_KINDS), width=12,
+                                  state="readonly")
+        kind_combo.grid(row=0, column=0, padx=2)
+        kind_combo.bind("<<ComboboxSelected>>", lambda e: self.update_rule_hint())
+        ttk.Entry(add_frame, textvariable=self.rule_first, width=20).grid(row=0, column=1, padx=2)
+        ttk.Entry(add_frame, textvariable=self.rule_second, width=20).grid(row=0, column=2, padx=2)
+        ttk.Button(add_frame, text="Add", command=self.add_rule).grid(row=0, column=3, padx=2)
+        ttk.Label(add_frame, textvariable=self.rule_hint, foreground="gray").grid(row=1, column=0, columnspan=4,
+                                                                                  sticky=tk.W, pady=2)
+        self.update_rule_hint()
+        
+        preset_frame = ttk.LabelFrame(rules_frame, text="Presets", padding="10")
+        preset_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.preset_combo = ttk.Combobox(preset_frame, textvariable=self.rule_preset, width=20, state="readonly")
+        self.preset_combo.pack(side=tk.LEFT, padx=2)
+        for text, command in (("Add Preset Rules", self.apply_preset), ("Save as Preset", self.save_rules_preset),
+                              ("Delete Preset", self.delete_rules_preset)):
+            ttk.Button(preset_frame, text=text, command=command).pack(side=tk.LEFT, padx=2)
+        self.refresh_presets()
+        
+        try_frame = ttk.LabelFrame(rules_frame, text="Try It", padding="10")
+        try_frame.pack(fill=tk.X, padx=5, pady=5)
+        sample_entry = ttk.Entry(try_frame, textvariable=self.rule_sample, width=35)
+        sample_entry.pack(side=tk.LEFT, padx=2)
+        sample_entry.bind("<KeyRelease>", lambda e: self.try_rules())
+        ttk.Label(try_frame, text="→").pack(side=tk.LEFT, padx=5)
+        ttk.Label(try_frame, textvariable=self.rule_result).pack(side=tk.LEFT, padx=2)
+        self.try_rules()
+    
+    # --- Rules ---
+    def update_rule_hint(self) -> None:
+        self.rule_hint.set(RULE_HINTS.get(self.rule_kind.get(), ""))
+    
+    def build_rule(self) -> Dict[str, Any]:
+        """The rule described by the Add Rule fields"""
+        kind, first, second = self.rule_kind.get(), self.rule_first.get(), self.rule_second.get()
+        if kind == "replace":
+            return {"kind": kind, "pattern": first, "replacement": second}
+        if kind == "strip":
+            return {"kind": kind, "chars": first, "where": second.strip() or "all"}
+        if kind == "transliterate":
+            if first.strip().lower() == "ascii":
+                return {"kind": kind, "ascii": True}
+            return {"kind": kind, "from": first, "to": second}
+        if kind == "trim":
+            try:
+                return {"kind": kind, "length": int(first)}
+            except ValueError:
+                return {"kind": kind, "length": first}  # Rejected with a message by compile_rules
+        rule: Dict[str, Any] = {"kind": kind, "mode": first.strip()}
+        if second:
+            rule["pattern"] = second
+        return rule
+    
+    def add_rule(self) -> None:
+        rule = self.build_rule()
+        try:
+            compile_rules([rule])
+        except RuleError as e:
+            messagebox.showerror("Invalid Rule", str(e))
+            return
+        self.rules.append(rule)
+        self.rule_first.set("")
+        self.rule_second.set("")
+        self.show_rules()
+    
+    def show_rules(self) -> None:
+        if self.rules_listbox:
+            self.rules_listbox.delete(0, tk.END)
+            for rule in self.rules:
+                self.rules_listbox.insert(tk.END, describe_rule(rule))
+        self.try_rules()
+    
+    def move_rule(self, offset: int) -> None:
+        if not self.rules_listbox or not self.rules_listbox.curselection():
+            return
+        index = self.rules_listbox.curselection()[0]
+        target = index + offset
+        if 0 <= target < len(self.rules):
+            self.rules[index], self.rules[target] = self.rules[target], self.rules[index]
+            self.show_rules()
+            self.rules_listbox.selection_set(target)
+    
+    def remove_rule(self) -> None:
+        if self.rules_listbox and self.rules_listbox.curselection():
+            del self.rules[self.rules_listbox.curselection()[0]]
+            self.show_rules()
+    
+    def clear_rules(self) -> None:
+        self.rules.clear()
+        self.show_rules()
+    
+    def try_rules(self) -> None:
+        """Show what the rules make of the sample name"""
+        try:
+            self.rule_result.set(compile_rules(self.rules)(self.rule_sample.get()))
+        except RuleError as e:
+            self.rule_result.set(str(e))
+    
+    def refresh_presets(self) -> None:
+        try:
+            names = sorted(load_presets())
+        except RuleError as e:
+            messagebox.showerror("Error", str(e))
+            names = []
+        if self.preset_combo is not None:
+            self.preset_combo["values"] = names
+    
+    def apply_preset(self) -> None:
+        name = self.rule_preset.get()
+        if not name:
+            return
+        try:
+            self.rules.extend(get_preset(name))
+        except RuleError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.show_rules()
+    
+    def save_rules_preset(self) -> None:
+        if not self.rules:
+            messagebox.showinfo("Info", "Add some rules first")
+            return
+        name = simpledialog.askstring("Save Preset", "Preset name:", parent=self.root)
+        if not name:
+            return
+        try:
+            save_preset(name.strip(), self.rules)
+        except (RuleError, OSError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.refresh_presets()
+        self.rule_preset.set(name.strip())
+    
+    def delete_rules_preset(self) -> None:
+        name = self.rule_preset.get()
+        if not name:
+            return
+        try:
+            deleted = delete_preset(name)
+        except (RuleError, OSError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        if not deleted:
+            messagebox.showinfo("Info", f"{name} is built in and cannot be deleted")
+            return
+        self.rule_preset.set("")
+        self.refresh_presets()
+    
+    # --- Batch Jobs ---
+    def show_batch_jobs(self) -> None:
+        if self.batch_listbox:
+            self.batch_listbox.delete(0, tk.END)
+            for job in self.batch_jobs:
+                overrides = ", ".join(f"{k}={v}" for k, v in job.items() if k != "directory")
+                self.batch_listbox.insert(tk.END, job["directory"] + (f"  ({overrides})" if overrides else ""))
+    
+    def add_batch_folder(self) -> None:
+        directory = filedialog.askdirectory()
+        if directory and directory not in [job["directory"] for job in self.batch_jobs]:
+            self.batch_jobs.append({"directory": directory})
+            self.show_batch_jobs()
+    
+    def remove_batch_folders(self) -> None:
+        if self.batch_listbox:
+            for index in reversed(self.batch_listbox.curselection()):
+                del self.batch_jobs[index]
+            self.show_batch_jobs()
+    
+    def batch_manifest(self) -> JobManifest:
+        """The listed folders, with the Main tab's options as defaults"""
+        manifest = JobManifest.from_config(self.get_config(), [])
+        manifest.jobs = [dict(job) for job in self.batch_jobs]
+        return manifest
+    
+    def load_manifest(self) -> None:
+        path = filedialog.askopenfilename(title="Load Manifest",
+                                          filetypes=[("Job manifests", "*.json"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            manifest = JobManifest.load(path)
+        except RenamerError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        # The manifest's defaults become the current options
+        directory = self.directory.get()
+        self.set_config(manifest.defaults)
+        self.directory.set(directory)
+        self.batch_jobs = manifest.jobs
+        self.show_batch_jobs()
+        self.status_var.set(f"Loaded manifest of {len(manifest.jobs)} folders")
+    
+    def save_manifest(self) -> None:
+        if not self.batch_jobs:
+            messagebox.showinfo("Info", "Add some folders first")
+            return
+        path = filedialog.asksaveasfilename(title="Save Manifest", defaultextension=".json",
+                                            filetypes=[("Job manifests", "*.json"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            self.batch_manifest().save(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save manifest: {str(e)}")
+            return
+        self.status_var.set(f"Saved manifest of {len(self.batch_jobs)} folders to {path}")
+    
+    def run_batch(self) -> None:
+        """Rename in every listed folder, several at a time, each as its own undoable batch"""
+        if not self.batch_jobs:
+            messagebox.showinfo("Info", "Add some folders first")
+            return
+        try:
+            configs = self.batch_manifest().configs()
+            workers = self.batch_workers.get()
+        except (RenamerError, tk.TclError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        if not messagebox.askyesno("Confirm", f"Are you sure you want to rename in {len(configs)} folders?"):
+            return
+        
+        runner = JobRunner(configs, self.journal, workers, metrics=self.active_metrics())
+        self.run_in_background(f"Renaming in {len(configs)} folders...",
+                               lambda: (runner.run(self.report_progress), self.journal.undoable_count()),
+                               self.finish_batch, runner.cancel)
+    
+    def finish_batch(self, outcome: Tuple[JobReport, int]) -> None:
+        report, undoable = outcome
+        self.batch_report = report
+        if self.batch_report_list:
+            self.batch_report_list.delete(0, tk.END)
+            for line in report.summary():
+                self.batch_report_list.insert(tk.END, line)
+        if report.failed:
+            messagebox.showerror("Errors", f"{len(report.failed)} folders had errors:\n"
+                                 + "\n".join(job.directory for job in report.failed[:5])
+                                 + ("\n..." if len(report.failed) > 5 else ""))
+        self.status_var.set(f"Renamed {report.renamed} items in {len(report.jobs)} folders "
+                            f"(Undo available: {undoable} batches)")
+    
+    def save_batch_report(self) -> None:
+        report = self.batch_report
+        if report is None:
+            messagebox.showinfo("Info", "Run the batch first")
+            return
+        path = filedialog.asksaveasfilename(title="Save Report", defaultextension=".json",
+                                            filetypes=[("JSON", "*.json"), ("All files", "*")])
+        if path:
+            try:
+                report.save(path)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not save report: {str(e)}")
+                return
+            self.status_var.set(f"Saved report to {path}")
+    
     # --- Custom List 1 Management ---
     def add_list1_item(self) -> None:
         """Add an item to custom list 1"""
@@ -323,6 +871,10 @@ class EnhancedFileFolderRenamer:
         {random}       - Random number (1-1000)
         {orig_name}    - Original filename (without extension)
         {orig_ext}     - Original file extension
+        {sha1:8}       - Content hash (first N hex digits; {sha1} for all 40)
+        {size}         - File size in bytes
+        {mtime}        - Modification time (YYYY-MM-DD_HH-MM-SS)
+        {exif_date}    - When a photo was taken (EXIF), else {mtime}
         
         ───────────────────────────────────────────────────────────────
         
@@ -357,6 +909,9 @@ class EnhancedFileFolderRenamer:
         *              All files
         *.txt          Only .txt files
         *.jpg,*.png    Multiple extensions (comma-separated)
+        IMG_????.*     Wildcards: * any text, ? one character, [ab] a set
+        *.jpg,!thumb*  Exclude names starting with "thumb"
+        re:^\\d{4}-     Regular expression (prefix with re:)
         
         ───────────────────────────────────────────────────────────────
         
@@ -381,333 +936,381 @@ class EnhancedFileFolderRenamer:
         if directory:
             self.directory.set(directory)
             
-    def matches_filter(self, filename: str) -> bool:
-        """Check if filename matches the file filter pattern"""
-        filter_pattern = self.file_filter.get().strip()
-        if not filter_pattern or filter_pattern == "*":
-            return True
-        
-        # Support multiple patterns separated by comma
-        patterns = [p.strip() for p in filter_pattern.split(",")]
-        
-        for pattern in patterns:
-            if pattern.startswith("*."):
-                ext = pattern[1:]  # Get extension including dot
-                if filename.lower().endswith(ext.lower()):
-                    return True
-            elif pattern == "*":
-                return True
-            elif "*" in pattern:
-                # Simple wildcard matching
-                regex_pattern = pattern.replace(".", r"\.").replace("*", ".*")
-                if re.match(regex_pattern, filename, re.IGNORECASE):
-                    return True
-            else:
-                if filename.lower() == pattern.lower():
-                    return True
-        return False
-            
-    def get_items(self) -> List[Tuple[str, str]]:
-        """Get items to rename. Returns list of (relative_path, full_path) tuples."""
-        directory = self.directory.get()
-        if not directory or not os.path.isdir(directory):
-            messagebox.showerror("Error", "Please select a valid directory")
-            return []
-        
-        items: List[Tuple[str, str]] = []
-        
-        if self.recursive.get():
-            # Recursive mode - walk through all subdirectories
-            for root, dirs, files in os.walk(directory):
-                rel_root = os.path.relpath(root, directory)
-                
-                if self.include_files.get():
-                    for f in files:
-                        if self.matches_filter(f):
-                            full_path = os.path.join(root, f)
-                            rel_path = f if rel_root == "." else os.path.join(rel_root, f)
-                            items.append((rel_path, full_path))
-                            
-                if self.include_folders.get():
-                    for d in dirs:
-                        full_path = os.path.join(root, d)
-                        rel_path = d if rel_root == "." else os.path.join(rel_root, d)
-                        items.append((rel_path, full_path))
-        else:
-            # Non-recursive mode - only immediate children
-            if self.include_files.get():
-                for f in os.listdir(directory):
-                    full_path = os.path.join(directory, f)
-                    if os.path.isfile(full_path) and self.matches_filter(f):
-                        items.append((f, full_path))
-                        
-            if self.include_folders.get():
-                for f in os.listdir(directory):
-                    full_path = os.path.join(directory, f)
-                    if os.path.isdir(full_path):
-                        items.append((f, full_path))
-            
-        return sorted(items, key=lambda x: x[0])
-    
-    def apply_case_transform(self, name: str) -> str:
-        """Apply case transformation to name"""
-        case = self.case_option.get()
-        if case == "uppercase":
-            return name.upper()
-        elif case == "lowercase":
-            return name.lower()
-        elif case == "title":
-            return name.title()
-        return name
-    
-    def generate_new_name(self, old_name: str, counter: int, version: float, is_file: bool) -> str:
-        pattern = self.pattern.get()
-        name, ext = os.path.splitext(old_name)
-        
-        # Get current date and time
-        now = datetime.now()
-        
-        # Replace all pattern variables
-        new_name = pattern
-        
-        # {list1} - random word from custom list 1
-        if "{list1}" in new_name:
-            if self.custom_list1:
-                new_name = new_name.replace("{list1}", random.choice(self.custom_list1))
-            else:
-                new_name = new_name.replace("{list1}", "Item")  # Fallback
-            
-        # {prefix} - prefix from custom list 2 with counter
-        if "{prefix}" in new_name:
-            if self.custom_list2:
-                prefix = random.choice(self.custom_list2)
-            else:
-                prefix = "file"  # Fallback
-            new_name = new_name.replace("{prefix}", f"{prefix}")
-            
-        # {version} - version number
-        if "{version}" in new_name:
-            new_name = new_name.replace("{version}", str(version))
-            
-        # {counter} - simple counter
-        if "{counter}" in new_name:
-            new_name = new_name.replace("{counter}", f"{counter:03d}")
-            
-        # {date} - current date
-        if "{date}" in new_name:
-            new_name = new_name.replace("{date}", now.strftime("%Y-%m-%d"))
-            
-        # {time} - current time
-        if "{time}" in new_name:
-            new_name = new_name.replace("{time}", now.strftime("%H-%M-%S"))
-            
-        # {datetime} - current date and time
-        if "{datetime}" in new_name:
-            new_name = new_name.replace("{datetime}", now.strftime("%Y-%m-%d_%H-%M-%S"))
-            
-        # {random} - random number
-        if "{random}" in new_name:
-            new_name = new_name.replace("{random}", str(random.randint(1, 1000)))
-            
-        # {orig_name} - original name without extension
-        if "{orig_name}" in new_name:
-            new_name = new_name.replace("{orig_name}", name)
-            
-        # {orig_ext} - original extension
-        if "{orig_ext}" in new_name:
-            new_name = new_name.replace("{orig_ext}", ext)
+    def set_config(self, config: RenameConfig) -> None:
+        """Load an engine config back into the widgets"""
+        self.directory.set(config.directory)
+        self.pattern.set(config.pattern)
+        self.start_counter.set(config.start_counter)
+        self.version_start.set(config.version_start)
+        self.version_increment.set(config.version_increment)
+        self.version_strategy.set(config.version_strategy)
+        self.include_files.set(config.include_files)
+        self.include_folders.set(config.include_folders)
+        self.recursive.set(config.recursive)
+        self.file_filter.set(config.file_filter)
+        self.case_option.set(config.case_option)
+        self.use_index.set(config.use_index)
+        self.on_collision.set(config.on_collision)
+        self.seed.set("" if config.seed is None else str(config.seed))
+        self.rules = [dict(rule) for rule in config.rules]
+        self.show_rules()
+        self.custom_list1[:] = config.list1
+        self.custom_list2[:] = config.list2
+        for listbox, items in ((self.list1_listbox, config.list1), (self.list2_listbox, config.list2)):
+            if listbox:
+                listbox.delete(0, tk.END)
+                for item in items:
+                    listbox.insert(tk.END, item)
+    
+    def get_config(self) -> RenameConfig:
+        """Snapshot the current widget values into an engine config"""
+        return RenameConfig(
+            directory=self.directory.get(),
+            pattern=self.pattern.get(),
+            start_counter=self.start_counter.get(),
+            version_start=self.version_start.get(),
+            version_increment=self.version_increment.get(),
+            version_strategy=self.version_strategy.get(),
+            include_files=self.include_files.get(),
+            include_folders=self.include_folders.get(),
+            recursive=self.recursive.get(),
+            file_filter=self.file_filter.get(),
+            case_option=self.case_option.get(),
+            list1=list(self.custom_list1),
+            list2=list(self.custom_list2),
+            use_index=self.use_index.get(),
+            on_collision=self.on_collision.get(),
+            backend=self.backend.get(),
+            seed=self.random_seed(),
+            rules=[dict(rule) for rule in self.rules],
+        )
+    
+    def random_seed(self) -> Optional[int]:
+        """The seed typed in the options, or None when blank or not a number"""
+        try:
+            return int(self.seed.get().strip())
+        except ValueError:
+            return None
+    
+    def active_metrics(self) -> Optional[Metrics]:
+        """The metrics to pass to the engine, or None when collection is off"""
+        return self.metrics if self.collect_metrics.get() else None
+    
+    def async_backend(self) -> Optional["AsyncBackend"]:
+        """Backend for undo, redo and recovery, which run outside an engine"""
+        if self.backend.get() != "async":
+            return None
+        from renamer.aio import AsyncBackend  # asyncio is slow to import; only the async backend needs it
+        return AsyncBackend()
+    
+    def toggle_metrics(self) -> None:
+        self.preview_table.metrics = self.active_metrics()
+    
+    def profile_path(self) -> str:
+        """Profiles are written next to the journal, one file per mode"""
+        name = "profile.prof" if self.profile_mode.get() == "cpu" else "profile-memory.txt"
+        return os.path.join(os.path.dirname(os.path.abspath(self.journal.path)), name)
+    
+    def save_metrics(self) -> None:
+        """Write the metrics collected so far as JSON or Prometheus text"""
+        if not self.metrics.counters and not self.metrics.histograms:
+            messagebox.showinfo("Info", "Turn on Collect Metrics and run a preview or rename first")
+            return
+        path = filedialog.asksaveasfilename(title="Save Metrics", defaultextension=".json",
+                                            filetypes=[("JSON", "*.json"), ("Prometheus text", "*.prom"),
+                                                       ("All files", "*")])
+        if not path:
+            return
+        try:
+            self.metrics.save(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save metrics: {str(e)}")
+            return
+        self.status_var.set(f"Saved metrics to {path}")
+    
+    def set_busy(self, busy: bool) -> None:
+        """Disable the action buttons while a background task runs"""
+        for button in self.action_buttons:
+            button.state(["disabled"] if busy else ["!disabled"])
+        if self.cancel_button:
+            self.cancel_button.state(["!disabled"] if busy else ["disabled"])
+    
+    def run_in_background(self, description: str, work: Callable[[], Any], on_done: Callable[[Any], None],
+                          cancel: Callable[[], None]) -> None:
+        """Run work() on a worker thread and hand its result to on_done() on the Tk thread"""
+        self.set_busy(True)
+        self.cancel_task = cancel
+        self.status_var.set(description)
+        if self.progress:
+            self.progress['value'] = 0
         
-        # Apply case transformation
-        new_name = self.apply_case_transform(new_name)
+        worker_queue: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        self.worker_queue = worker_queue
+        self.last_progress = 0.0
+        # cProfile only sees its own thread, so the profile is taken on the worker
+        profile_mode, profile_path, metrics = self.profile_mode.get(), self.profile_path(), self.active_metrics()
+        if profile_mode != "off":
+            os.makedirs(os.path.dirname(profile_path), exist_ok=True)
         
-        # For files, preserve the original extension unless the pattern includes it
-        if is_file and not os.path.splitext(new_name)[1]:
-            new_name += ext
+        def target() -> None:
+            try:
+                with profiled(profile_mode, profile_path, metrics):
+                    value = work()
+                worker_queue.put(("done", value))
+            except RenameCancelled:
+                worker_queue.put(("cancelled", None))
+            except RenamerError as e:
+                worker_queue.put(("error", str(e)))
+            except Exception as e:
+                worker_queue.put(("error", f"Unexpected error: {str(e)}"))
+        
+        threading.Thread(target=target, daemon=True).start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_worker, on_done)
+    
+    def report_progress(self, done: int, total: int) -> None:
+        """Engine progress callback; runs on the worker thread, so only queue throttled updates"""
+        now = time.monotonic()
+        if done == total or now - self.last_progress >= PROGRESS_INTERVAL:
+            self.last_progress = now
+            self.worker_queue.put(("progress", (done, total)))
+    
+    def poll_worker(self, on_done: Callable[[Any], None]) -> None:
+        """Drain the worker queue; only the latest progress update is drawn"""
+        latest: Optional[Tuple[int, int]] = None
+        while True:
+            try:
+                kind, payload = self.worker_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                latest = payload
+                continue
             
-        return new_name
+            self.set_busy(False)
+            self.cancel_task = None
+            if kind == "done":
+                if self.progress:
+                    self.progress['value'] = self.progress['maximum']
+                on_done(payload)
+            elif kind == "cancelled":
+                self.status_var.set("Cancelled")
+            else:
+                messagebox.showerror("Error", payload)
+                self.status_var.set("Ready")
+            return
+        
+        if latest and self.progress:
+            done, total = latest
+            self.progress['maximum'] = max(total, done, 1)
+            self.progress['value'] = done
+        self.root.after(POLL_INTERVAL_MS, self.poll_worker, on_done)
+    
+    def cancel(self) -> None:
+        """Stop the running background task"""
+        if self.cancel_task:
+            self.cancel_task()
+            self.status_var.set("Cancelling...")
+    
+    def show_plan(self, rename_plan: Optional[RenamePlan]) -> None:
+        self.preview_plan = rename_plan
+        ops = rename_plan.ops if rename_plan is not None else []
+        self.preview_table.set_rows(len(ops), lambda i: (ops[i].rel_path, ops[i].new_rel_path))
     
-    def get_version(self, counter: int, strategy: str) -> float:
-        """Get version number based on strategy with input validation"""
+    def jump_to_row(self) -> None:
+        """Scroll the preview to the row number typed in the Row box (1-based)"""
         try:
-            if strategy == "fixed":
-                return float(self.version_start.get())
-            elif strategy == "incremental":
-                start = float(self.version_start.get())
-                increment = self.version_increment.get()
-                return round(start + (counter - 1) * increment, 2)
-            elif strategy == "random":
-                return round(random.uniform(0.1, 10.0), 2)
-            return 1.0
+            row = int(self.goto_row.get())
         except ValueError:
-            messagebox.showerror("Error", "Invalid version format. Using default 1.0")
-            return 1.0
+            messagebox.showwarning("Invalid Row", "Please enter a row number")
+            return
+        if self.preview_table.count:
+            self.preview_table.see(max(1, min(row, self.preview_table.count)) - 1)
     
-    def preview(self) -> None:
-        self.preview_tree.delete(*self.preview_tree.get_children())
-        directory = self.directory.get()
-        
-        if not directory or not os.path.isdir(directory):
-            messagebox.showerror("Error", "Please select a valid directory")
+    def find_next(self) -> None:
+        """Select the next preview row whose current or new name contains the search text"""
+        text = self.search_text.get()
+        if not text or not self.preview_table.count:
             return
+        selected = self.preview_table.selected
+        index = self.preview_table.find(text, 0 if selected is None else selected + 1)
+        if index is None:
+            self.status_var.set(f"'{text}' not found")
+        else:
+            self.preview_table.see(index)
+            self.status_var.set(f"Row {index + 1} of {self.preview_table.count}")
+    
+    def preview(self) -> None:
+        self.show_plan(None)
+        engine = RenameEngine(self.get_config(), metrics=self.active_metrics())
         
         # Check if custom data is needed
-        pattern = self.pattern.get()
-        if "{list1}" in pattern and not self.custom_list1:
-            messagebox.showwarning("Missing Data", "Pattern uses {list1} but no items defined.\nGo to 'Custom Lists' tab to add items or load examples.")
-        if "{prefix}" in pattern and not self.custom_list2:
-            messagebox.showwarning("Missing Data", "Pattern uses {prefix} but no prefixes defined.\nGo to 'Custom Lists' tab to add prefixes or load examples.")
-        
-        items = self.get_items()
-        if not items:
+        for warning in engine.check_config():
+            messagebox.showwarning("Warning", warning)
+        
+        self.run_in_background("Scanning...", lambda: engine.plan(self.report_progress),
+                               self.show_preview, engine.cancel)
+    
+    def show_preview(self, rename_plan: RenamePlan) -> None:
+        collisions = rename_plan.collisions
+        if collisions:
+            messagebox.showwarning("Name Clashes",
+                                   f"{len(collisions)} items will be skipped because their new name is taken:\n"
+                                   + "\n".join(collisions[:5]) + ("\n..." if len(collisions) > 5 else ""))
+        
+        if not rename_plan:
             messagebox.showinfo("Info", "No files or folders found to rename")
+            self.status_var.set("Ready")
             return
-        
-        # Reset and configure progress bar
-        if self.progress:
-            self.progress['value'] = 0
-            self.progress['maximum'] = len(items)
-            
-        counter = self.start_counter.get()
-        rename_plan: List[Tuple[str, str, float]] = []
-        
-        for i, (rel_path, full_path) in enumerate(items):
-            version = self.get_version(counter, self.version_strategy.get())
-            is_file = os.path.isfile(full_path)
-            
-            # Get just the filename for renaming
-            dirname = os.path.dirname(rel_path)
-            basename = os.path.basename(rel_path)
-            new_basename = self.generate_new_name(basename, counter, version, is_file)
-            new_rel_path = os.path.join(dirname, new_basename) if dirname else new_basename
-            
-            rename_plan.append((rel_path, new_rel_path, version))
-            counter += 1
-            
-            # Update progress
-            if self.progress:
-                self.progress['value'] = i + 1
-                self.root.update_idletasks()
             
-        for old, new, version in rename_plan:
-            self.preview_tree.insert("", tk.END, values=(old, new))
-            
-        self.status_var.set(f"Previewing {len(rename_plan)} items")
+        self.show_plan(rename_plan)
+        skipped = f" ({len(collisions)} skipped, name taken)" if collisions else ""
+        self.status_var.set(f"Previewing {len(rename_plan)} items{skipped}, seed {rename_plan.config.seed}")
         
     def rename(self) -> None:
-        directory = self.directory.get()
-        if not directory or not os.path.isdir(directory):
-            messagebox.showerror("Error", "Please select a valid directory")
+        config = self.get_config()
+        if config.seed is None and self.preview_plan is not None:
+            # Without a typed seed the preview's own seed is the one to match
+            config = replace(config, seed=self.preview_plan.config.seed)
+        # Rename exactly what is on screen unless the options changed since
+        if self.preview_plan is not None and self.preview_plan.config == config:
+            self.confirm_rename(RenameEngine.for_plan(self.preview_plan, self.journal, self.active_metrics()),
+                                self.preview_plan)
             return
-            
-        items = self.get_items()
-        if not items:
+        
+        engine = RenameEngine(config, self.journal, self.active_metrics())
+        self.run_in_background("Scanning...", lambda: engine.plan(self.report_progress),
+                               lambda rename_plan: self.confirm_rename(engine, rename_plan), engine.cancel)
+    
+    def confirm_rename(self, engine: RenameEngine, rename_plan: RenamePlan) -> None:
+        if not rename_plan:
             messagebox.showinfo("Info", "No files or folders found to rename")
+            self.status_var.set("Ready")
             return
             
         # If preview mode is on, show confirmation
         if self.preview_mode.get():
-            confirm = messagebox.askyesno("Confirm", f"Are you sure you want to rename {len(items)} items?")
+            skipped = f"\n{len(rename_plan.collisions)} items are skipped because their new name is taken." \
+                if rename_plan.collisions else ""
+            confirm = messagebox.askyesno("Confirm", f"Are you sure you want to rename {len(rename_plan)} items?{skipped}")
             if not confirm:
+                self.status_var.set("Ready")
                 return
         
-        # Reset and configure progress bar
-        if self.progress:
-            self.progress['value'] = 0
-            self.progress['maximum'] = len(items)
-                
-        counter = self.start_counter.get()
-        renamed_count = 0
-        errors: List[str] = []
-        current_batch: List[Tuple[str, str]] = []  # For undo functionality
-        
-        for i, (rel_path, full_path) in enumerate(items):
-            version = self.get_version(counter, self.version_strategy.get())
-            is_file = os.path.isfile(full_path)
-            
-            # Get directory and filename for renaming
-            parent_dir = os.path.dirname(full_path)
-            basename = os.path.basename(full_path)
-            new_basename = self.generate_new_name(basename, counter, version, is_file)
-            new_path = os.path.join(parent_dir, new_basename)
-            
-            # Check if the new name already exists
-            if os.path.exists(new_path):
-                errors.append(f"Skipping {rel_path}: {new_basename} already exists")
-                counter += 1
-                continue
-                
-            try:
-                os.rename(full_path, new_path)
-                current_batch.append((new_path, full_path))  # Store for undo (new -> old)
-                renamed_count += 1
-            except Exception as e:
-                errors.append(f"Error renaming {rel_path}: {str(e)}")
-                
-            counter += 1
-            
-            # Update progress
-            if self.progress:
-                self.progress['value'] = i + 1
-                self.root.update_idletasks()
-        
-        # Save to history for undo
-        if current_batch:
-            self.rename_history.append(current_batch)
-            
+        self.run_in_background(f"Renaming {len(rename_plan)} items...",
+                               lambda: (engine.execute(rename_plan, self.report_progress),
+                                        self.journal.undoable_count()),
+                               self.finish_rename, engine.cancel)
+    
+    def finish_rename(self, outcome: Tuple[RenameResult, int]) -> None:
+        result, undoable = outcome
+        
         # Update status
-        if errors:
-            messagebox.showerror("Errors", "\n".join(errors[:5]) + ("\n..." if len(errors) > 5 else ""))
+        if result.errors:
+            messagebox.showerror("Errors", "\n".join(result.errors[:5]) + ("\n..." if len(result.errors) > 5 else ""))
+        
+        if result.cancelled:
+            messagebox.showinfo("Cancelled", f"Cancelled after renaming {result.renamed} items. They can be undone.")
             
-        self.status_var.set(f"Renamed {renamed_count} of {len(items)} items (Undo available: {len(self.rename_history)} batches)")
+        self.status_var.set(f"Renamed {result.renamed} of {result.total} items (Undo available: {undoable} batches)")
         
         # Refresh preview
         self.preview()
     
     def undo_last_rename(self) -> None:
         """Undo the last batch rename operation"""
-        if not self.rename_history:
-            messagebox.showinfo("Info", "No actions to undo")
+        self.run_history("undo", "Undoing", "Undone", undo_last)
+    
+    def redo_last_rename(self) -> None:
+        """Redo the most recently undone batch"""
+        self.run_history("redo", "Redoing", "Redone", redo_last)
+    
+    def run_history(self, action: str, progress_text: str, done_text: str,
+                    run: Callable[..., RenameResult]) -> None:
+        """Confirm and run an undo or redo from the journal in the background"""
+        batch = self.journal.undoable() if action == "undo" else self.journal.redoable()
+        if batch is None:
+            messagebox.showinfo("Info", f"No actions to {action}")
             return
         
-        last_batch = self.rename_history.pop()
-        confirm = messagebox.askyesno("Confirm Undo", f"Are you sure you want to undo {len(last_batch)} rename operations?")
+        count = batch.applied if action == "undo" else len(batch.ops) - batch.applied
+        confirm = messagebox.askyesno(f"Confirm {action.title()}",
+                                      f"Are you sure you want to {action} {count} rename operations?")
         if not confirm:
-            self.rename_history.append(last_batch)  # Put it back
             return
         
-        # Reset and configure progress bar
-        if self.progress:
-            self.progress['value'] = 0
-            self.progress['maximum'] = len(last_batch)
-        
-        undone_count = 0
-        errors: List[str] = []
-        
-        for i, (current_path, original_path) in enumerate(last_batch):
-            try:
-                if os.path.exists(current_path):
-                    os.rename(current_path, original_path)
-                    undone_count += 1
-                else:
-                    errors.append(f"File not found: {current_path}")
-            except Exception as e:
-                errors.append(f"Error undoing {current_path}: {str(e)}")
-            
-            # Update progress
-            if self.progress:
-                self.progress['value'] = i + 1
-                self.root.update_idletasks()
+        cancel_event = threading.Event()
+        metrics, backend = self.active_metrics(), self.async_backend()
+        self.run_in_background(f"{progress_text} {count} items...",
+                               lambda: (run(self.journal, self.report_progress, cancel_event, metrics, backend),
+                                        self.journal.undoable_count()),
+                               lambda outcome: self.finish_history(done_text, outcome), cancel_event.set)
+    
+    def finish_history(self, done_text: str, outcome: Tuple[Optional[RenameResult], int]) -> None:
+        result, undoable = outcome
+        if result is None:
+            self.status_var.set("Ready")
+            return
         
-        if errors:
-            messagebox.showerror("Undo Errors", "\n".join(errors[:5]) + ("\n..." if len(errors) > 5 else ""))
+        if result.errors:
+            messagebox.showerror("Errors", "\n".join(result.errors[:5]) + ("\n..." if len(result.errors) > 5 else "") +
+                                 "\n\nThe items that failed stay in the history; run it again to retry them.")
         
-        self.status_var.set(f"Undone {undone_count} of {len(last_batch)} items (Undo available: {len(self.rename_history)} batches)")
+        self.status_var.set(f"{done_text} {result.renamed} of {result.total} items (Undo available: {undoable} batches)")
         
         # Refresh preview
-        self.preview()
-        
+        if self.directory.get():
+            self.preview()
+    
+    def check_interrupted(self) -> None:
+        """Offer to finish or roll back a batch left unfinished by a crash"""
+        batch = self.journal.interrupted()
+        if batch is None:
+            return
+        answer = messagebox.askyesnocancel(
+            "Interrupted Batch",
+            f"A rename batch was interrupted:\n{batch.description}\n\n"
+            "Yes: finish it\nNo: roll it back\nCancel: decide later")
+        if answer is None:
+            return
+        metrics, backend = self.active_metrics(), self.async_backend()
+        self.run_in_background("Recovering...",
+                               lambda: (recover(self.journal, rollback=not answer, progress=self.report_progress,
+                                                metrics=metrics, backend=backend),
+                                        self.journal.undoable_count()),
+                               lambda outcome: self.finish_history("Recovered" if answer else "Rolled back", outcome),
+                               lambda: None)
+        
+    def save_plan(self) -> None:
+        """Save the previewed plan so it can be applied later, here or with 'python -m renamer apply'"""
+        rename_plan = self.preview_plan
+        if rename_plan is None or not rename_plan:
+            messagebox.showinfo("Info", "Preview a rename before saving the plan")
+            return
+        path = filedialog.asksaveasfilename(title="Save Plan", defaultextension=".json",
+                                            filetypes=[("Rename plans", "*.json"), ("All files", "*")])
+        if not path:
+            return
+        self.run_in_background("Saving plan...", lambda: rename_plan.save(path),
+                               lambda _: self.status_var.set(f"Saved plan of {len(rename_plan)} items to {path}"),
+                               lambda: None)
+    
+    def load_plan(self) -> None:
+        """Load a saved plan into the preview; Rename then applies it as saved"""
+        path = filedialog.askopenfilename(title="Load Plan",
+                                          filetypes=[("Rename plans", "*.json"), ("All files", "*")])
+        if not path:
+            return
+        self.run_in_background("Loading plan...", lambda: RenamePlan.load(path), self.show_loaded_plan, lambda: None)
+    
+    def show_loaded_plan(self, rename_plan: RenamePlan) -> None:
+        self.set_config(rename_plan.config)
+        # Keep the GUI's own execution settings so Rename recognizes the plan as current
+        rename_plan.config = self.get_config()
+        self.show_plan(rename_plan)
+        self.status_var.set(f"Loaded plan of {len(rename_plan)} items")
+    
     def clear(self) -> None:
-        self.preview_tree.delete(*self.preview_tree.get_children())
+        self.show_plan(None)
         if self.progress:
             self.progress['value'] = 0
         self.status_var.set("Ready")
@@ -734,6 +1337,10 @@ class EnhancedFileFolderRenamer:
             ("{random}", "Random number (1-1000)"),
             ("{orig_name}", "Original filename"),
             ("{orig_ext}", "Original extension"),
+            ("{sha1:8}", "Content hash, first 8 digits"),
+            ("{size}", "File size in bytes"),
+            ("{mtime}", "Modification time"),
+            ("{exif_date}", "Photo taken date (EXIF)"),
         ]
         
         # Treeview for better display
@@ -0,0 +1,69 @@
+"""Benchmark: thread pool vs. async backend on a simulated high-latency mount
+
+Each rename is delayed by --latency milliseconds, as on an SMB/NFS share,
+and --saturation makes the delay grow once more than that many renames are
+in flight, like a file server that starts queueing:
+
+    python -m benchmarks.bench_async [--files N] [--latency MS] [--saturation N] [--dir PATH]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import renamer.engine
+from renamer import RenameConfig, RenameEngine
+
+from .common import make_flat_tree
+
+
+def simulate_latency(latency: float, saturation: int) -> None:
+    rename = renamer.engine.rename_noreplace
+    lock = threading.Lock()
+    in_flight = 0
+
+    def slow_rename(src: str, dst: str) -> None:
+        nonlocal in_flight
+        with lock:
+            in_flight += 1
+            overload = max(0, in_flight - saturation) if saturation else 0
+        try:
+            time.sleep(latency * (1 + overload))
+            rename(src, dst)
+        finally:
+            with lock:
+                in_flight -= 1
+
+    renamer.engine.rename_noreplace = slow_rename
+
+
+def run(root: str, files: int) -> None:
+    for label, config in (("threads x1", dict(workers=1)), ("threads x8", dict(workers=8)),
+                          ("async", dict(backend="async"))):
+        folder = os.path.join(root, label.replace(" ", "_"))
+        make_flat_tree(folder, files)
+        engine = RenameEngine(RenameConfig(directory=folder, pattern="{orig_name}_a", **config))
+        ops = engine.plan()
+        start = time.perf_counter()
+        result = engine.execute(ops)
+        elapsed = time.perf_counter() - start
+        print(f"{label:10s} {result.renamed} renames in {elapsed:.2f}s ({result.renamed / elapsed:.0f}/s), "
+              f"{result.stats.workers} in flight at most")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2_000)
+    parser.add_argument("--latency", type=float, default=5.0, help="Milliseconds per rename (default: 5)")
+    parser.add_argument("--saturation", type=int, default=0,
+                        help="Renames in flight before the server slows down (default: never)")
+    parser.add_argument("--dir", help="Parent directory for the synthetic tree (default: system temp dir)")
+    args = parser.parse_args()
+    simulate_latency(args.latency / 1000, args.saturation)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        run(tmp, args.files)
+
+
+if __name__ == "__main__":
+    main()
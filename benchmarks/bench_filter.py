@@ -0,0 +1,73 @@
+"""Micro-benchmark: compiled file filters vs. the legacy per-name matches_filter
+
+Run from the repository root:
+
+    python -m benchmarks.bench_filter [--names N] [--filter FILTER]
+"""
+import argparse
+import re
+import time
+
+from renamer.filters import compile_filter
+
+FILTERS = (
+    "*.jpg",
+    "*.jpg,*.jpeg,*.png,*.gif,*.tif,*.raw",
+    "IMG_*,DSC*,*_final*",
+)
+
+EXTENSIONS = (".jpg", ".png", ".txt", ".JPG", ".tar.gz", ".docx", "")
+
+
+def legacy_matches_filter(filter_pattern: str, filename: str) -> bool:
+    """The per-file implementation the GUI shipped before filters were compiled"""
+    filter_pattern = filter_pattern.strip()
+    if not filter_pattern or filter_pattern == "*":
+        return True
+    patterns = [p.strip() for p in filter_pattern.split(",")]
+    for pattern in patterns:
+        if pattern.startswith("*."):
+            ext = pattern[1:]
+            if filename.lower().endswith(ext.lower()):
+                return True
+        elif pattern == "*":
+            return True
+        elif "*" in pattern:
+            regex_pattern = pattern.replace(".", r"\.").replace("*", ".*")
+            if re.match(regex_pattern, filename, re.IGNORECASE):
+                return True
+        else:
+            if filename.lower() == pattern.lower():
+                return True
+    return False
+
+
+def run(spec: str, names: int) -> None:
+    prefixes = ("IMG_", "DSC", "report_", "notes")
+    filenames = [f"{prefixes[i % 4]}{i}{EXTENSIONS[i % len(EXTENSIONS)]}" for i in range(names)]
+
+    start = time.perf_counter()
+    legacy_hits = sum(1 for name in filenames if legacy_matches_filter(spec, name))
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matches = compile_filter(spec)
+    hits = sum(1 for name in filenames if matches(name))
+    compiled = time.perf_counter() - start
+
+    note = "" if hits == legacy_hits else f"  ({hits} vs {legacy_hits} matches)"
+    print(f"{spec:40s} legacy {legacy * 1e9 / names:6.0f} ns/name  "
+          f"compiled {compiled * 1e9 / names:6.0f} ns/name  speedup {legacy / compiled:5.2f}x{note}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=1_000_000)
+    parser.add_argument("--filter", action="append", help="Filter to benchmark (repeatable)")
+    args = parser.parse_args()
+    for spec in args.filter or FILTERS:
+        run(spec, args.names)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Benchmark: rename throughput with and without the on-disk journal
+
+    python -m benchmarks.bench_journal [--files N] [--dir PATH]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from renamer import RenameConfig, RenameEngine
+from renamer.journal import Journal
+
+from .common import make_flat_tree
+
+
+def run(root: str, journal_path: str, files: int) -> None:
+    timings = {}
+    for label, journal in (("no journal", None), ("journal", Journal(journal_path))):
+        folder = os.path.join(root, label.replace(" ", "_"))
+        make_flat_tree(folder, files)
+        engine = RenameEngine(RenameConfig(directory=folder, pattern="{orig_name}_j"), journal)
+        ops = engine.plan()
+        start = time.perf_counter()
+        result = engine.execute(ops)
+        timings[label] = time.perf_counter() - start
+        print(f"{label:10s} {result.renamed} renames in {timings[label]:.2f}s "
+              f"({result.renamed / timings[label]:.0f}/s)")
+        if journal:
+            journal.close()
+            print(f"journal size {os.path.getsize(journal_path) / 1e6:.1f} MB")
+    print(f"overhead {100 * (timings['journal'] / timings['no journal'] - 1):+.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--dir", help="Parent directory for the synthetic tree (default: system temp dir)")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        run(tmp, os.path.join(tmp, "journal.log"), args.files)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark: memory held per item by scans, plans and undo history, path strings vs. compact storage
+
+Builds the structures for a synthetic tree in memory (nothing touches the
+disk) and measures what they retain with tracemalloc. Run from the
+repository root:
+
+    python -m benchmarks.bench_memory [--items N] [--root PATH]
+"""
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+from renamer.columns import PathPairs
+from renamer.engine import OpTable, RenameOp
+from renamer.scan import Folder, Item
+
+FILES_PER_FOLDER = 200
+
+
+@dataclass
+class LegacyOp:
+    """RenameOp as it was before ops shared their folder: four path strings per rename"""
+    rel_path: str
+    new_rel_path: str
+    full_path: str
+    new_full_path: str
+    is_file: bool
+    version: float
+    temporary: bool = False
+
+
+class LegacyItem:
+    __slots__ = ("rel_path", "full_path", "is_file", "is_dir")
+
+    def __init__(self, rel_path: str, full_path: str, is_file: bool, is_dir: bool) -> None:
+        self.rel_path = rel_path
+        self.full_path = full_path
+        self.is_file = is_file
+        self.is_dir = is_dir
+
+
+def synthetic_tree(root: str, items: int) -> List[Tuple[str, str, str]]:
+    """(relative folder, old name, new name) for items files, FILES_PER_FOLDER to a folder"""
+    entries = []
+    for i in range(items):
+        folder = i // FILES_PER_FOLDER
+        rel = os.path.join(f"year_{folder // 100:02d}", f"event_{folder // 10:04d}", f"camera_{folder:05d}", "")
+        entries.append((rel, f"IMG_{i:08d}.jpg", f"holiday_{i:08d}_v1.0.jpg"))
+    return entries
+
+
+def measure(build: Callable[[], object]) -> Tuple[int, float]:
+    """Bytes retained by what build() returns, and the seconds it took"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    kept = build()
+    elapsed = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return retained, elapsed
+
+
+def run(root: str, items: int) -> None:
+    entries = synthetic_tree(root, items)
+    folders = {}
+
+    def folder(rel: str) -> Folder:
+        if rel not in folders:
+            folders[rel] = Folder(rel, os.path.join(root, rel))
+        return folders[rel]
+
+    def legacy_items() -> object:
+        return [LegacyItem(rel + name, os.path.join(root, rel, name), True, False) for rel, name, _ in entries]
+
+    def compact_items() -> object:
+        # A scan creates every name afresh, so do not share the strings of entries
+        return [Item(folder(rel), name.encode().decode(), True, False) for rel, name, _ in entries]
+
+    def legacy_plan() -> object:
+        return [LegacyOp(rel + name, rel + new, os.path.join(root, rel, name), os.path.join(root, rel, new), True, 1.0)
+                for rel, name, new in entries]
+
+    def compact_plan() -> object:
+        return OpTable(RenameOp(folder(rel), name, new, True, 1.0) for rel, name, new in entries)
+
+    def legacy_history() -> object:
+        return [(os.path.join(root, rel, new), os.path.join(root, rel, name)) for rel, name, new in entries]
+
+    def compact_history() -> object:
+        return PathPairs((os.path.join(root, rel, new), os.path.join(root, rel, name)) for rel, name, new in entries)
+
+    print(f"{items} items under {root}, {FILES_PER_FOLDER} per folder")
+    for label, legacy, compact in (("scan items", legacy_items, compact_items),
+                                   ("plan", legacy_plan, compact_plan),
+                                   ("undo history", legacy_history, compact_history)):
+        folders.clear()
+        old_bytes, old_time = measure(legacy)
+        new_bytes, new_time = measure(compact)
+        print(f"{label:13s} path strings {old_bytes / items:7.1f} B/item ({old_time:5.2f}s)  "
+              f"compact {new_bytes / items:7.1f} B/item ({new_time:5.2f}s)  {old_bytes / new_bytes:5.1f}x smaller")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--root", default=os.path.join(os.sep, "srv", "shares", "photos", "archive"),
+                        help="Folder the synthetic paths live under; longer roots favour the compact layout")
+    args = parser.parse_args()
+    run(args.root, args.items)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Micro-benchmark: rule pipeline compiled once per batch vs. rebuilt for every name
+
+Run from the repository root:
+
+    python -m benchmarks.bench_rules [--items N] [--preset NAME]
+"""
+import argparse
+import time
+from typing import Any, Dict, List
+
+from renamer.rules import compile_rule, compile_rules, get_preset
+
+NAMES = ("My Photo (copy) Ünïcode", "résumé  draft__final", "IMG_2024-01-15 at 10.30.45", "Straße & Café No. 7")
+
+
+def per_item(rules: List[Dict[str, Any]], name: str) -> str:
+    """Apply the rules the naive way: every regex and table set up again for each name"""
+    for rule in rules:
+        name = compile_rule(rule)(name)
+    return name
+
+
+def run(preset: str, items: int) -> None:
+    rules = get_preset(preset)
+    names = [f"{NAMES[i % len(NAMES)]} {i}" for i in range(items)]
+
+    start = time.perf_counter()
+    for name in names:
+        per_item(rules, name)
+    naive = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pipeline = compile_rules(rules)
+    for name in names:
+        pipeline(name)
+    compiled = time.perf_counter() - start
+
+    print(f"{preset:15s} per item {naive * 1e6 / items:7.2f} us/name  "
+          f"compiled {compiled * 1e6 / items:7.2f} us/name  speedup {naive / compiled:5.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=200_000)
+    parser.add_argument("--preset", action="append", help="Preset to benchmark (repeatable)")
+    args = parser.parse_args()
+    for preset in args.preset or ("tidy-spaces", "web-safe"):
+        run(preset, args.items)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark: os.scandir enumeration vs. the legacy listdir + isfile/isdir scan
+
+Run from the repository root (use --dir to point at an NFS/SMB mount):
+
+    python -m benchmarks.bench_scan [--files N] [--folders N] [--dir PATH]
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import List, Tuple
+
+from renamer import RenameConfig, RenameEngine
+
+from .common import count_os_calls, make_flat_tree
+
+
+def legacy_scan(engine: RenameEngine) -> List[Tuple[str, bool]]:
+    """Non-recursive get_items as the GUI shipped it, plus the isfile check preview did per item"""
+    directory = engine.config.directory
+    if not os.path.isdir(directory):
+        return []
+    items = []
+    for f in os.listdir(directory):
+        full_path = os.path.join(directory, f)
+        if os.path.isfile(full_path) and engine.matches_filter(f):
+            items.append((f, full_path))
+    for f in os.listdir(directory):
+        full_path = os.path.join(directory, f)
+        if os.path.isdir(full_path):
+            items.append((f, full_path))
+    items.sort(key=lambda x: x[0])
+    return [(rel_path, os.path.isfile(full_path)) for rel_path, full_path in items]
+
+
+def run(directory: str) -> None:
+    engine = RenameEngine(RenameConfig(directory=directory))
+
+    for label, scan in (("legacy", lambda: legacy_scan(engine)),
+                        ("scandir", lambda: [(i.rel_path, i.is_file) for i in engine.get_items()])):
+        with count_os_calls() as calls:
+            start = time.perf_counter()
+            result = scan()
+            elapsed = time.perf_counter() - start
+        summary = ", ".join(f"{name}={count}" for name, count in sorted(calls.items()))
+        print(f"{label:8s} {len(result):8d} items  {elapsed:7.3f}s  syscalls: {sum(calls.values())} ({summary})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=50_000)
+    parser.add_argument("--folders", type=int, default=5_000)
+    parser.add_argument("--dir", help="Parent directory for the synthetic tree (default: system temp dir)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        make_flat_tree(tmp, args.files, args.folders)
+        run(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark: arrival-to-rename latency of the watch daemon, inotify vs. polling
+
+Drops files into a watched folder at a steady rate and measures how long
+each waits, settle time included, until the daemon has renamed it.
+
+    python -m benchmarks.bench_watch [--files N] [--rate PER_MINUTE] [--settle SECONDS] [--dir PATH]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from renamer import RenameConfig, RenameResult
+from renamer.journal import Journal
+from renamer.watch import WatchDaemon
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(root: str, files: int, rate: float, settle: float, poll: bool) -> None:
+    label = "polling" if poll else "inotify"
+    folder = os.path.join(root, label)
+    os.makedirs(folder)
+    journal = Journal(os.path.join(root, f"{label}.log"))
+    daemon = WatchDaemon(RenameConfig(directory=folder, pattern="{orig_name}_{counter}"), journal,
+                         state_path=os.path.join(root, f"{label}.json"), settle=settle, poll=poll)
+    arrived: Dict[str, float] = {}
+    latencies: List[float] = []
+    batches = 0
+
+    def report(result: RenameResult) -> None:
+        nonlocal batches
+        done = time.perf_counter()
+        batches += 1
+        for _, old_path in result.batch:
+            if old_path in arrived:
+                latencies.append(done - arrived.pop(old_path))
+
+    stop = threading.Event()
+    thread = threading.Thread(target=daemon.run, args=(stop, report))
+    thread.start()
+    interval = 60.0 / rate
+    start = time.perf_counter()
+    for i in range(files):
+        delay = start + i * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        path = os.path.join(folder, f"arrival_{i:06d}.dat")
+        arrived[path] = time.perf_counter()
+        with open(path, "wb") as f:
+            f.write(b"x" * 4096)
+    while arrived and time.perf_counter() - start < files * interval + 10 * settle + 5:
+        time.sleep(0.05)
+    stop.set()
+    thread.join()
+    daemon.close()
+    journal.close()
+
+    print(f"{label:8s} {len(latencies)}/{files} renamed in {batches} batches; latency "
+          f"p50 {percentile(latencies, 0.5) * 1000:6.0f} ms  p95 {percentile(latencies, 0.95) * 1000:6.0f} ms  "
+          f"max {max(latencies) * 1000:6.0f} ms (settle {settle * 1000:.0f} ms)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=6000, help="Arrivals per minute")
+    parser.add_argument("--settle", type=float, default=0.2)
+    parser.add_argument("--dir", help="Parent directory for the watched folders (default: system temp dir)")
+    args = parser.parse_args()
+    print(f"{args.files} arrivals at {args.rate:.0f}/min")
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for poll in (False, True):
+            run(tmp, args.files, args.rate, args.settle, poll)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Helpers shared by the benchmark scripts"""
+import os
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+
+# os functions that map to one filesystem syscall (or one directory listing)
+COUNTED_CALLS = ("stat", "lstat", "listdir", "scandir", "rename", "replace")
+
+
+@contextmanager
+def count_os_calls() -> Iterator[Counter]:
+    """Count calls to the os functions in COUNTED_CALLS made while the block runs.
+
+    os.path.isfile/isdir/exists go through os.stat and are counted as stats.
+    DirEntry.is_file()/is_dir() are not visible here; on Linux and Windows
+    they are answered from the directory listing without a syscall.
+    """
+    counts: Counter = Counter()
+    originals = {name: getattr(os, name) for name in COUNTED_CALLS}
+
+    def wrap(name, func):
+        def counted(*args, **kwargs):
+            counts[name] += 1
+            return func(*args, **kwargs)
+        return counted
+
+    for name, func in originals.items():
+        setattr(os, name, wrap(name, func))
+    try:
+        yield counts
+    finally:
+        for name, func in originals.items():
+            setattr(os, name, func)
+
+
+def make_flat_tree(root: str, files: int, folders: int = 0) -> None:
+    """Create empty files and folders directly under root"""
+    os.makedirs(root, exist_ok=True)
+    for i in range(files):
+        open(os.path.join(root, f"file_{i:07d}.txt"), "w").close()
+    for i in range(folders):
+        os.mkdir(os.path.join(root, f"folder_{i:07d}"))
+
+
+def make_deep_tree(root: str, nodes: int, fanout: int = 4, files_per_dir: int = 3) -> int:
+    """Create a tree of roughly `nodes` files and folders, breadth first.
+
+    Every folder gets files_per_dir files and up to fanout subfolders.
+    Returns the number of entries created.
+    """
+    os.makedirs(root, exist_ok=True)
+    created = 0
+    queue = [root]
+    head = 0
+    while head < len(queue) and created < nodes:
+        folder = queue[head]
+        head += 1
+        for i in range(files_per_dir):
+            if created >= nodes:
+                break
+            open(os.path.join(folder, f"file_{i}.txt"), "w").close()
+            created += 1
+        for i in range(fanout):
+            if created >= nodes:
+                break
+            sub = os.path.join(folder, f"dir_{i}")
+            os.mkdir(sub)
+            queue.append(sub)
+            created += 1
+    return created
+
+
+def tree_listing(root: str) -> list:
+    """Sorted relative paths of everything under root"""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel = os.path.relpath(dirpath, root)
+        paths.extend(os.path.normpath(os.path.join(rel, name)) for name in dirnames + filenames)
+    return sorted(paths)
+
+
+def filesystem_type(path: str) -> str:
+    """Filesystem type of the mount holding path, from /proc/mounts ("unknown" elsewhere)"""
+    path = os.path.realpath(path)
+    best, fstype = "", "unknown"
+    try:
+        with open("/proc/mounts") as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace("\\040", " ")
+                inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+                if inside and len(mount_point) >= len(best):
+                    best, fstype = mount_point, fields[2]
+    except OSError:
+        pass
+    return fstype
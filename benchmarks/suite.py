@@ -0,0 +1,200 @@
+"""Benchmark suite: time every stage of a rename run on synthetic trees
+
+Builds each tree shape in each location (tmpfs and local disk by default),
+then times scan, filter, name generation, collision check, rename and undo,
+the last two once per executor mode. Results go to stdout as a table and,
+with --output, to a JSON file that a later run can be compared against:
+
+    python -m benchmarks.suite [--shape flat|deep|mixed ...] [--entries N]
+                               [--location PATH ...] [--workers N ...]
+                               [--journal] [--output results.json]
+                               [--compare baseline.json [--tolerance 0.25]]
+
+A flat directory with a million entries: --shape flat --entries 1000000.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from renamer import RenameConfig, RenameEngine
+from renamer.journal import Journal
+from renamer.scan import filter_items, iter_directory
+
+from .common import filesystem_type, make_deep_tree, make_flat_tree
+
+RESULTS_FORMAT = 1
+
+# Stages that do not depend on the executor mode are timed once per tree
+SCAN_STAGES = ("scan", "filter", "name", "collision")
+EXECUTE_STAGES = ("rename", "undo")
+
+FILTER = "*.txt,!*_skip*"
+
+
+def build_flat(root: str, entries: int) -> None:
+    """One folder holding every entry, a tenth of them subfolders"""
+    make_flat_tree(root, entries - entries // 10, entries // 10)
+
+
+def build_deep(root: str, entries: int) -> None:
+    """Binary tree of folders with two files each, about log2(entries) levels deep"""
+    make_deep_tree(root, entries, fanout=2, files_per_dir=2)
+
+
+def build_mixed(root: str, entries: int) -> None:
+    """A few levels of folders with 40 files each, like a typical share"""
+    make_deep_tree(root, entries, fanout=8, files_per_dir=40)
+
+
+SHAPES: Dict[str, Callable[[str, int], None]] = {"flat": build_flat, "deep": build_deep, "mixed": build_mixed}
+
+
+def default_locations() -> List[str]:
+    """tmpfs when available, plus the system temp directory (usually a local disk)"""
+    locations = []
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        locations.append("/dev/shm")
+    temp = tempfile.gettempdir()
+    if filesystem_type(temp) != "tmpfs" or not locations:
+        locations.append(temp)
+    return locations
+
+
+def timed(stage: str, record: Callable[[str, float, int], None], work: Callable[[], Any],
+          count: Callable[[Any], int] = len) -> Any:
+    start = time.perf_counter()
+    value = work()
+    record(stage, time.perf_counter() - start, count(value))
+    return value
+
+
+def run_tree(root: str, workers: List[int], use_journal: bool, journal_path: str,
+             record: Callable[[str, float, int, Optional[int]], None]) -> bool:
+    """Time every stage on one tree; returns False if a rename or undo failed"""
+    config = RenameConfig(directory=root, pattern="{orig_name}_b{counter}", recursive=True, file_filter=FILTER)
+    engine = RenameEngine(config)
+
+    def once(stage: str, seconds: float, items: int) -> None:
+        record(stage, seconds, items, None)
+
+    items = timed("scan", once, lambda: list(iter_directory(root, recursive=True)))
+    matches = engine.compile_filter()
+    items = timed("filter", once, lambda: sorted(filter_items(items, matches), key=attrgetter("rel_path")))
+    ops = timed("name", once, lambda: list(engine.name_items(items)))
+    ops = timed("collision", once, lambda: engine.preflight(ops)[0])
+
+    ok = True
+    for count in workers:
+        config.workers = count
+        journal = Journal(journal_path) if use_journal else None
+        runner = RenameEngine(config, journal)
+
+        def per_mode(stage: str, seconds: float, items: int) -> None:
+            record(stage, seconds, items, count)
+
+        try:
+            result = timed("rename", per_mode, lambda: runner.execute(ops), attrgetter("renamed"))
+            undo = timed("undo", per_mode, lambda: RenameEngine.undo(result.batch), attrgetter("renamed"))
+        finally:
+            if journal:
+                journal.close()
+        if result.errors or undo.errors or result.renamed != len(ops):
+            ok = False
+            for error in (result.errors + undo.errors)[:5]:
+                print(f"  {error}", file=sys.stderr)
+    return ok
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> List[str]:
+    """Stages that got slower than the baseline by more than tolerance (a fraction)"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    def key(row: Dict[str, Any]) -> Tuple[Any, ...]:
+        return row["shape"], row["entries"], row["fstype"], row["stage"], row["workers"]
+
+    before = {key(row): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        old = before.get(key(row))
+        if old is None or not old["seconds"]:
+            continue
+        change = row["seconds"] / old["seconds"] - 1
+        if change > tolerance:
+            shape, entries, fstype, stage, workers = key(row)
+            mode = f" workers={workers}" if workers is not None else ""
+            regressions.append(f"{shape}/{entries} on {fstype} {stage}{mode}: "
+                               f"{old['seconds']:.3f}s -> {row['seconds']:.3f}s ({change:+.0%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shape", action="append", choices=sorted(SHAPES), help="Tree shape (repeatable, default: all)")
+    parser.add_argument("--entries", type=int, action="append", help="Entries per tree (repeatable, default: 100000)")
+    parser.add_argument("--location", action="append",
+                        help="Directory to build trees in (repeatable, default: /dev/shm and the system temp dir)")
+    parser.add_argument("--workers", type=int, action="append", help="Executor modes to compare (default: 1 and 8)")
+    parser.add_argument("--journal", action="store_true", help="Write the rename journal during rename")
+    parser.add_argument("--output", metavar="FILE", help="Write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="Fail when a stage is slower than in this results file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown against --compare, as a fraction (default: %(default)s)")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    ok = True
+    print(f"{'shape':6s} {'entries':>8s} {'fs':8s} {'stage':10s} {'workers':>7s} {'items':>8s} "
+          f"{'seconds':>8s} {'items/s':>10s}")
+    for location in args.location or default_locations():
+        fstype = filesystem_type(location)
+        for shape in args.shape or sorted(SHAPES):
+            for entries in args.entries or [100_000]:
+                with tempfile.TemporaryDirectory(dir=location) as tmp:
+                    root = os.path.join(tmp, "tree")
+                    SHAPES[shape](root, entries)
+
+                    def record(stage: str, seconds: float, items: int, workers: Optional[int]) -> None:
+                        row = {"shape": shape, "entries": entries, "location": location, "fstype": fstype,
+                               "stage": stage, "workers": workers, "items": items, "seconds": round(seconds, 6)}
+                        results.append(row)
+                        rate = items / seconds if seconds else 0.0
+                        print(f"{shape:6s} {entries:8d} {fstype:8s} {stage:10s} {workers or '':>7} {items:8d} "
+                              f"{seconds:8.3f} {rate:10.0f}", flush=True)
+
+                    ok = run_tree(root, args.workers or [1, 8], args.journal,
+                                  os.path.join(tmp, "journal.log"), record) and ok
+
+    if args.output:
+        report = {
+            "format": RESULTS_FORMAT,
+            "created": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "journal": args.journal,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+
+    if not ok:
+        print("FAILED: some renames or undos did not complete", file=sys.stderr)
+        return 1
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+"""Headless rename engine shared by the GUI and the command line"""
+from .engine import (
+    DEFAULT_PATTERN,
+    RenameCancelled,
+    RenameConfig,
+    RenameEngine,
+    RenameOp,
+    RenamePlan,
+    RenameResult,
+    RenamerError,
+)
+from .scan import Folder, Item, scan_directory
+
+__all__ = [
+    "DEFAULT_PATTERN",
+    "Folder",
+    "Item",
+    "RenameCancelled",
+    "RenameConfig",
+    "RenameEngine",
+    "RenameOp",
+    "RenamePlan",
+    "RenameResult",
+    "RenamerError",
+    "scan_directory",
+]
@@ -0,0 +1,278 @@
+import asyncio
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from .executor import (BACKENDS, DEFAULT_MAX_CONCURRENCY, DEFAULT_WINDOW, ExecutorStats, ProgressCallback,
+                       WorkerStats, split_shard, windows)
+from .scan import Folder, Item
+
+T = TypeVar("T")
+
+# Calls in flight when a run starts; the limit then grows while latency holds
+INITIAL_CONCURRENCY = 4
+
+# Latencies per adjustment, and how much slower than the best seen still counts as healthy
+SAMPLE_SIZE = 32
+LATENCY_TOLERANCE = 0.5
+
+
+def mount_point(path: str) -> str:
+    """The mount point holding path, found by walking up until os.path.ismount"""
+    path = os.path.abspath(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+class RateLimiter:
+    """Token bucket allowing rate calls per second, with bursts of up to one second's worth"""
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.tokens = max(1.0, rate)
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveLimit:
+    """Concurrency limit tuned by additive increase, multiplicative decrease.
+
+    Every SAMPLE_SIZE calls the median latency is compared with the best
+    median seen so far: while it stays within LATENCY_TOLERANCE of it the
+    limit grows by one, once it degrades the limit is halved. On a server
+    that is only latency-bound this ramps up to the maximum; on one that
+    starts queueing it settles just below the point where it slows down.
+    """
+
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, maximum: int = DEFAULT_MAX_CONCURRENCY) -> None:
+        self.maximum = max(1, maximum)
+        self.limit = max(1, min(initial, self.maximum))
+        self.peak = self.limit
+        self.active = 0
+        self.best: Optional[float] = None
+        self._samples: List[float] = []
+        self._changed: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _condition(self) -> asyncio.Condition:
+        # One per event loop; the learned limit carries over from run to run
+        loop = asyncio.get_event_loop()
+        if self._changed is None or self._loop is not loop:
+            self._changed = asyncio.Condition()
+            self._loop = loop
+            self.active = 0
+        return self._changed
+
+    async def acquire(self) -> None:
+        changed = self._condition()
+        async with changed:
+            await changed.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self, latency: float) -> None:
+        changed = self._condition()
+        async with changed:
+            self.active -= 1
+            self._record(latency)
+            # Wake only as many waiters as there are free slots; waking all of them would stampede
+            changed.notify(max(0, self.limit - self.active))
+
+    def _record(self, latency: float) -> None:
+        self._samples.append(latency)
+        if len(self._samples) < SAMPLE_SIZE:
+            return
+        median = statistics.median(self._samples)
+        self._samples.clear()
+        if self.best is None or median < self.best:
+            self.best = median
+        if median <= self.best * (1 + LATENCY_TOLERANCE):
+            self.limit = min(self.maximum, self.limit + 1)
+            self.peak = max(self.peak, self.limit)
+        else:
+            self.limit = max(1, self.limit // 2)
+
+
+class AsyncBackend:
+    """Runs blocking filesystem calls from asyncio through a bounded thread pool.
+
+    Network mounts are bound by round trips, not CPU, so many calls are
+    kept in flight at once; how many is decided by AdaptiveLimit, capped at
+    max_concurrency. rate_limits caps calls per second on each mount, keyed
+    by mount point, with "" as the default for mounts not listed.
+
+    run() and scan() are plain generators, so callers outside asyncio use
+    them like run_sharded() and iter_directory().
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 rate_limits: Optional[Dict[str, float]] = None) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_limits = {(os.path.abspath(k) if k else ""): v for k, v in (rate_limits or {}).items() if v > 0}
+        self.limit = AdaptiveLimit(maximum=self.max_concurrency)
+        self._limiters: Dict[str, Optional[RateLimiter]] = {}
+        self._mounts: Dict[str, str] = {}
+
+    def _limiter(self, path: str) -> Optional[RateLimiter]:
+        if not self.rate_limits:
+            return None
+        folder = os.path.dirname(path)
+        mount = self._mounts.get(folder)
+        if mount is None:
+            mount = self._mounts[folder] = mount_point(folder)
+        if mount not in self._limiters:
+            rate = self.rate_limits.get(mount, self.rate_limits.get(""))
+            self._limiters[mount] = RateLimiter(rate) if rate else None
+        return self._limiters[mount]
+
+    async def call(self, pool: ThreadPoolExecutor, path: str, func: Callable[..., T], *args: Any) -> T:
+        """Run func(*args), a call touching path, once the mount's rate and the concurrency limit allow"""
+        limiter = self._limiter(path)
+        if limiter is not None:
+            await limiter.acquire()
+        await self.limit.acquire()
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_event_loop().run_in_executor(pool, func, *args)
+        finally:
+            await self.limit.release(time.perf_counter() - start)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="rename-async")
+
+    def run(self, tasks: Iterable[T], apply: Callable[[T], Optional[str]], path_of: Callable[[T], str],
+            shard_key: Callable[[T], str], progress: Optional[ProgressCallback] = None, total: int = 0,
+            stats: Optional[ExecutorStats] = None, window: int = DEFAULT_WINDOW,
+            conflict_keys: Optional[Callable[[T], Iterable[str]]] = None,
+            barrier: Optional[Callable[[T], object]] = None,
+            cancelled: Optional[Callable[[], bool]] = None,
+            before_window: Optional[Callable[[List[T]], None]] = None) -> Iterator[Tuple[T, Optional[str]]]:
+        """Same contract as run_sharded(), with apply() calls issued concurrently.
+
+        Tasks in one shard that share a conflict key run in order, one at a
+        time; everything else in a window may be in flight together.
+        Cancellation takes effect between windows, so the tasks that ran are
+        always a prefix of the input, as the journal expects.
+        """
+        stats = stats if stats is not None else ExecutorStats(workers=self.max_concurrency)
+        worker = stats.per_worker.setdefault("async", WorkerStats("async"))
+        done = 0
+        started = time.perf_counter()
+        loop = asyncio.new_event_loop()
+        pool = self._pool()
+
+        async def run_group(group: List[Tuple[int, T]], errors: List[Optional[str]]) -> None:
+            nonlocal done
+            for index, task in group:
+                error = await self.call(pool, path_of(task), apply, task)
+                errors[index] = error
+                worker.operations += 1
+                if error:
+                    worker.errors += 1
+                done += 1
+                if progress:
+                    progress(done, total)
+
+        async def run_window(chunk: List[T], errors: List[Optional[str]]) -> None:
+            shards: Dict[str, List[Tuple[int, T]]] = {}
+            for index, task in enumerate(chunk):
+                shards.setdefault(shard_key(task), []).append((index, task))
+            groups: List[List[Tuple[int, T]]] = []
+            for shard in shards.values():
+                if conflict_keys is None:
+                    groups.append(shard)
+                elif len(shard) > 1:
+                    groups.extend(split_shard(shard, conflict_keys, len(shard)))
+                else:
+                    groups.append(shard)
+            await asyncio.gather(*(run_group(group, errors) for group in groups))
+
+        try:
+            for chunk in windows(tasks, window, barrier):
+                if cancelled and cancelled():
+                    break
+                if before_window:
+                    before_window(chunk)
+                errors: List[Optional[str]] = [None] * len(chunk)
+                begin = time.perf_counter()
+                loop.run_until_complete(run_window(chunk, errors))
+                worker.busy += time.perf_counter() - begin
+                stats.operations += len(chunk)
+                stats.workers = self.limit.peak
+                stats.elapsed = time.perf_counter() - started
+                for index, task in enumerate(chunk):
+                    yield task, errors[index]
+        finally:
+            pool.shutdown(wait=True)
+            loop.close()
+            stats.elapsed = time.perf_counter() - started
+
+    def scan(self, directory: str, recursive: bool = False, include_files: bool = True,
+             include_folders: bool = True) -> Iterator[Item]:
+        """Like iter_directory(), but lists all folders of one tree level concurrently.
+
+        Entries come out level by level rather than depth first; callers
+        sort them anyway.
+        """
+        loop = asyncio.new_event_loop()
+        pool = self._pool()
+
+        async def list_level(level: List[Tuple[str, str]]) -> List[Any]:
+            return await asyncio.gather(*(self.call(pool, path, _list_folder, path) for path, _ in level),
+                                        return_exceptions=True)
+
+        try:
+            # The root must be readable; unreadable subfolders are skipped
+            level = [(directory, "")]
+            first = True
+            while level:
+                listings = loop.run_until_complete(list_level(level))
+                if first and isinstance(listings[0], BaseException):
+                    raise listings[0]
+                first = False
+                next_level = []
+                for (path, rel_root), listing in zip(level, listings):
+                    if isinstance(listing, BaseException):
+                        continue
+                    folder = Folder(rel_root, os.path.join(path, ""))
+                    for name, full_path, is_dir, is_file, is_link in listing:
+                        if is_dir:
+                            if include_folders:
+                                yield Item(folder, name, False, True)
+                            if recursive and not is_link:
+                                next_level.append((full_path, rel_root + name + os.sep))
+                        elif is_file and include_files:
+                            yield Item(folder, name, True, False)
+                level = next_level
+        finally:
+            pool.shutdown(wait=True)
+            loop.close()
+
+
+def _list_folder(path: str) -> List[Tuple[str, str, bool, bool, bool]]:
+    """One folder's entries with their types, read on a pool thread"""
+    listing = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+                is_file = not is_dir and entry.is_file()
+                is_link = is_dir and entry.is_symlink()
+            except OSError:
+                continue
+            listing.append((entry.name, entry.path, is_dir, is_file, is_link))
+    return listing
@@ -0,0 +1,531 @@
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .engine import (
+    CASE_OPTIONS,
+    DEFAULT_PATTERN,
+    VERSION_STRATEGIES,
+    RenameConfig,
+    RenameEngine,
+    RenameOp,
+    RenamePlan,
+    RenameResult,
+    RenamerError,
+)
+from .estimate import DEFAULT_PREVIEW, DEFAULT_SAMPLE_DIRS, estimate_tree
+from .executor import BACKENDS, DEFAULT_MAX_CONCURRENCY
+from .jobs import DEFAULT_JOBS, JobManifest, JobRunner
+from .journal import DEFAULT_UNDO_WORKERS, JOURNAL_ENV, Journal, recover, redo_last, undo_last
+from .metrics import PROFILE_MODES, Metrics, profiled
+from .preflight import COLLISION_MODES
+from .rules import CASE_MODES, PRESETS_ENV, RuleError, delete_preset, describe_rule, get_preset, load_presets, save_preset
+from .snapshot import INDEX_ENV
+from .watch import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE, WATCH_ENV, WatchDaemon
+
+if TYPE_CHECKING:
+    from .aio import AsyncBackend
+
+
+def split_words(value: str) -> List[str]:
+    """Split a comma-separated word list, dropping empty entries"""
+    return [w.strip() for w in value.split(",") if w.strip()]
+
+
+def rate_limit(value: str) -> Tuple[str, float]:
+    """Parse OPS or MOUNT=OPS; a bare number applies to every mount"""
+    mount, _, rate = value.rpartition("=")
+    try:
+        return mount, float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected OPS or MOUNT=OPS, got {value!r}") from None
+
+
+def add_backend_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options choosing how filesystem calls are issued"""
+    parser.add_argument("--backend", choices=BACKENDS, default="threads",
+                        help="async keeps many calls in flight, for high-latency network mounts "
+                             "(default: %(default)s)")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY, metavar="N",
+                        help="Most calls in flight with --backend async; fewer are used while latency "
+                             "degrades (default: %(default)s)")
+    parser.add_argument("--rate-limit", type=rate_limit, action="append", default=[], metavar="[MOUNT=]OPS",
+                        help="With --backend async, at most OPS calls per second on each mount, or on MOUNT only "
+                             "(repeatable)")
+
+
+class RuleAction(argparse.Action):
+    """Append one rename rule, built by const from the option's values, keeping the command line order"""
+
+    def __call__(self, parser: argparse.ArgumentParser, namespace: argparse.Namespace, values: Any,
+                 option_string: Optional[str] = None) -> None:
+        rules = list(getattr(namespace, self.dest) or [])
+        rules.append(self.const(values))
+        setattr(namespace, self.dest, rules)
+
+
+def add_rule_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the rule options; rules run after the pattern, in the order given"""
+    group = parser.add_argument_group("rules", "Applied to each new name after the pattern, in the order given")
+
+    def rule(*flags: str, build: Callable[[Any], Dict[str, Any]], **kwargs: Any) -> None:
+        group.add_argument(*flags, dest="rules", action=RuleAction, const=build, default=[], **kwargs)
+
+    rule("--replace", nargs=2, metavar=("REGEX", "REPLACEMENT"), help="Replace regex matches (\\1 for groups)",
+         build=lambda v: {"kind": "replace", "pattern": v[0], "replacement": v[1]})
+    rule("--strip", metavar="CHARS", help="Remove these characters everywhere",
+         build=lambda v: {"kind": "strip", "chars": v})
+    rule("--strip-ends", metavar="CHARS", help="Remove these characters from both ends",
+         build=lambda v: {"kind": "strip", "chars": v, "where": "ends"})
+    rule("--ascii", nargs=0, help="Transliterate accented and other letters to ASCII",
+         build=lambda v: {"kind": "transliterate", "ascii": True})
+    rule("--transliterate", nargs=2, metavar=("FROM", "TO"), help="Map each character of FROM to the one in TO",
+         build=lambda v: {"kind": "transliterate", "from": v[0], "to": v[1]})
+    rule("--trim", type=int, metavar="N", help="Cut names to N characters, keeping the extension",
+         build=lambda v: {"kind": "trim", "length": v})
+    rule("--case-in", nargs=2, metavar=("MODE", "REGEX"),
+         help=f"Change case ({', '.join(CASE_MODES)}) of the first group of REGEX matches, or the whole match",
+         build=lambda v: {"kind": "case", "mode": v[0], "pattern": v[1]})
+    rule("--preset", metavar="NAME", help=f"Rules saved as a preset (see 'presets'; stored in ${PRESETS_ENV} "
+                                          f"or ~/.renamer/presets.json)",
+         build=lambda v: {"preset": v})
+    rule("--rules", metavar="FILE", help="Rules from a JSON file holding a list of rule objects",
+         build=lambda v: {"file": v})
+
+
+def expand_rules(entries: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Replace --preset and --rules entries with the rules they name, so configs stay self-contained"""
+    rules: List[Dict[str, Any]] = []
+    try:
+        for entry in entries:
+            if "preset" in entry:
+                rules.extend(get_preset(entry["preset"]))
+            elif "file" in entry:
+                with open(entry["file"], encoding="utf-8") as f:
+                    loaded = json.load(f)
+                if not isinstance(loaded, list):
+                    raise RuleError(f"{entry['file']} does not hold a list of rules")
+                rules.extend(loaded)
+            else:
+                rules.append(entry)
+    except RuleError as e:
+        raise RenamerError(str(e)) from None
+    except (OSError, ValueError) as e:
+        raise RenamerError(f"Cannot read rules: {e}") from None
+    return rules
+
+
+def rate_limits(args: argparse.Namespace) -> Dict[str, float]:
+    return dict(args.rate_limit)
+
+
+def backend_from_args(args: argparse.Namespace) -> Optional["AsyncBackend"]:
+    if args.backend != "async":
+        return None
+    from .aio import AsyncBackend  # asyncio is slow to import; only the async backend needs it
+    return AsyncBackend(args.max_concurrency, rate_limits(args))
+
+
+def add_config_arguments(parser: argparse.ArgumentParser, directory: bool = True) -> None:
+    """Add the options that map onto RenameConfig fields"""
+    if directory:
+        parser.add_argument("directory", help="Directory whose entries are renamed")
+    parser.add_argument("-p", "--pattern", default=DEFAULT_PATTERN, help="Rename pattern (default: %(default)s)")
+    parser.add_argument("--counter", type=int, default=1, help="Start counter (default: %(default)s)")
+    parser.add_argument("--version-start", default="1.0", help="Version start (default: %(default)s)")
+    parser.add_argument("--version-increment", type=float, default=0.1, help="Version increment (default: %(default)s)")
+    parser.add_argument("--version-strategy", choices=VERSION_STRATEGIES, default="fixed")
+    parser.add_argument("--no-files", action="store_true", help="Do not rename files")
+    parser.add_argument("--no-folders", action="store_true", help="Do not rename folders")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Include subdirectories")
+    parser.add_argument("-f", "--filter", default="*",
+                        help="File filter, e.g. '*.jpg,*.png', 'IMG_*,!*.tmp' or 're:^\\d+' (default: %(default)s)")
+    parser.add_argument("--case", choices=CASE_OPTIONS, default="none")
+    parser.add_argument("--list1", type=split_words, default=[], help="Comma-separated words for {list1}")
+    parser.add_argument("--list2", type=split_words, default=[], help="Comma-separated prefixes for {prefix}")
+    parser.add_argument("--on-collision", choices=COLLISION_MODES, default="skip",
+                        help="When a new name is taken: skip the item, add _2, _3, ..., or (unique) draw the "
+                             "random tokens without repeats before adding a suffix (default: %(default)s)")
+    parser.add_argument("--sort-buffer", type=int, default=0, metavar="N",
+                        help="Sort with at most N items in memory, spilling the rest to temp files (default: in memory)")
+    parser.add_argument("--index", action="store_true",
+                        help=f"Keep a snapshot index of the tree and only rescan folders that changed "
+                             f"(stored under ${INDEX_ENV} or ~/.renamer/index)")
+    parser.add_argument("--seed", type=int, metavar="N",
+                        help="Seed for {list1}, {prefix}, {random} and random versions, to reproduce a run "
+                             "(default: a new one, printed with the preview)")
+    parser.add_argument("--hash-workers", type=int, default=0, metavar="N",
+                        help="Processes reading files for {sha1} and {exif_date} (default: one per CPU)")
+    add_backend_arguments(parser)
+    add_rule_arguments(parser)
+
+
+def config_from_args(args: argparse.Namespace) -> RenameConfig:
+    return RenameConfig(
+        directory=getattr(args, "directory", ""),
+        pattern=args.pattern,
+        start_counter=args.counter,
+        version_start=args.version_start,
+        version_increment=args.version_increment,
+        version_strategy=args.version_strategy,
+        include_files=not args.no_files,
+        include_folders=not args.no_folders,
+        recursive=args.recursive,
+        file_filter=args.filter,
+        case_option=args.case,
+        list1=args.list1,
+        list2=args.list2,
+        sort_buffer=args.sort_buffer,
+        workers=getattr(args, "workers", 1),
+        use_index=args.index,
+        on_collision=args.on_collision,
+        backend=args.backend,
+        max_concurrency=args.max_concurrency,
+        rate_limits=rate_limits(args),
+        hash_workers=args.hash_workers,
+        seed=args.seed,
+        rules=expand_rules(args.rules),
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="renamer", description="Batch rename files and folders using patterns")
+    parser.add_argument("--journal", metavar="PATH",
+                        help=f"Rename journal used for undo, redo and recovery (default: ${JOURNAL_ENV} "
+                             f"or ~/.renamer/journal.log)")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="Collect per-stage timings, latency histograms and syscall counts, print a summary "
+                             "and write them to FILE (Prometheus text format for .prom/.txt, JSON otherwise)")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default="off",
+                        help="Profile the command: cProfile stats (cpu) or top allocation sites (memory)")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="Where to write the profile (default: renamer.prof or renamer-memory.txt)")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    preview = commands.add_parser("preview", help="Show the planned renames without touching anything")
+    add_config_arguments(preview)
+    preview.add_argument("--save", metavar="PLAN", help="Also save the plan to a file for 'apply'")
+
+    estimate = commands.add_parser("estimate", help="Estimate from a sample of folders how many items a rename "
+                                                    "would touch and how long it would take")
+    add_config_arguments(estimate)
+    estimate.add_argument("--sample-dirs", type=int, default=DEFAULT_SAMPLE_DIRS, metavar="N",
+                          help="Folders to list before extrapolating (default: %(default)s)")
+    estimate.add_argument("--preview", type=int, default=DEFAULT_PREVIEW, metavar="N",
+                          help="New names to show from a representative sample (default: %(default)s)")
+    estimate.add_argument("--probe", action="store_true",
+                          help="Time renames on a scratch file in the folder instead of assuming listing latency")
+    estimate.add_argument("-j", "--workers", type=int, default=1,
+                          help="Rename threads the run would use (default: %(default)s)")
+
+    rename = commands.add_parser("rename", help="Rename the matching files and folders")
+    add_config_arguments(rename)
+
+    apply = commands.add_parser("apply", help="Rename exactly as planned in a file saved by 'preview --save'")
+    apply.add_argument("plan", help="Saved plan file")
+    add_backend_arguments(apply)
+
+    for command in (rename, apply):
+        command.add_argument("-y", "--yes", action="store_true", help="Do not ask for confirmation")
+        command.add_argument("-j", "--workers", type=int, default=1,
+                             help="Rename threads, sharded by parent directory (default: %(default)s)")
+        command.add_argument("--stats", action="store_true", help="Report per-worker and overall throughput")
+        command.add_argument("--no-journal", action="store_true", help="Do not record the batch for undo")
+
+    watch = commands.add_parser("watch", help="Keep running and rename new arrivals in a folder as they come in")
+    add_config_arguments(watch)
+    watch.add_argument("--settle", type=float, default=DEFAULT_SETTLE, metavar="SECONDS",
+                       help="Rename an arrival once it has not changed for this long (default: %(default)s)")
+    watch.add_argument("--poll", action="store_true", help="List the tree periodically instead of using inotify")
+    watch.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL, metavar="SECONDS",
+                       help="Seconds between listings when polling (default: %(default)s)")
+    watch.add_argument("--state", metavar="FILE",
+                       help=f"File keeping the counter across restarts (default: one per folder under "
+                            f"${WATCH_ENV} or ~/.renamer/watch)")
+    watch.add_argument("--reset-counter", action="store_true",
+                       help="Start again from --counter instead of where the last run stopped")
+    watch.add_argument("--no-journal", action="store_true", help="Do not record the renames for undo")
+
+    manifest = commands.add_parser("manifest", help="Write a job manifest renaming many folders with these options")
+    manifest.add_argument("output", help="Manifest file to write")
+    manifest.add_argument("directories", nargs="+", metavar="directory", help="Root folders, one job each")
+    add_config_arguments(manifest, directory=False)
+
+    batch = commands.add_parser("batch", help="Rename every folder listed in a job manifest, several at a time")
+    batch.add_argument("manifest", help="Job manifest written by 'manifest' or by hand")
+    batch.add_argument("--jobs", type=int, default=DEFAULT_JOBS, metavar="N",
+                       help="Folders processed at the same time (default: %(default)s)")
+    batch.add_argument("--preview", action="store_true", help="Only plan every job and report what would happen")
+    batch.add_argument("--report", metavar="FILE", help="Also write the per-folder results as JSON")
+    batch.add_argument("-y", "--yes", action="store_true", help="Do not ask for confirmation")
+    batch.add_argument("--no-journal", action="store_true", help="Do not record the batches for undo")
+
+    undo = commands.add_parser("undo", help="Undo the most recent batch")
+    redo = commands.add_parser("redo", help="Redo the most recently undone batch")
+
+    recover = commands.add_parser("recover", help="Finish a batch that was interrupted by a crash")
+    recover.add_argument("--rollback", action="store_true", help="Roll the interrupted batch back instead")
+    for command in (undo, redo, recover):
+        add_backend_arguments(command)
+        command.add_argument("-j", "--workers", type=int, default=DEFAULT_UNDO_WORKERS,
+                             help="Rename threads, sharded by parent directory (default: %(default)s)")
+
+    presets = commands.add_parser("presets", help="List the rule presets, or save or delete one")
+    presets.add_argument("--save", metavar="NAME", help="Save the rule options given here as preset NAME")
+    presets.add_argument("--delete", metavar="NAME", help="Delete the saved preset NAME")
+    add_rule_arguments(presets)
+
+    history = commands.add_parser("history", help="List the batches recorded in the journal")
+    history.add_argument("--compact", type=int, metavar="N",
+                         help="Rewrite the journal keeping only the latest N batches")
+
+    return parser
+
+
+def print_result(result: RenameResult, verb: str, retry: str = "") -> int:
+    for error in result.errors:
+        print(error, file=sys.stderr)
+    print(f"{verb} {result.renamed} of {result.total} items", file=sys.stderr)
+    if retry and (result.errors or result.cancelled):
+        print(f"The rest stay in the journal; run '{retry}' again to retry them", file=sys.stderr)
+    return 1 if result.errors else 0
+
+
+def streaming(engine: RenameEngine) -> bool:
+    """Huge trees (--sort-buffer) are streamed, which skips the whole-plan collision check"""
+    return engine.config.sort_buffer > 0
+
+
+def cmd_preview(engine: RenameEngine, args: argparse.Namespace) -> int:
+    # Saving needs the whole plan
+    plan = engine.plan() if args.save or not streaming(engine) else None
+    count = 0
+    for op in plan if plan is not None else engine.iter_plan():
+        print(f"{op.rel_path} -> {op.new_rel_path}")
+        count += 1
+    if plan is not None:
+        for message in plan.collisions:
+            print(message, file=sys.stderr)
+        if args.save:
+            plan.save(args.save)
+            print(f"Saved plan to {args.save}", file=sys.stderr)
+    print(f"Previewing {count} items (seed {engine.seed})", file=sys.stderr)
+    return 0
+
+
+def cmd_estimate(engine: RenameEngine, args: argparse.Namespace) -> int:
+    estimate = estimate_tree(engine.config, args.sample_dirs, args.preview, args.probe, engine)
+    for op in estimate.preview:
+        print(f"{op.rel_path} -> {op.new_rel_path}")
+    if estimate.preview:
+        print(f"Sample of {len(estimate.preview)} new names; counters number the sample (seed {estimate.seed})",
+              file=sys.stderr)
+    for line in estimate.summary():
+        print(line, file=sys.stderr)
+    return 0
+
+
+def confirm(plan: RenamePlan) -> bool:
+    if not plan:
+        print("No files or folders found to rename", file=sys.stderr)
+        return False
+    answer = input(f"Are you sure you want to rename {len(plan)} items? [y/N] ")
+    return answer.strip().lower() in ("y", "yes")
+
+
+def cmd_rename(engine: RenameEngine, args: argparse.Namespace, plan: Optional[RenamePlan] = None) -> int:
+    if plan is None and args.yes and streaming(engine):
+        # Stream the plan straight into the executor
+        ops: Iterable[RenameOp] = engine.iter_plan()
+    else:
+        ops = plan if plan is not None else engine.plan()
+        for message in ops.collisions:
+            print(message, file=sys.stderr)
+        if not args.yes and not confirm(ops):
+            return 0 if not ops else 1
+
+    result = engine.execute(ops)
+    status = print_result(result, "Renamed")
+    if isinstance(ops, RenamePlan) and ops.collisions:
+        status = 1
+    if args.stats and result.stats:
+        for line in result.stats.summary():
+            print(line, file=sys.stderr)
+    return status
+
+
+def cmd_presets(args: argparse.Namespace) -> int:
+    try:
+        if args.save:
+            rules = expand_rules(args.rules)
+            if not rules:
+                print("Give the preset's rules as options, e.g. --replace ' ' _ --ascii", file=sys.stderr)
+                return 1
+            save_preset(args.save, rules)
+            print(f"Saved preset {args.save} with {len(rules)} rules", file=sys.stderr)
+        elif args.delete:
+            if not delete_preset(args.delete):
+                print(f"No saved preset named {args.delete}", file=sys.stderr)
+                return 1
+        else:
+            for name, rules in sorted(load_presets().items()):
+                print(name)
+                for rule in rules:
+                    print(f"  {describe_rule(rule)}")
+    except RuleError as e:
+        raise RenamerError(str(e)) from None
+    return 0
+
+
+def cmd_watch(journal: Journal, args: argparse.Namespace, metrics: Optional[Metrics]) -> int:
+    daemon = WatchDaemon(config_from_args(args), None if args.no_journal else journal, metrics, args.state,
+                         args.settle, args.poll, args.interval, args.reset_counter)
+    for warning in daemon.engine.check_config():
+        print(f"Warning: {warning}", file=sys.stderr)
+
+    def report(result: RenameResult) -> None:
+        print(time.strftime("%H:%M:%S"), end=" ", file=sys.stderr)
+        print_result(result, "Renamed")
+
+    def warn(message: str) -> None:
+        print(f"Warning: {message}", file=sys.stderr)
+
+    # A service manager stops the daemon with SIGTERM; finish the current group first
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    print(f"Watching {daemon.root} ({daemon.watcher.name}), next counter {daemon.state.counter}; "
+          f"press Ctrl+C to stop", file=sys.stderr)
+    try:
+        daemon.run(stop, report, warn)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+    print(f"Stopped; the next counter is {daemon.state.counter}", file=sys.stderr)
+    return 0
+
+
+def cmd_batch(journal: Journal, args: argparse.Namespace, metrics: Optional[Metrics]) -> int:
+    manifest = JobManifest.load(args.manifest)
+    if not manifest.jobs:
+        print("The manifest lists no folders", file=sys.stderr)
+        return 0
+    rename = not args.preview
+    if rename and not args.yes:
+        answer = input(f"Rename in {len(manifest.jobs)} folders? [y/N] ")
+        if answer.strip().lower() not in ("y", "yes"):
+            return 1
+
+    def progress(done: int, total: int) -> None:
+        print(f"\r{done} of {total} renamed", end="", file=sys.stderr, flush=True)
+
+    runner = JobRunner(manifest.configs(), None if args.no_journal else journal, args.jobs, rename, metrics)
+    report = runner.run(progress if rename and sys.stderr.isatty() else None)
+    if rename and sys.stderr.isatty():
+        print(file=sys.stderr)
+    for job in report.jobs:
+        for message in job.warnings:
+            print(f"{job.directory}: Warning: {message}", file=sys.stderr)
+        for message in job.collisions + (job.result.errors if job.result else []):
+            print(f"{job.directory}: {message}", file=sys.stderr)
+    for line in report.summary():
+        print(line)
+    if args.report:
+        report.save(args.report)
+        print(f"Saved report to {args.report}", file=sys.stderr)
+    return 1 if report.failed else 0
+
+
+def cmd_history(journal: Journal, args: argparse.Namespace) -> int:
+    if args.compact is not None:
+        journal.compact(args.compact)
+    for batch in journal.batches():
+        if batch.interrupted:
+            state = "interrupted"
+        elif batch.applied == len(batch.ops):
+            state = "applied"
+        elif batch.applied == 0:
+            state = "undone"
+        else:
+            state = f"{batch.applied} applied"
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(batch.created))
+        print(f"{batch.batch_id}  {created}  {len(batch.ops):8d} renames  {state:12s}  {batch.description}")
+    return 0
+
+
+def run_command(args: argparse.Namespace, journal: Journal, metrics: Optional[Metrics]) -> int:
+    try:
+        if args.command in ("preview", "estimate", "rename"):
+            use_journal = args.command == "rename" and not args.no_journal
+            engine = RenameEngine(config_from_args(args), journal if use_journal else None, metrics)
+            for warning in engine.check_config():
+                print(f"Warning: {warning}", file=sys.stderr)
+            if args.command == "preview":
+                return cmd_preview(engine, args)
+            if args.command == "estimate":
+                return cmd_estimate(engine, args)
+            return cmd_rename(engine, args)
+        if args.command == "manifest":
+            JobManifest.from_config(config_from_args(args), args.directories).save(args.output)
+            print(f"Saved manifest of {len(args.directories)} folders to {args.output}", file=sys.stderr)
+            return 0
+        if args.command == "batch":
+            return cmd_batch(journal, args, metrics)
+        if args.command == "watch":
+            return cmd_watch(journal, args, metrics)
+        if args.command == "presets":
+            return cmd_presets(args)
+        if args.command == "apply":
+            plan = RenamePlan.load(args.plan)
+            plan.config.workers = args.workers
+            plan.config.backend = args.backend
+            plan.config.max_concurrency = args.max_concurrency
+            plan.config.rate_limits = rate_limits(args)
+            engine = RenameEngine.for_plan(plan, None if args.no_journal else journal, metrics)
+            return cmd_rename(engine, args, plan)
+        if args.command == "undo":
+            result = undo_last(journal, metrics=metrics, backend=backend_from_args(args), workers=args.workers)
+            return print_result(result, "Undone", "undo")
+        if args.command == "redo":
+            result = redo_last(journal, metrics=metrics, backend=backend_from_args(args), workers=args.workers)
+            return print_result(result, "Redone", "redo")
+        if args.command == "recover":
+            result = recover(journal, rollback=args.rollback, metrics=metrics, backend=backend_from_args(args),
+                             workers=args.workers)
+            if result is None:
+                print("Nothing to recover", file=sys.stderr)
+                return 0
+            return print_result(result, "Rolled back" if args.rollback else "Recovered")
+        return cmd_history(journal, args)
+    except RenamerError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    journal = Journal(args.journal)
+    metrics = Metrics() if args.metrics or args.profile != "off" else None
+    profile_output = args.profile_output or ("renamer.prof" if args.profile == "cpu" else "renamer-memory.txt")
+
+    try:
+        with profiled(args.profile, profile_output, metrics), \
+                metrics.count_os_calls() if args.metrics else nullcontext():
+            status = run_command(args, journal, metrics)
+    finally:
+        journal.close()
+    if metrics is not None:
+        for line in metrics.summary():
+            print(line, file=sys.stderr)
+        if args.metrics:
+            metrics.save(args.metrics)
+            print(f"Saved metrics to {args.metrics}", file=sys.stderr)
+    if args.profile != "off":
+        print(f"Saved {args.profile} profile to {profile_output}", file=sys.stderr)
+    return status
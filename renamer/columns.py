@@ -0,0 +1,133 @@
+import os
+from array import array
+from itertools import accumulate
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union, overload
+
+# Strings packed into one str; a lookup slices within a single chunk
+CHUNK_SIZE = 4096
+
+Pair = Tuple[str, str]
+
+
+class StringColumn:
+    """Append-only list of strings packed into one str per CHUNK_SIZE entries.
+
+    Every str object carries about 50 bytes of header; a packed chunk costs
+    4 bytes of end offset per entry on top of the characters themselves.
+    Values are sliced back out on access.
+    """
+
+    __slots__ = ("_chunks", "_ends", "_pending")
+
+    def __init__(self, values: Iterable[str] = ()) -> None:
+        self._chunks: List[str] = []
+        self._ends: List["array[int]"] = []
+        self._pending: List[str] = []
+        for value in values:
+            self.append(value)
+
+    def __len__(self) -> int:
+        return len(self._chunks) * CHUNK_SIZE + len(self._pending)
+
+    def append(self, value: str) -> None:
+        pending = self._pending
+        pending.append(value)
+        if len(pending) == CHUNK_SIZE:
+            self._chunks.append("".join(pending))
+            self._ends.append(array("I", accumulate(map(len, pending))))
+            self._pending = []
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+            if index < 0:
+                raise IndexError("StringColumn index out of range")
+        chunk, offset = divmod(index, CHUNK_SIZE)
+        if chunk >= len(self._chunks):
+            if chunk > len(self._chunks):
+                raise IndexError("StringColumn index out of range")
+            return self._pending[offset]
+        ends = self._ends[chunk]
+        return self._chunks[chunk][ends[offset - 1] if offset else 0:ends[offset]]
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk, ends in zip(self._chunks, self._ends):
+            start = 0
+            for end in ends:
+                yield chunk[start:end]
+                start = end
+        yield from self._pending
+
+
+class PathTable:
+    """Interned folder prefixes: each distinct one is stored once and referred to by its index"""
+
+    __slots__ = ("paths", "_ids")
+
+    def __init__(self) -> None:
+        self.paths: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def intern(self, path: str) -> int:
+        index = self._ids.get(path)
+        if index is None:
+            index = self._ids[path] = len(self.paths)
+            self.paths.append(path)
+        return index
+
+
+class PathPairs(Sequence[Pair]):
+    """A list of (source, target) paths kept as folder ids into a PathTable plus packed names.
+
+    Reads like a list of tuples (len, indexing, slicing, iteration, append);
+    the full paths are rebuilt on access. Tables built from one another can
+    share their PathTable.
+    """
+
+    __slots__ = ("folders", "_heads", "_names", "_new_heads", "_new_names")
+
+    def __init__(self, pairs: Iterable[Pair] = (), folders: Optional[PathTable] = None) -> None:
+        self.folders = folders if folders is not None else PathTable()
+        self._heads = array("I")
+        self._names = StringColumn()
+        self._new_heads = array("I")
+        self._new_names = StringColumn()
+        for pair in pairs:
+            self.append(pair)
+
+    def __len__(self) -> int:
+        return len(self._heads)
+
+    def append(self, pair: Pair) -> None:
+        # Each path splits into its folder prefix, trailing separator included, and its name
+        path, new_path = pair
+        name = path.rpartition(os.sep)[2]
+        new_name = new_path.rpartition(os.sep)[2]
+        head = path[:len(path) - len(name)]
+        folder = self.folders.intern(head)
+        self._heads.append(folder)
+        self._names.append(name)
+        # Renames stay within their folder, so this is almost always the same prefix
+        new_head = new_path[:len(new_path) - len(new_name)]
+        self._new_heads.append(folder if new_head == head else self.folders.intern(new_head))
+        self._new_names.append(new_name)
+
+    @overload
+    def __getitem__(self, index: int) -> Pair: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Pair]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Pair, List[Pair]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        paths = self.folders.paths
+        return paths[self._heads[index]] + self._names[index], paths[self._new_heads[index]] + self._new_names[index]
+
+    def __iter__(self) -> Iterator[Pair]:
+        paths = self.folders.paths
+        for head, name, new_head, new_name in zip(self._heads, self._names, self._new_heads, self._new_names):
+            yield paths[head] + name, paths[new_head] + new_name
@@ -0,0 +1,274 @@
+import hashlib
+import mmap
+import os
+import sqlite3
+import stat
+import struct
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+CACHE_ENV = "RENAMER_CACHE_DIR"
+
+# Tokens that need the file contents, as opposed to one stat
+READ_TOKENS = ("sha1", "exif_date")
+
+# Same layout as {datetime}, so names sort chronologically
+TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S"
+
+CHUNK_SIZE = 1 << 20
+# Files at least this large are hashed through mmap, which skips the copy into a read buffer
+MMAP_THRESHOLD = 4 * CHUNK_SIZE
+
+# Below this many files to read, starting worker processes costs more than it saves
+POOL_MIN_FILES = 16
+
+# EXIF dates live in the first segment of a JPEG or the first IFDs of a TIFF/raw file
+EXIF_READ_LIMIT = 256 * 1024
+EXIF_DATETIME_ORIGINAL, EXIF_DATETIME, EXIF_IFD_POINTER = 0x9003, 0x0132, 0x8769
+
+# Files modified this close to the read may change again within the same mtime tick
+RACY_WINDOW_NS = 2_000_000_000
+
+SCHEMA = ("CREATE TABLE IF NOT EXISTS content (dev INTEGER NOT NULL, inode INTEGER NOT NULL, size INTEGER NOT NULL, "
+          "mtime_ns INTEGER NOT NULL, sha1 TEXT, exif_date TEXT, PRIMARY KEY (dev, inode))")
+
+
+def default_cache_path() -> str:
+    base = os.environ.get(CACHE_ENV) or os.path.join(os.path.expanduser("~"), ".renamer")
+    return os.path.join(base, "content.sqlite")
+
+
+def hash_file(path: str, algorithm: str = "sha1") -> str:
+    """Hex digest of a file, streamed in chunks (through mmap for large files)"""
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    # hashlib releases the GIL for each large update
+                    for start in range(0, size, CHUNK_SIZE):
+                        digest.update(view[start:start + CHUNK_SIZE])
+                finally:
+                    view.release()
+        else:
+            buffer = bytearray(CHUNK_SIZE)
+            view = memoryview(buffer)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def _tiff_date(data: bytes, start: int) -> Optional[str]:
+    """DateTimeOriginal, else DateTime, from the TIFF structure at data[start:]"""
+    order = data[start:start + 2]
+    if order not in (b"II", b"MM"):
+        return None
+    endian = "<" if order == b"II" else ">"
+
+    def ifd_entries(offset: int) -> Iterable[Tuple[int, int, int, int]]:
+        position = start + offset
+        if position + 2 > len(data):
+            return
+        count = struct.unpack_from(endian + "H", data, position)[0]
+        for i in range(count):
+            entry = position + 2 + 12 * i
+            if entry + 12 > len(data):
+                return
+            yield struct.unpack_from(endian + "HHII", data, entry)
+
+    def ascii_value(count: int, value: int) -> Optional[str]:
+        begin = start + value
+        raw = data[begin:begin + count].split(b"\0")[0]
+        return raw.decode("ascii", "replace") if raw else None
+
+    try:
+        (first,) = struct.unpack_from(endian + "I", data, start + 4)
+    except struct.error:
+        return None
+    fallback = None
+    exif_ifd = None
+    for tag, kind, count, value in ifd_entries(first):
+        if tag == EXIF_DATETIME and kind == 2:
+            fallback = ascii_value(count, value)
+        elif tag == EXIF_IFD_POINTER:
+            exif_ifd = value
+    if exif_ifd is not None:
+        for tag, kind, count, value in ifd_entries(exif_ifd):
+            if tag == EXIF_DATETIME_ORIGINAL and kind == 2:
+                return ascii_value(count, value) or fallback
+    return fallback
+
+
+def read_exif_date(path: str) -> Optional[str]:
+    """When the photo was taken, from the EXIF data of a JPEG or TIFF-based file, as TIMESTAMP_FORMAT"""
+    with open(path, "rb") as f:
+        data = f.read(EXIF_READ_LIMIT)
+    raw = None
+    if data[:2] == b"\xff\xd8":
+        # JPEG: walk the segments up to the APP1 "Exif" one
+        position = 2
+        while position + 4 <= len(data) and data[position] == 0xFF:
+            marker = data[position + 1]
+            (length,) = struct.unpack_from(">H", data, position + 2)
+            if marker == 0xE1 and data[position + 4:position + 10] == b"Exif\0\0":
+                raw = _tiff_date(data, position + 10)
+                break
+            if marker == 0xDA:  # Start of the image data; no EXIF
+                break
+            position += 2 + length
+    else:
+        raw = _tiff_date(data, 0)
+    if not raw:
+        return None
+    try:
+        return datetime.strptime(raw.strip(), "%Y:%m:%d %H:%M:%S").strftime(TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def read_content(task: Tuple[str, bool, bool]) -> Tuple[Optional[str], Optional[str]]:
+    """(sha1, exif_date) of one file; runs in a worker process"""
+    path, want_hash, want_exif = task
+    sha1 = exif_date = None
+    try:
+        if want_hash:
+            sha1 = hash_file(path)
+        if want_exif:
+            exif_date = read_exif_date(path) or ""
+    except (OSError, struct.error):
+        pass
+    return sha1, exif_date
+
+
+class ContentReader:
+    """Computes content tokens for files, re-reading only files that changed.
+
+    Hashes and EXIF dates are kept in a SQLite cache keyed by the file's
+    device and inode and validated against its size and mtime, so a re-run
+    over unchanged files costs one stat per file. Files that do need
+    reading are spread over a process pool.
+    """
+
+    def __init__(self, tokens: Iterable[str], cache_path: Optional[str] = None, workers: int = 0) -> None:
+        self.tokens = set(tokens)
+        self.workers = workers or os.cpu_count() or 1
+        self.hits = 0
+        self.misses = 0
+        self._pool: Optional["ProcessPoolExecutor"] = None
+        self._db: Optional[sqlite3.Connection] = None
+        if self.tokens & set(READ_TOKENS):
+            try:
+                path = cache_path or default_cache_path()
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._db = sqlite3.connect(path, timeout=30)
+                self._db.execute(SCHEMA)
+            except (OSError, sqlite3.Error):
+                # No cache: everything is read again next time, but still read correctly
+                self._db = None
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    def _cached(self, st: os.stat_result) -> Tuple[Optional[str], Optional[str]]:
+        if self._db is None:
+            return None, None
+        try:
+            row = self._db.execute("SELECT size, mtime_ns, sha1, exif_date FROM content WHERE dev = ? AND inode = ?",
+                                   (st.st_dev, st.st_ino)).fetchone()
+        except sqlite3.Error:
+            self._db = None
+            return None, None
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            return None, None
+        return row[2], row[3]
+
+    def _store(self, st: os.stat_result, sha1: Optional[str], exif_date: Optional[str]) -> None:
+        if self._db is None or time.time_ns() - st.st_mtime_ns < RACY_WINDOW_NS:
+            return
+        try:
+            self._db.execute("INSERT OR REPLACE INTO content VALUES (?, ?, ?, ?, ?, ?)",
+                             (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, sha1, exif_date))
+        except sqlite3.Error:
+            self._db = None
+
+    def _read(self, tasks: List[Tuple[str, bool, bool]]) -> List[Tuple[Optional[str], Optional[str]]]:
+        if len(tasks) < POOL_MIN_FILES or self.workers == 1:
+            return [read_content(task) for task in tasks]
+        if self._pool is None:
+            # Imported here: most batches never need a pool. Workers are not forked, as
+            # forking a process that runs other threads (GUI, executors) can deadlock
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+        return list(self._pool.map(read_content, tasks, chunksize=max(1, len(tasks) // (self.workers * 4))))
+
+    def read(self, paths: List[str]) -> List[Dict[str, str]]:
+        """Token values for each path; folders and unreadable files get empty values"""
+        results: List[Dict[str, str]] = []
+        pending: List[Tuple[int, os.stat_result, str, Optional[str], Optional[str]]] = []
+        for path in paths:
+            values = {"sha1": "", "size": "0", "mtime": "", "exif_date": ""}
+            results.append(values)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            values["mtime"] = datetime.fromtimestamp(st.st_mtime).strftime(TIMESTAMP_FORMAT)
+            if stat.S_ISDIR(st.st_mode):
+                values["exif_date"] = values["mtime"]
+                continue
+            values["size"] = str(st.st_size)
+
+            sha1, exif_date = self._cached(st)
+            want_hash = "sha1" in self.tokens and sha1 is None
+            want_exif = "exif_date" in self.tokens and exif_date is None
+            if want_hash or want_exif:
+                pending.append((len(results) - 1, st, path, None if want_hash else sha1,
+                                None if want_exif else exif_date))
+                self.misses += 1
+            elif self.tokens & set(READ_TOKENS):
+                self.hits += 1
+            values["sha1"] = sha1 or ""
+            values["exif_date"] = exif_date or ""
+
+        if pending:
+            # Only what the cache lacks is read; a value still None afterwards could not be read
+            read = self._read([(path, "sha1" in self.tokens and sha1 is None,
+                                "exif_date" in self.tokens and exif_date is None)
+                               for _, _, path, sha1, exif_date in pending])
+            for (index, st, _, cached_sha1, cached_exif), (sha1, exif_date) in zip(pending, read):
+                values = results[index]
+                sha1 = sha1 if sha1 is not None else cached_sha1
+                exif_date = exif_date if exif_date is not None else cached_exif
+                values["sha1"] = sha1 or ""
+                values["exif_date"] = exif_date or ""
+                if ("sha1" not in self.tokens or sha1 is not None) and \
+                        ("exif_date" not in self.tokens or exif_date is not None):
+                    self._store(st, sha1, exif_date)
+            if self._db is not None:
+                try:
+                    self._db.commit()
+                except sqlite3.Error:
+                    self._db = None
+
+        # Photos without an EXIF date fall back to the file's modification time
+        for values in results:
+            if not values["exif_date"]:
+                values["exif_date"] = values["mtime"]
+        return results
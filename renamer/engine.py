@@ -0,0 +1,807 @@
+import json
+import os
+import threading
+import time
+from array import array
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field, fields, replace
+from datetime import datetime
+from functools import partial
+from itertools import islice
+from operator import attrgetter, itemgetter
+from typing import (TYPE_CHECKING, Any, Callable, ContextManager, Dict, Iterable, Iterator, List, Optional,
+                    Sequence, Set, Sized, Tuple, TypeVar, Union, overload)
+
+from .columns import PathPairs, StringColumn
+from .executor import DEFAULT_MAX_CONCURRENCY, ExecutorStats, ProgressCallback, run_sharded
+from .filters import FilterError, compile_filter
+from .fsops import InodeCache, rename_noreplace
+from .metrics import Metrics
+from .pattern import FILE_ONLY_TOKENS, CompiledPattern, compile_pattern, split_ext
+from .preflight import Collision, NameAllocator, is_case_insensitive, order_renames, resolve_collisions
+from .rules import RuleError, RulePipeline, compile_rules
+from .rng import STREAM_TOKENS, STREAM_VERSION, STREAMS, CounterRandom, StreamBlocks, new_seed
+from .scan import Folder, Item, filter_items, iter_directory
+from .snapshot import SnapshotIndex
+from .sorting import external_sort
+
+if TYPE_CHECKING:
+    from .aio import AsyncBackend
+    from .journal import Journal
+
+
+T = TypeVar("T")
+
+DEFAULT_PATTERN = "{list1}_{prefix}{counter}_v{version}"
+VERSION_STRATEGIES = ("fixed", "incremental", "random")
+CASE_OPTIONS = ("none", "uppercase", "lowercase", "title")
+
+# Version of the saved plan layout; bumped on incompatible changes
+PLAN_FORMAT = 1
+
+# Items whose content tokens are computed together, so uncached files can be read in parallel
+CONTENT_BATCH = 2000
+
+
+class RenamerError(Exception):
+    """Raised when a rename job cannot be planned or executed"""
+
+
+class RenameCancelled(RenamerError):
+    """Raised when planning is stopped through RenameEngine.cancel()"""
+
+
+@dataclass
+class RenameConfig:
+    """Plain option set describing one rename job"""
+    directory: str = ""
+    pattern: str = DEFAULT_PATTERN
+    start_counter: int = 1
+    version_start: str = "1.0"
+    version_increment: float = 0.1
+    version_strategy: str = "fixed"  # fixed, incremental, random
+    include_files: bool = True
+    include_folders: bool = True
+    recursive: bool = False
+    file_filter: str = "*"
+    case_option: str = "none"
+    list1: List[str] = field(default_factory=list)  # Custom words list 1
+    list2: List[str] = field(default_factory=list)  # Custom words list 2 (prefixes)
+    sort_buffer: int = 0  # Items held in memory while sorting; 0 sorts the whole scan in memory
+    workers: int = 1  # Rename threads; work is sharded by parent directory
+    use_index: bool = False  # Reuse listings of unchanged folders from the snapshot index
+    on_collision: str = "skip"  # skip, suffix, unique: what to do when a new name is already taken
+    backend: str = "threads"  # threads, async: async keeps many calls in flight for network mounts
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY  # Upper bound for the async backend's adaptive limit
+    rate_limits: Dict[str, float] = field(default_factory=dict)  # Calls/s per mount point, "" for any mount
+    hash_workers: int = 0  # Processes reading files for content tokens like {sha1}; 0 = one per CPU
+    seed: Optional[int] = None  # Seed of the random tokens and versions; None picks a new one per engine
+    rules: List[Dict[str, Any]] = field(default_factory=list)  # Rename rules applied after the pattern, in order
+
+    def __post_init__(self) -> None:
+        # Journals and saved plans keep full paths, which must not depend on the working directory
+        if self.directory:
+            self.directory = os.path.abspath(self.directory)
+
+
+class RenameOp:
+    """A single planned rename of name to new_name within one folder"""
+
+    __slots__ = ("folder", "name", "new_name", "is_file", "version", "temporary")
+
+    def __init__(self, folder: Folder, name: str, new_name: str, is_file: bool, version: float,
+                 temporary: bool = False) -> None:
+        self.folder = folder
+        self.name = name
+        self.new_name = new_name
+        self.is_file = is_file
+        self.version = version
+        self.temporary = temporary  # First hop of a rename routed through a temporary name
+
+    @property
+    def rel_path(self) -> str:
+        return self.folder.rel + self.name
+
+    @property
+    def new_rel_path(self) -> str:
+        return self.folder.rel + self.new_name
+
+    @property
+    def full_path(self) -> str:
+        return self.folder.prefix + self.name
+
+    @property
+    def new_full_path(self) -> str:
+        return self.folder.prefix + self.new_name
+
+    @property
+    def parent(self) -> str:
+        return self.folder.path
+
+    @property
+    def depth(self) -> int:
+        return self.folder.depth
+
+    def replace(self, **changes: Any) -> "RenameOp":
+        """A copy with some fields changed, like dataclasses.replace()"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return RenameOp(**values)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, RenameOp):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"RenameOp({self.rel_path!r} -> {self.new_name!r})"
+
+
+def rename_conflict_keys(op: RenameOp) -> Tuple[str, str]:
+    """Names an op touches; ops sharing one must run in order on one thread"""
+    return op.name.casefold(), op.new_name.casefold()
+
+
+class OpTable(Sequence[RenameOp]):
+    """The renames of a plan stored column-wise: folder ids, packed names, flags and versions.
+
+    Indexing and iteration build RenameOp records on the fly, so a stored
+    plan costs tens of bytes per rename instead of an object and four path
+    strings. Folders are shared with the scan that produced the ops.
+    """
+
+    __slots__ = ("folders", "_folder_ids", "_ids", "_names", "_new_names", "_flags", "_versions")
+
+    def __init__(self, ops: Iterable[RenameOp] = ()) -> None:
+        self.folders: List[Folder] = []
+        self._ids: Dict[int, int] = {}  # id(folder) -> index into folders
+        self._folder_ids = array("I")
+        self._names = StringColumn()
+        self._new_names = StringColumn()
+        self._flags = bytearray()
+        self._versions = array("d")
+        for op in ops:
+            self.append(op)
+
+    def __len__(self) -> int:
+        return len(self._folder_ids)
+
+    def append(self, op: RenameOp) -> None:
+        folder_id = self._ids.get(id(op.folder))
+        if folder_id is None:
+            folder_id = self._ids[id(op.folder)] = len(self.folders)
+            self.folders.append(op.folder)
+        self._folder_ids.append(folder_id)
+        self._names.append(op.name)
+        self._new_names.append(op.new_name)
+        self._flags.append(op.is_file | op.temporary << 1)
+        self._versions.append(op.version)
+
+    def _op(self, folder_id: int, name: str, new_name: str, flags: int, version: float) -> RenameOp:
+        return RenameOp(self.folders[folder_id], name, new_name, bool(flags & 1), version, bool(flags & 2))
+
+    @overload
+    def __getitem__(self, index: int) -> RenameOp: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[RenameOp]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[RenameOp, List[RenameOp]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._op(self._folder_ids[index], self._names[index], self._new_names[index], self._flags[index],
+                        self._versions[index])
+
+    def __iter__(self) -> Iterator[RenameOp]:
+        for values in zip(self._folder_ids, self._names, self._new_names, self._flags, self._versions):
+            yield self._op(*values)
+
+
+@dataclass
+class RenamePlan:
+    """A previewed set of renames together with the config that produced it.
+
+    Executing a plan renames exactly what was previewed: random picks,
+    counters and the frozen date are not computed again. Plans can be saved
+    as JSON and applied later, possibly on another machine. config.seed and
+    created record the seed and frozen date the names were generated with;
+    RenameEngine.for_plan(), which applying a plan goes through, gives an
+    engine that names the same items exactly as the plan did.
+    """
+    config: RenameConfig
+    ops: OpTable = field(default_factory=OpTable)  # A list of RenameOp is converted
+    created: float = field(default_factory=time.time)
+    collisions: List[str] = field(default_factory=list)  # Renames dropped because the name was taken
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.ops, OpTable):
+            self.ops = OpTable(self.ops)
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def __iter__(self) -> Iterator[RenameOp]:
+        return iter(self.ops)
+
+    def __getitem__(self, index: int) -> RenameOp:
+        return self.ops[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Full paths are rebuilt from the directory on load, so only relative paths are stored
+        return {
+            "format": PLAN_FORMAT,
+            "created": self.created,
+            "sep": os.sep,
+            "config": asdict(self.config),
+            "ops": [[op.rel_path, op.new_rel_path, op.is_file, op.version] for op in self.ops],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RenamePlan":
+        if data.get("format") != PLAN_FORMAT:
+            raise RenamerError(f"Unsupported plan format: {data.get('format')!r}")
+        known = {f.name for f in fields(RenameConfig)}
+        config = RenameConfig(**{k: v for k, v in data["config"].items() if k in known})
+        sep = data.get("sep", os.sep)
+        directory = config.directory
+        folders: Dict[str, Folder] = {}
+        ops = OpTable()
+        for rel_path, new_rel_path, is_file, version in data["ops"]:
+            rel_dir, _, name = rel_path.rpartition(sep)
+            new_name = new_rel_path.rpartition(sep)[2]
+            folder = folders.get(rel_dir)
+            if folder is None:
+                rel = rel_dir.replace(sep, os.sep) + os.sep if rel_dir else ""
+                folder = folders[rel_dir] = Folder(rel, os.path.join(directory, rel))
+            ops.append(RenameOp(folder, name, new_name, is_file, version))
+        return cls(config, ops, data.get("created", 0.0))
+
+    def save(self, path: str) -> None:
+        """Write the plan as JSON, replacing any existing file atomically"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RenamePlan":
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            raise RenamerError(f"Cannot load plan {path}: {e}") from None
+
+
+@dataclass
+class RenameResult:
+    """Outcome of executing a list of rename operations"""
+    total: int
+    renamed: int = 0
+    errors: List[str] = field(default_factory=list)
+    batch: PathPairs = field(default_factory=PathPairs)  # (new_path, old_path) for undo
+    stats: Optional[ExecutorStats] = None
+    cancelled: bool = False
+    failed: List[int] = field(default_factory=list)  # apply_moves: positions of the moves that did not happen
+
+
+class RenameEngine:
+    """Scans a directory, generates new names and performs the renames"""
+
+    def __init__(self, config: RenameConfig, journal: Optional["Journal"] = None,
+                 metrics: Optional[Metrics] = None, now: Optional[datetime] = None) -> None:
+        self.config = config
+        self.journal = journal
+        self.metrics = metrics
+        self.seed = config.seed if config.seed is not None else new_seed()
+        self._streams = [StreamBlocks(self.seed, stream) for stream in range(STREAMS)]
+        self.now = now  # Frozen date and time of the batch; taken when the pattern is compiled if None
+        self._compiled: Optional[CompiledPattern] = None
+        self._combinations: Optional[List[Dict[str, str]]] = None
+        self._rules: Optional[RulePipeline] = None
+        self._matcher: Optional[Callable[[str], bool]] = None
+        self._case_insensitive: Optional[bool] = None
+        self._cancel = threading.Event()
+        self._async: Optional["AsyncBackend"] = None
+
+    @classmethod
+    def for_plan(cls, plan: "RenamePlan", journal: Optional["Journal"] = None,
+                 metrics: Optional[Metrics] = None) -> "RenameEngine":
+        """An engine that names the plan's items exactly as the plan did"""
+        return cls(plan.config, journal, metrics, datetime.fromtimestamp(plan.created))
+
+    def _wrap(self, stage: str, items: Iterable[T]) -> Iterable[T]:
+        return self.metrics.wrap(stage, items) if self.metrics else items
+
+    def _stage(self, stage: str) -> ContextManager[None]:
+        return self.metrics.stage(stage) if self.metrics else nullcontext()
+
+    def cancel(self) -> None:
+        """Ask a running plan or execute call, possibly on another thread, to stop"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_config(self) -> List[str]:
+        """Return warnings about options that will fall back to defaults"""
+        warnings: List[str] = []
+        pattern = self.config.pattern
+        if "{list1}" in pattern and not self.config.list1:
+            warnings.append("Pattern uses {list1} but no items defined.")
+        if "{prefix}" in pattern and not self.config.list2:
+            warnings.append("Pattern uses {prefix} but no prefixes defined.")
+        if self.config.version_strategy in ("fixed", "incremental"):
+            try:
+                float(self.config.version_start)
+            except ValueError:
+                warnings.append("Invalid version format. Using default 1.0")
+        return warnings
+
+    def async_backend(self) -> "AsyncBackend":
+        """The async backend for this job, created once so its learned concurrency carries over"""
+        if self._async is None:
+            from .aio import AsyncBackend  # asyncio is slow to import; only the async backend needs it
+            self._async = AsyncBackend(self.config.max_concurrency, self.config.rate_limits)
+        return self._async
+
+    def compile_filter(self) -> Callable[[str], bool]:
+        """Parse the file filter once for the scan"""
+        try:
+            self._matcher = compile_filter(self.config.file_filter)
+        except FilterError as e:
+            raise RenamerError(str(e)) from None
+        return self._matcher
+
+    def matches_filter(self, filename: str) -> bool:
+        """Check if filename matches the file filter pattern"""
+        matcher = self._matcher or self.compile_filter()
+        return matcher(filename)
+
+    def iter_items(self) -> Iterator[Item]:
+        """Stream the items to rename in relative path order.
+
+        With sort_buffer set, ordering uses a bounded external sort so the
+        scan never has to fit in memory. With use_index set, folders whose
+        mtime has not changed since the last scan are listed from the index.
+        """
+        directory = self.config.directory
+        if not directory or not os.path.isdir(directory):
+            raise RenamerError("Please select a valid directory")
+
+        if self.config.use_index:
+            scan: Iterable[Item] = SnapshotIndex(directory).iter_directory(self.config.recursive, self.config.include_files,
+                                                           self.config.include_folders)
+        elif self.config.backend == "async":
+            scan = self.async_backend().scan(directory, self.config.recursive, self.config.include_files,
+                                             self.config.include_folders)
+        else:
+            scan = iter_directory(directory, self.config.recursive, self.config.include_files,
+                                  self.config.include_folders)
+        items = self._wrap("filter", filter_items(self._wrap("scan", scan), self.compile_filter()))
+        items = self._until_cancelled(items)
+        key = attrgetter("rel_path")
+        if self.config.sort_buffer > 0:
+            return iter(self._wrap("sort", external_sort(items, key, self.config.sort_buffer)))
+        if self.metrics:
+            # Sort lazily so the sort is timed as its own stage
+            return self.metrics.wrap("sort", (item for item in sorted(items, key=key)))
+        return iter(sorted(items, key=key))
+
+    def _until_cancelled(self, items: Iterable[Item]) -> Iterator[Item]:
+        for item in items:
+            if self._cancel.is_set():
+                raise RenameCancelled("Cancelled")
+            yield item
+
+    def get_items(self) -> List[Item]:
+        """Get items to rename, sorted by relative path"""
+        return list(self.iter_items())
+
+    def apply_case_transform(self, name: str) -> str:
+        """Apply case transformation to name"""
+        case = self.config.case_option
+        if case == "uppercase":
+            return name.upper()
+        elif case == "lowercase":
+            return name.lower()
+        elif case == "title":
+            return name.title()
+        return name
+
+    def compile(self) -> CompiledPattern:
+        """Parse the pattern once for the batch, freezing the date and time"""
+        compiled = compile_pattern(self.config.pattern, self.now)
+        file_only = [token for token in compiled.content if token in FILE_ONLY_TOKENS]
+        if file_only and self.config.include_folders:
+            # Every folder would get the same empty or zero value, and so the same name
+            raise RenamerError(f"{{{file_only[0]}}} has no value for folders; exclude folders to use it")
+        self._compiled = compiled
+        self._combinations = compiled.combinations(self.config.list1, self.config.list2) if compiled.random else None
+        self.now = compiled.now
+        self.compile_rules()
+        return self._compiled
+
+    def compile_rules(self) -> RulePipeline:
+        """Build the rule pipeline once for the batch"""
+        try:
+            self._rules = compile_rules(self.config.rules)
+        except RuleError as e:
+            raise RenamerError(str(e)) from None
+        return self._rules
+
+    def item_random(self, counter: int, stream: int = STREAM_TOKENS) -> CounterRandom:
+        """Random draws for the item numbered counter, independent of every other item"""
+        return self._streams[stream].get(counter - self.config.start_counter)
+
+    def generate_new_name(self, old_name: str, counter: int, version: float, is_file: bool,
+                          content: Optional[Dict[str, str]] = None, rng: Any = None) -> str:
+        compiled = self._compiled or self.compile()
+        name, ext = split_ext(old_name)
+
+        drawn = None
+        if rng is None and compiled.random:
+            combinations = self._combinations
+            if combinations is not None:
+                # The item's first word picks all its draws at once; see CompiledPattern.combinations()
+                word = self._streams[STREAM_TOKENS].word(counter - self.config.start_counter)
+                drawn = combinations[(word * len(combinations)) >> 64]
+            else:
+                rng = self.item_random(counter)
+        values = compiled.values(name, ext, counter, version, self.config.list1, self.config.list2, rng, content,
+                                 drawn)
+        new_name = compiled.render(values)
+        if self.config.case_option != "none":
+            new_name = self.apply_case_transform(new_name)
+        rules = self._rules if self._rules is not None else self.compile_rules()
+        if rules:
+            # Rules that would leave nothing keep the name as the pattern made it
+            new_name = rules(new_name) or new_name
+
+        # For files, preserve the original extension unless the pattern includes it
+        if is_file and not split_ext(new_name)[1]:
+            new_name += ext
+
+        return new_name
+
+    def get_version(self, counter: int, strategy: str) -> float:
+        """Get version number based on strategy with input validation"""
+        try:
+            if strategy == "fixed":
+                return float(self.config.version_start)
+            elif strategy == "incremental":
+                start = float(self.config.version_start)
+                increment = self.config.version_increment
+                return round(start + (counter - 1) * increment, 2)
+            elif strategy == "random":
+                return round(self.item_random(counter, STREAM_VERSION).uniform(0.1, 10.0), 2)
+            return 1.0
+        except ValueError:
+            return 1.0
+
+    def name_items(self, items: Iterable[Item], counter: Optional[int] = None) -> Iterator[RenameOp]:
+        """Name generation stage: turn a stream of items into rename operations.
+
+        Counters start at config.start_counter, or at counter to continue an
+        earlier run; random tokens and versions follow the counter either way.
+        """
+        compiled = self.compile()
+        if counter is None:
+            counter = self.config.start_counter
+        if not compiled.content:
+            batches: Iterable[Tuple[Item, Optional[Dict[str, str]]]] = ((item, None) for item in items)
+        else:
+            batches = self._with_content(items, compiled.content)
+
+        allocators: Optional[Dict[str, NameAllocator]] = {} if self.config.on_collision == "unique" else None
+
+        for item, content in batches:
+            if self._cancel.is_set():
+                raise RenameCancelled("Cancelled")
+            version = self.get_version(counter, self.config.version_strategy)
+
+            basename = item.name
+            if allocators is None:
+                new_basename = self.generate_new_name(basename, counter, version, item.is_file, content)
+            else:
+                new_basename = self._allocator(allocators, os.path.dirname(item.full_path)).allocate(
+                    basename, item.is_file,
+                    partial(self.generate_new_name, basename, counter, version, item.is_file, content),
+                    self.item_random(counter))
+
+            yield RenameOp(item.folder, basename, new_basename, item.is_file, version)
+            counter += 1
+
+    def _allocator(self, allocators: Dict[str, NameAllocator], parent: str) -> NameAllocator:
+        """The allocator of one folder, seeded with the names already in it"""
+        allocator = allocators.get(parent)
+        if allocator is None:
+            try:
+                existing = os.listdir(parent)
+            except OSError:
+                existing = []
+            compiled = self._compiled or self.compile()
+            allocator = allocators[parent] = NameAllocator(
+                existing, compiled.random_space(self.config.list1, self.config.list2), self.case_insensitive)
+        return allocator
+
+    def _with_content(self, items: Iterable[Item], tokens: Tuple[str, ...]
+                      ) -> Iterator[Tuple[Item, Optional[Dict[str, str]]]]:
+        """Pair items with their content token values, computed CONTENT_BATCH items at a time"""
+        from .content import ContentReader  # Loads sqlite3; only patterns with content tokens need it
+        reader = ContentReader(tokens, workers=self.config.hash_workers)
+        try:
+            it = iter(items)
+            while True:
+                chunk = list(islice(it, CONTENT_BATCH))
+                if not chunk:
+                    break
+                with self._stage("content"):
+                    values = reader.read([item.full_path for item in chunk])
+                yield from zip(chunk, values)
+        finally:
+            if self.metrics:
+                self.metrics.inc("content_cache", reader.hits, result="hit")
+                self.metrics.inc("content_cache", reader.misses, result="miss")
+            reader.close()
+
+    def iter_plan(self) -> Iterator[RenameOp]:
+        """Stream the planned renames through the walk, filter, sort and naming stages"""
+        return iter(self._wrap("name", self.name_items(self.iter_items())))
+
+    def plan(self, progress: Optional[ProgressCallback] = None) -> RenamePlan:
+        """Scan the directory and compute the new name of every item"""
+        items = self.get_items()
+        ops: List[RenameOp] = []
+        for op in self._wrap("name", self.name_items(items)):
+            ops.append(op)
+            if progress:
+                progress(len(ops), len(items))
+        ops, collisions = self.preflight(ops)
+        # Record the seed and date actually used, so the plan can be regenerated
+        config = replace(self.config, seed=self.seed)
+        created = self.now.timestamp() if self.now else time.time()
+        return RenamePlan(config, ops, created, [c.message for c in collisions])
+
+    def preflight(self, ops: Iterable[RenameOp]) -> Tuple[List[RenameOp], List[Collision]]:
+        """Check a whole plan for taken names before anything is renamed"""
+        with self._stage("collision"):
+            return resolve_collisions(ops, self.config.on_collision, self.case_insensitive)
+
+    @property
+    def case_insensitive(self) -> bool:
+        if self._case_insensitive is None:
+            self._case_insensitive = is_case_insensitive(self.config.directory)
+        return self._case_insensitive
+
+    @staticmethod
+    def rename_one(op: RenameOp) -> Optional[str]:
+        """Rename a single item, never replacing an existing target; returns an error message or None"""
+        try:
+            rename_noreplace(op.full_path, op.new_full_path)
+        except FileExistsError:
+            return f"Skipping {op.rel_path}: {os.path.basename(op.new_full_path)} already exists"
+        except Exception as e:
+            return f"Error renaming {op.rel_path}: {str(e)}"
+        return None
+
+    def execution_order(self, ops: Iterable[RenameOp]) -> Iterable[RenameOp]:
+        """Order recursive plans deepest-first.
+
+        A folder is then only renamed once everything below it has been, so
+        every collected path is still valid when its turn comes. Counters
+        and names keep their plan (relative path) order.
+        """
+        if not self.config.recursive:
+            return ops
+        key = attrgetter("depth")
+        if self.config.sort_buffer > 0 and not isinstance(ops, Sized):
+            return external_sort(ops, lambda op: -op.depth, self.config.sort_buffer)
+        return sorted(ops, key=key, reverse=True)
+
+    def execute(self, ops: Iterable[RenameOp], progress: Optional[ProgressCallback] = None) -> RenameResult:
+        """Rename every planned item, skipping targets that already exist.
+
+        ops may be a list or a stream from iter_plan(). A list is checked by
+        preflight() first and ordered so chains and swaps of names work;
+        a stream is renamed as it comes, and its progress total is reported
+        as 0. An existing target is never replaced. With config.workers > 1 the renames
+        run on a thread pool sharded by parent directory, one tree depth at
+        a time; with config.backend "async" they are issued concurrently
+        under an adaptive limit instead. The undo batch records renames in execution order; with a
+        journal, each window of renames is also written ahead to disk.
+        """
+        result = RenameResult(total=0, stats=ExecutorStats(workers=max(1, self.config.workers)))
+        total = 0
+        if isinstance(ops, Sized):
+            ops, collisions = self.preflight(ops)
+            result.errors.extend(c.message for c in collisions)
+            result.total += len(collisions)
+            with self._stage("order"):
+                ops = order_renames(ops, self.case_insensitive)
+            total = len(ops)
+        barrier = attrgetter("depth") if self.config.recursive else None
+
+        journal = self.journal
+        batch_id = journal.begin(f"{self.config.directory}: {self.config.pattern}") if journal else ""
+        planned = 0
+        executed = 0
+        failed: List[int] = []
+        # Each rename is written ahead with the inode of the entry it moves, so
+        # recovery can tell where an entry is even when names go round in a cycle
+        inodes = InodeCache()
+        routed: Dict[str, Optional[int]] = {}  # Temporary path -> inode of the entry routed through it
+        depth = -1
+
+        def write_ahead(window: List[RenameOp]) -> None:
+            nonlocal planned, depth
+            with self._stage("journal"):
+                if window[0].depth != depth:
+                    # Renames run deepest first, so listings of deeper folders are done with
+                    depth = window[0].depth
+                    inodes.clear()
+                entries = []
+                for op in window:
+                    src = op.full_path
+                    inode = routed.pop(src) if src in routed else inodes.get(src)
+                    if op.temporary:
+                        routed[op.new_full_path] = inode
+                    entries.append((src, op.new_full_path, inode))
+                journal.record_planned(batch_id, entries)
+            planned += len(window)
+
+        rename_one = self.metrics.timed("rename", self.rename_one) if self.metrics else self.rename_one
+
+        if self.config.backend == "async":
+            result.stats.workers = self.config.max_concurrency
+            runs = self.async_backend().run(
+                self.execution_order(ops), rename_one, attrgetter("full_path"), attrgetter("parent"), progress,
+                total, result.stats, conflict_keys=rename_conflict_keys, barrier=barrier,
+                cancelled=self._cancel.is_set, before_window=write_ahead if journal else None)
+        else:
+            runs = run_sharded(
+                self.execution_order(ops), rename_one, attrgetter("parent"), self.config.workers, progress,
+                total, result.stats, conflict_keys=rename_conflict_keys, barrier=barrier,
+                cancelled=self._cancel.is_set, before_window=write_ahead if journal else None)
+
+        try:
+            for op, error in self._wrap("rename", runs):
+                if error:
+                    result.errors.append(error)
+                    failed.append(executed)
+                else:
+                    result.batch.append((op.new_full_path, op.full_path))  # Store for undo (new -> old)
+                    if not op.temporary:
+                        result.renamed += 1
+                if not op.temporary:
+                    result.total += 1
+                executed += 1
+        finally:
+            if journal:
+                # Planned renames a cancel cut off never ran
+                failed.extend(range(executed, planned))
+                journal.record_failed(batch_id, failed)
+                journal.end(batch_id)
+
+        result.cancelled = self._cancel.is_set()
+        return result
+
+    @staticmethod
+    def move_one(move: Tuple[str, str]) -> Optional[str]:
+        """Move current_path back to target_path, never replacing anything; returns an error message or None"""
+        current_path, target_path = move
+        try:
+            rename_noreplace(current_path, target_path)
+        except FileNotFoundError:
+            return f"File not found: {current_path}"
+        except FileExistsError:
+            return f"Skipping {current_path}: {os.path.basename(target_path)} already exists"
+        except Exception as e:
+            return f"Error renaming {current_path}: {str(e)}"
+        return None
+
+    @staticmethod
+    def apply_moves(moves: List[Tuple[str, str]], progress: Optional[ProgressCallback] = None,
+                    cancel: Optional[threading.Event] = None, metrics: Optional[Metrics] = None,
+                    stage: str = "move", backend: Optional["AsyncBackend"] = None, workers: int = 1,
+                    verify: bool = False) -> RenameResult:
+        """Rename each (current_path, target_path) in order.
+
+        Moves within one folder that touch different names, and moves in
+        different folders, run concurrently on workers threads (or on the
+        async backend); a window of moves never spans two tree depths, so
+        parent folders are in place before the entries beneath them move.
+        If cancel is set midway, result.batch holds the moves that were not
+        attempted yet. result.failed lists the positions of moves that did
+        not happen; with verify, the outcome of every attempted move is
+        checked afterwards against one listing per folder, so a move whose
+        error hides that it is in place anyway (done by an earlier, crashed
+        run, say) counts as done. With metrics, the loop is timed as stage
+        and each move goes into the operation_seconds histogram.
+        """
+        result = RenameResult(total=len(moves))
+        move = metrics.timed(stage, RenameEngine.move_one) if metrics else RenameEngine.move_one
+
+        def folder(pair: Tuple[str, str]) -> str:
+            return pair[0].rpartition(os.sep)[0]
+
+        def names(pair: Tuple[str, str]) -> Tuple[str, str]:
+            return pair[0].rpartition(os.sep)[2].casefold(), pair[1].rpartition(os.sep)[2].casefold()
+
+        def depth(pair: Tuple[str, str]) -> int:
+            return pair[0].count(os.sep)
+
+        cancelled = cancel.is_set if cancel is not None else None
+        errors: List[Optional[str]] = []
+        with metrics.stage(stage) if metrics else nullcontext():
+            if backend is not None:
+                runs = backend.run(moves, move, itemgetter(0), folder, progress, len(moves), conflict_keys=names,
+                                   barrier=depth, cancelled=cancelled)
+            else:
+                runs = run_sharded(moves, move, folder, workers, progress, len(moves), conflict_keys=names,
+                                   barrier=depth, cancelled=cancelled)
+            for _, error in runs:
+                errors.append(error)
+        if len(errors) < len(moves):
+            result.cancelled = True
+            result.batch = PathPairs(moves[len(errors):])
+
+        if verify and any(errors):
+            with metrics.stage("verify") if metrics else nullcontext():
+                in_place = RenameEngine.verify_moves(moves[:len(errors)])
+            for i, error in enumerate(errors):
+                if error and in_place[i]:
+                    errors[i] = None
+        for i, error in enumerate(errors):
+            if error:
+                result.errors.append(error)
+                result.failed.append(i)
+            else:
+                result.renamed += 1
+        if metrics:
+            metrics.inc("items", result.renamed, stage=stage)
+        return result
+
+    @staticmethod
+    def verify_moves(moves: List[Tuple[str, str]], missing: bool = False) -> List[bool]:
+        """Whether each (current_path, target_path) move is in place, from one listing per folder.
+
+        Both paths of a move share a folder, and the folders are listed
+        after all moves ran, so call this for moves that are all done or
+        failed, not for a run still in progress. Moves whose folder is gone
+        count as missing.
+        """
+        listings: Dict[str, Optional[Set[str]]] = {}
+        in_place = []
+        for current_path, target_path in moves:
+            parent, _, current = current_path.rpartition(os.sep)
+            target = target_path.rpartition(os.sep)[2]
+            if parent not in listings:
+                try:
+                    listings[parent] = set(os.listdir(parent))
+                except OSError:
+                    listings[parent] = None
+            names = listings[parent]
+            if names is None:
+                in_place.append(missing)
+            elif current.casefold() == target.casefold():
+                # A case-only rename shows up under exactly one spelling
+                in_place.append(target in names)
+            else:
+                in_place.append(target in names and current not in names)
+        return in_place
+
+    @staticmethod
+    def undo(batch: List[Tuple[str, str]], progress: Optional[ProgressCallback] = None,
+             cancel: Optional[threading.Event] = None, metrics: Optional[Metrics] = None,
+             backend: Optional["AsyncBackend"] = None, workers: int = 1) -> RenameResult:
+        """Revert a batch of (current_path, original_path) renames, newest first.
+
+        If cancel is set midway, result.batch holds the entries that were
+        not reverted yet so they can go back on the undo history.
+        """
+        # Reverse order restores parent folders before the entries recorded beneath them
+        result = RenameEngine.apply_moves(batch[::-1], progress, cancel, metrics, "undo", backend, workers, True)
+        if result.cancelled:
+            result.batch = PathPairs(result.batch[::-1])
+        return result
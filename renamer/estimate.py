@@ -0,0 +1,309 @@
+import math
+import os
+import statistics
+import time
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from itertools import accumulate
+from typing import Dict, List, Optional, Set, Tuple
+
+from .engine import RenameConfig, RenameEngine, RenameOp, RenamerError
+from .fsops import rename_noreplace
+from .rng import STREAM_SAMPLE, CounterRandom
+from .scan import Folder, Item
+
+# Folders listed by default before extrapolating
+DEFAULT_SAMPLE_DIRS = 200
+
+# New names shown from the sample
+DEFAULT_PREVIEW = 10
+
+# Items named to time the name stage; content tokens read these files
+NAME_TIMING_ITEMS = 200
+
+# Renames of the scratch file when timing renames on the mount
+PROBE_RENAMES = 21
+
+# Random walks stop here even if they keep landing on folders already listed
+MAX_PROBES = 100_000
+
+# Per-walk totals: folders to list, entries, files, folders, items to rename
+Totals = Tuple[float, float, float, float, float]
+
+
+class Listing:
+    """One listed folder: its counts, the subfolders a scan descends into and the items to rename"""
+
+    __slots__ = ("entries", "files", "folders", "subdirs", "items", "seconds")
+
+    def __init__(self) -> None:
+        self.entries = 0
+        self.files = 0
+        self.folders = 0
+        self.subdirs: List[str] = []
+        self.items: List[Item] = []
+        self.seconds = 0.0
+
+    def totals(self) -> Totals:
+        return 1, self.entries, self.files, self.folders, len(self.items)
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, secs = divmod(int(seconds + 0.5), 60)
+    if minutes < 60:
+        return f"{minutes}m {secs:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
+
+
+def fit_latency(listings: List[Listing]) -> Tuple[float, float]:
+    """Least-squares fit of listing time = per folder + per entry * entries"""
+    xs = [listing.entries for listing in listings]
+    ys = [listing.seconds for listing in listings]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    per_entry = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread if spread else 0.0
+    if per_entry < 0:
+        per_entry = 0.0
+    return max(0.0, mean_y - per_entry * mean_x), per_entry
+
+
+def probe_rename_latency(directory: str, count: int = PROBE_RENAMES) -> Optional[float]:
+    """Median time of one rename in directory, timed on a hidden scratch file that is removed again.
+
+    None if the folder cannot be written to.
+    """
+    path = os.path.join(directory, f".renamer-probe-{os.getpid()}")
+    other = path + "-b"
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+    except OSError:
+        return None
+    times = []
+    current = path
+    try:
+        for _ in range(count):
+            target = other if current == path else path
+            start = time.perf_counter()
+            rename_noreplace(current, target)
+            times.append(time.perf_counter() - start)
+            current = target
+    except OSError:
+        pass
+    finally:
+        try:
+            os.remove(current)
+        except OSError:
+            pass
+    return statistics.median(times) if times else None
+
+
+@dataclass
+class TreeEstimate:
+    """Extrapolated size of a tree and the time a rename of it would take"""
+    exact: bool  # Every folder was listed, so the counts are not estimates
+    listed: int  # Folders listed while sampling
+    probes: int  # Random walks from the root
+    seconds: float  # Time the sampling took
+    folders_to_list: float  # Folders a scan lists, the root included
+    entries: float
+    files: float
+    folders: float
+    renames: float  # Items the config selects for renaming
+    error: float  # Relative standard error of renames
+    list_latency: float  # Seconds per listing, plus entry_latency per entry in it
+    entry_latency: float
+    name_seconds: float  # Per item
+    rename_latency: Optional[float]  # None if not probed, or the mount could not be written to
+    parallel: int  # Renames in flight: worker threads, or the async backend's limit
+    seed: int
+    preview: List[RenameOp] = field(default_factory=list)
+
+    @property
+    def scan_seconds(self) -> float:
+        return self.folders_to_list * self.list_latency + self.entries * self.entry_latency
+
+    @property
+    def check_seconds(self) -> float:
+        # The collision check lists the target folders again
+        return self.scan_seconds if self.renames else 0.0
+
+    @property
+    def rename_seconds(self) -> float:
+        # A rename is one metadata round trip, like a listing of an empty folder
+        latency = self.rename_latency if self.rename_latency is not None else self.list_latency
+        return self.renames * latency / self.parallel
+
+    @property
+    def total_seconds(self) -> float:
+        return self.scan_seconds + self.renames * self.name_seconds + self.check_seconds + self.rename_seconds
+
+    def summary(self) -> List[str]:
+        """Human readable report"""
+        if self.exact:
+            lines = [f"Listed all {self.listed} folders in {format_duration(self.seconds)}"]
+            about = ""
+        else:
+            share = 100 * self.listed / max(self.folders_to_list, self.listed)
+            lines = [f"Listed {self.listed} of ~{self.folders_to_list:,.0f} folders ({share:.1f}%) on "
+                     f"{self.probes} random walks in {format_duration(self.seconds)}"]
+            about = "~"
+        spread = f" (±{100 * self.error:.0f}%)" if not self.exact else ""
+        lines.append(f"Entries: {about}{self.entries:,.0f} ({about}{self.files:,.0f} files, "
+                     f"{about}{self.folders:,.0f} folders)")
+        lines.append(f"To rename: {about}{self.renames:,.0f} items{spread}")
+        rename_latency = (f"{self.rename_latency * 1000:.2f} ms" if self.rename_latency is not None
+                          else "not measured, assumed like a listing")
+        lines.append(f"Latency: listing {self.list_latency * 1000:.2f} ms + {self.entry_latency * 1e6:.1f} us/entry, "
+                     f"naming {self.name_seconds * 1e6:.0f} us/item, rename {rename_latency}")
+        lines.append(f"Estimated time: scan {format_duration(self.scan_seconds)}, "
+                     f"names {format_duration(self.renames * self.name_seconds)}, "
+                     f"collision check {format_duration(self.check_seconds)}, "
+                     f"renames {format_duration(self.rename_seconds)} ({self.parallel} in flight); "
+                     f"total {about}{format_duration(self.total_seconds)}")
+        return lines
+
+
+class TreeSampler:
+    """Lists a bounded number of folders on random walks from the root and extrapolates the whole tree.
+
+    Each walk descends from the root into a random subfolder until it
+    reaches a leaf, weighting every folder on the way by the product of the
+    subfolder counts above it; the weighted sums are unbiased estimates of
+    the tree's totals (Knuth's estimator), averaged over the walks. Listings
+    are cached, so the top of the tree is listed once and later walks only
+    pay for the folders they reach first. If every folder ends up listed,
+    the counts are exact.
+    """
+
+    def __init__(self, engine: RenameEngine) -> None:
+        self.engine = engine
+        self.config = engine.config
+        self.root = self.config.directory
+        self.matches = engine.compile_filter()
+        self.listings: Dict[str, Listing] = {}
+        self.unlisted: Set[str] = {self.root}
+
+    def listing(self, path: str) -> Listing:
+        cached = self.listings.get(path)
+        if cached is not None:
+            return cached
+        config = self.config
+        listing = Listing()
+        rel = os.path.relpath(path, self.root)
+        folder = Folder("" if rel == os.curdir else rel + os.sep, os.path.join(path, ""))
+        start = time.perf_counter()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    listing.entries += 1
+                    try:
+                        is_dir = entry.is_dir()
+                        is_file = not is_dir and entry.is_file()
+                    except OSError:
+                        continue
+                    if is_dir:
+                        listing.folders += 1
+                        if config.include_folders:
+                            listing.items.append(Item(folder, entry.name, False, True))
+                        if config.recursive and not entry.is_symlink():
+                            listing.subdirs.append(entry.path)
+                    elif is_file:
+                        listing.files += 1
+                        if config.include_files and self.matches(entry.name):
+                            listing.items.append(Item(folder, entry.name, True, False))
+        except OSError as e:
+            # Unreadable subfolders are skipped, as scans do
+            if path == self.root:
+                raise RenamerError(f"Cannot list {path}: {e}") from None
+        listing.seconds = time.perf_counter() - start
+        self.listings[path] = listing
+        self.unlisted.discard(path)
+        self.unlisted.update(p for p in listing.subdirs if p not in self.listings)
+        return listing
+
+    def walk(self, probe: int, visits: List[Tuple[float, Listing]]) -> Totals:
+        """One random walk from the root; appends each folder passed and its weight to visits"""
+        rng = CounterRandom(self.engine.seed, probe, STREAM_SAMPLE)
+        totals = [0.0] * 5
+        path, weight = self.root, 1.0
+        while True:
+            listing = self.listing(path)
+            visits.append((weight, listing))
+            for i, value in enumerate(listing.totals()):
+                totals[i] += weight * value
+            if not listing.subdirs:
+                return totals[0], totals[1], totals[2], totals[3], totals[4]
+            weight *= len(listing.subdirs)
+            path = rng.choice(listing.subdirs)
+
+    def sample(self, budget: int) -> Tuple[List[Totals], List[Tuple[float, Listing]]]:
+        walks: List[Totals] = []
+        visits: List[Tuple[float, Listing]] = []
+        while self.unlisted and len(self.listings) < budget and len(walks) < MAX_PROBES:
+            walks.append(self.walk(len(walks), visits))
+        return walks, visits
+
+    def representative(self, visits: List[Tuple[float, Listing]], count: int) -> List[Item]:
+        """About count items drawn in proportion to how many items each sampled folder stands for, in draw order"""
+        visits = [(weight, listing) for weight, listing in visits if listing.items]
+        if not visits or count <= 0:
+            return []
+        cumulative = list(accumulate(weight * len(listing.items) for weight, listing in visits))
+        chosen: Dict[Tuple[int, int], Item] = {}
+        for draw in range(4 * count):
+            if len(chosen) >= count:
+                break
+            rng = CounterRandom(self.engine.seed, MAX_PROBES + draw, STREAM_SAMPLE)
+            _, listing = visits[min(len(visits) - 1, bisect_right(cumulative, rng.random() * cumulative[-1]))]
+            index = rng.below(len(listing.items))
+            chosen.setdefault((id(listing), index), listing.items[index])
+        return list(chosen.values())
+
+
+def estimate_tree(config: RenameConfig, sample_dirs: int = DEFAULT_SAMPLE_DIRS, preview: int = DEFAULT_PREVIEW,
+                  probe: bool = False, engine: Optional[RenameEngine] = None) -> TreeEstimate:
+    """Estimate what renaming config.directory would involve, listing at most about sample_dirs folders.
+
+    The preview is named from a representative sample of items; counters
+    and other position-dependent values number the sample itself. With
+    probe, rename latency is timed on a scratch file in the root.
+    """
+    engine = engine or RenameEngine(config)
+    if not os.path.isdir(config.directory):
+        raise RenamerError(f"Not a directory: {config.directory}")
+    start = time.perf_counter()
+    sampler = TreeSampler(engine)
+    walks, visits = sampler.sample(max(1, sample_dirs))
+    listings = list(sampler.listings.values())
+
+    exact = not sampler.unlisted
+    if exact:
+        sums = [sum(column) for column in zip(*(listing.totals() for listing in listings))]
+        error = 0.0
+        visits = [(1.0, listing) for listing in listings]
+    else:
+        sums = [sum(column) / len(walks) for column in zip(*walks)]
+        renames = [walk[4] for walk in walks]
+        error = (statistics.stdev(renames) / math.sqrt(len(walks)) / sums[4]
+                 if len(walks) > 1 and sums[4] else 1.0)
+
+    list_latency, entry_latency = fit_latency(listings)
+    drawn = sampler.representative(visits, max(preview, NAME_TIMING_ITEMS))
+    items = sorted(drawn, key=lambda item: item.rel_path)
+    name_start = time.perf_counter()
+    ops = list(engine.name_items(items))
+    name_seconds = (time.perf_counter() - name_start) / len(ops) if ops else 0.0
+    shown = set(map(id, drawn[:preview]))
+    ops = [op for item, op in zip(items, ops) if id(item) in shown]
+    rename_latency = probe_rename_latency(config.directory) if probe and sums[4] else None
+
+    parallel = config.max_concurrency if config.backend == "async" else config.workers
+    return TreeEstimate(
+        exact=exact, listed=len(listings), probes=len(walks), seconds=time.perf_counter() - start,
+        folders_to_list=sums[0], entries=sums[1], files=sums[2], folders=sums[3], renames=sums[4], error=error,
+        list_latency=list_latency, entry_latency=entry_latency, name_seconds=name_seconds,
+        rename_latency=rename_latency, parallel=max(1, parallel), seed=engine.seed, preview=ops)
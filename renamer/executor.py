@@ -0,0 +1,211 @@
+import heapq
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from itertools import groupby, islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Ops gathered from a stream before it is sharded and dispatched
+DEFAULT_WINDOW = 10_000
+
+# Ways to issue filesystem calls; "async" lives in .aio, imported only when chosen
+BACKENDS = ("threads", "async")
+# Upper bound for the async backend's adaptive concurrency limit
+DEFAULT_MAX_CONCURRENCY = 32
+
+ProgressCallback = Callable[[int, int], None]
+
+
+@dataclass
+class WorkerStats:
+    """Throughput of one executor thread"""
+    name: str
+    operations: int = 0
+    errors: int = 0
+    busy: float = 0.0
+
+    @property
+    def per_second(self) -> float:
+        return self.operations / self.busy if self.busy else 0.0
+
+
+@dataclass
+class ExecutorStats:
+    """Throughput of a whole execution"""
+    workers: int
+    operations: int = 0
+    elapsed: float = 0.0
+    per_worker: Dict[str, WorkerStats] = field(default_factory=dict)
+
+    @property
+    def per_second(self) -> float:
+        return self.operations / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> List[str]:
+        """Human readable report, one line per worker plus a total"""
+        lines = [f"{w.name}: {w.operations} ops, {w.errors} errors, {w.per_second:.0f} ops/s"
+                 for w in sorted(self.per_worker.values(), key=lambda w: w.name)]
+        lines.append(f"total: {self.operations} ops in {self.elapsed:.2f}s, "
+                     f"{self.per_second:.0f} ops/s with {self.workers} worker(s)")
+        return lines
+
+
+def split_shard(shard: List[Tuple[int, T]], conflict_keys: Callable[[T], Iterable[str]],
+                parts: int) -> List[List[Tuple[int, T]]]:
+    """Split one shard into at most `parts` groups that share no conflict key.
+
+    Tasks touching a common key (a source or target name) end up in the
+    same group, found with a union-find over the keys, so they keep their
+    relative order on a single thread.
+    """
+    # Union-find over task positions; a key remembers the first task that touched it
+    parent = list(range(len(shard)))
+    owner: Dict[str, int] = {}
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for position, (_, task) in enumerate(shard):
+        for key in conflict_keys(task):
+            other = owner.setdefault(key, position)
+            if other != position:
+                a, b = find(other), find(position)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+
+    groups: Dict[int, List[Tuple[int, T]]] = {}
+    for position, entry in enumerate(shard):
+        groups.setdefault(find(position), []).append(entry)
+
+    return pack(list(groups.values()), parts)
+
+
+def pack(groups: List[List[Tuple[int, T]]], parts: int) -> List[List[Tuple[int, T]]]:
+    """Merge independent groups into at most `parts` buckets of similar size"""
+    if len(groups) <= parts:
+        return groups
+    # Largest groups first, each into the currently smallest bucket
+    buckets: List[List[Tuple[int, T]]] = [[] for _ in range(parts)]
+    sizes = [(0, b) for b in range(parts)]
+    for group in sorted(groups, key=len, reverse=True):
+        size, b = heapq.heappop(sizes)
+        buckets[b].extend(group)
+        heapq.heappush(sizes, (size + len(group), b))
+    for bucket in buckets:
+        bucket.sort(key=lambda entry: entry[0])
+    return buckets
+
+
+def windows(tasks: Iterable[T], size: int, barrier: Optional[Callable[[T], object]] = None) -> Iterator[List[T]]:
+    """Cut a stream into lists of at most size tasks, never spanning two barrier values"""
+    groups = groupby(tasks, barrier) if barrier is not None else [(None, iter(tasks))]
+    for _, group in groups:
+        while True:
+            chunk = list(islice(group, size))
+            if not chunk:
+                break
+            yield chunk
+
+
+def run_sharded(tasks: Iterable[T], apply: Callable[[T], Optional[str]], shard_key: Callable[[T], str],
+                workers: int = 1, progress: Optional[ProgressCallback] = None, total: int = 0,
+                stats: Optional[ExecutorStats] = None, window: int = DEFAULT_WINDOW,
+                conflict_keys: Optional[Callable[[T], Iterable[str]]] = None,
+                barrier: Optional[Callable[[T], object]] = None,
+                cancelled: Optional[Callable[[], bool]] = None,
+                before_window: Optional[Callable[[List[T]], None]] = None) -> Iterator[Tuple[T, Optional[str]]]:
+    """Run apply() on every task and yield (task, error) pairs in input order.
+
+    Tasks are grouped by shard_key (the parent directory for renames). Each
+    shard runs serially on one thread, so checks like "does the target name
+    already exist" stay correct within a directory, while different
+    directories proceed concurrently. With conflict_keys, a large shard is
+    further split into groups that touch disjoint names, so a single big
+    directory still uses the whole pool. Streams are processed in windows so
+    memory stays bounded. With barrier, a window never spans two barrier
+    values, so every task of one value (e.g. one tree depth) finishes before
+    the next value starts.
+
+    When cancelled() turns true the run stops between tasks (serial) or
+    between windows (threaded); every task that did run is still yielded.
+    before_window(chunk) runs before any task of a window starts, e.g. to
+    write the window ahead to a journal.
+    """
+    stats = stats if stats is not None else ExecutorStats(workers=max(1, workers))
+    local = threading.local()
+    lock = threading.Lock()
+    done = 0
+    started = time.perf_counter()
+
+    def worker_stats() -> WorkerStats:
+        ws = getattr(local, "stats", None)
+        if ws is None:
+            name = threading.current_thread().name
+            ws = local.stats = WorkerStats(name)
+            with lock:
+                stats.per_worker[name] = ws
+        return ws
+
+    def run_shard(shard: List[Tuple[int, T]], errors: List[Optional[str]]) -> int:
+        ws = worker_stats()
+        begin = time.perf_counter()
+        for index, task in shard:
+            error = apply(task)
+            errors[index] = error
+            ws.operations += 1
+            if error:
+                ws.errors += 1
+        ws.busy += time.perf_counter() - begin
+        return len(shard)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rename") if workers > 1 else None
+    try:
+        for chunk in windows(tasks, window, barrier if pool is not None else None):
+            if cancelled and cancelled():
+                break
+            if before_window:
+                before_window(chunk)
+            errors: List[Optional[str]] = [None] * len(chunk)
+
+            if pool is None:
+                for index, task in enumerate(chunk):
+                    if cancelled and cancelled():
+                        del chunk[index:]
+                        break
+                    run_shard([(index, task)], errors)
+                    done += 1
+                    if progress:
+                        progress(done, total)
+            else:
+                shards: Dict[str, List[Tuple[int, T]]] = {}
+                for index, task in enumerate(chunk):
+                    shards.setdefault(shard_key(task), []).append((index, task))
+                groups: List[List[Tuple[int, T]]] = []
+                for shard in shards.values():
+                    if conflict_keys is not None and len(shard) > 1:
+                        groups.extend(split_shard(shard, conflict_keys, workers))
+                    else:
+                        groups.append(shard)
+                # A few buckets per thread keeps the pool busy without paying a submit per tiny folder
+                pending = {pool.submit(run_shard, group, errors) for group in pack(groups, workers * 4)}
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done += future.result()
+                    if progress:
+                        progress(done, total)
+
+            stats.operations += len(chunk)
+            stats.elapsed = time.perf_counter() - started
+            for index, task in enumerate(chunk):
+                yield task, errors[index]
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+        stats.elapsed = time.perf_counter() - started
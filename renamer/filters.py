@@ -0,0 +1,160 @@
+import fnmatch
+import re
+from typing import Callable, List, Optional, Pattern, Tuple
+
+# Entry prefixes understood by compile_filter
+EXCLUDE_PREFIX = "!"
+REGEX_PREFIX = "re:"
+
+# Commas separate entries; a backslash keeps a comma inside one
+SEPARATOR_RE = re.compile(r"(?<!\\),")
+
+GLOB_CHARS = frozenset("*?[")
+
+# Numbered backreferences, named groups and conditionals: these refer to groups
+# by number or name, so such a regex cannot be joined with the others
+GROUP_REFERENCE_RE = re.compile(r"\\[1-9]|\(\?P[<=]|\(\?\(")
+
+# Inline flags like (?i) or (?x) apply to the whole regex and must lead it,
+# so a regex carrying them cannot be joined with the others either
+GLOBAL_FLAGS_RE = re.compile(r"\(\?[aiLmsux]+\)")
+
+
+class FilterError(ValueError):
+    """Raised when a file filter entry cannot be compiled"""
+
+
+def _match_all(name: str) -> bool:
+    return True
+
+
+def split_filter(spec: str) -> List[str]:
+    """Split a filter string into its stripped, non-empty entries"""
+    entries = (entry.strip().replace("\\,", ",") for entry in SEPARATOR_RE.split(spec))
+    return [entry for entry in entries if entry]
+
+
+class FilterMatcher:
+    """A file filter compiled once per scan.
+
+    Entries are sorted by the cheapest test that answers them: `*.ext`
+    entries become a frozenset looked up with the name's extension, plain
+    names a frozenset of lowercased names, and the remaining globs and
+    `re:` regexes one combined compiled regex. A `re:` regex that refers to
+    its own groups or sets inline flags is compiled on its own, since
+    joining would renumber its groups or move its flags; so is every
+    regex if the combined one fails to compile. Matching is
+    case-insensitive.
+    """
+
+    __slots__ = ("entries", "match_all", "extensions", "suffixes", "names", "regex", "separate", "match")
+
+    def __init__(self, entries: List[str]) -> None:
+        self.entries = entries
+        extensions = set()
+        suffixes: List[str] = []
+        names = set()
+        globs: List[str] = []
+        regexes: List[Tuple[str, Pattern[str]]] = []  # (source, compiled alone) of the joinable ones
+        separate: List[Pattern[str]] = []
+
+        for entry in entries:
+            if entry == "*":
+                self.match_all = True
+                break
+            if entry.startswith(REGEX_PREFIX):
+                source = entry[len(REGEX_PREFIX):]
+                try:
+                    compiled = re.compile(source, re.IGNORECASE | re.DOTALL)
+                except re.error as e:
+                    raise FilterError(f"Invalid filter regex {source!r}: {e}") from None
+                if GROUP_REFERENCE_RE.search(source) or GLOBAL_FLAGS_RE.search(source):
+                    separate.append(compiled)
+                else:
+                    regexes.append((source, compiled))
+            elif entry.startswith("*.") and not GLOB_CHARS.intersection(entry[2:]):
+                ext = entry[1:].lower()
+                # Single-dot extensions are set lookups; ".tar.gz" style ones fall back to endswith
+                if ext.count(".") == 1 and ext != ".":
+                    extensions.add(ext)
+                else:
+                    suffixes.append(ext)
+            elif GLOB_CHARS.intersection(entry):
+                globs.append(fnmatch.translate(entry))
+            else:
+                names.add(entry.lower())
+        else:
+            self.match_all = False
+
+        self.extensions = frozenset(extensions)
+        self.suffixes = tuple(suffixes)
+        self.names = frozenset(names)
+        self.regex: Optional[Pattern[str]] = None
+        # Regexes are searched anywhere in the name, like re.search
+        alternatives = globs + [f"(?:.*?(?:{source}))" for source, _ in regexes]
+        if alternatives:
+            try:
+                self.regex = re.compile("|".join(alternatives), re.IGNORECASE | re.DOTALL)
+            except re.error:
+                # Each regex compiled alone, so only joining them failed
+                separate.extend(compiled for _, compiled in regexes)
+                self.regex = re.compile("|".join(globs), re.IGNORECASE | re.DOTALL) if globs else None
+        self.separate: Tuple[Pattern[str], ...] = tuple(separate)
+        self.match = self._specialize()
+
+    def _specialize(self) -> Callable[[str], bool]:
+        """Pick the cheapest predicate for the entries; a plain extension list is the common case"""
+        if self.match_all:
+            return _match_all
+        if self.suffixes or self.names or self.regex is not None or self.separate:
+            return self._match
+        extensions = self.extensions
+
+        def match_extension(name: str) -> bool:
+            dot = name.rfind(".")
+            return dot >= 0 and name[dot:].lower() in extensions
+
+        return match_extension
+
+    def _match(self, name: str) -> bool:
+        dot = name.rfind(".")
+        if dot >= 0 and name[dot:].lower() in self.extensions:
+            return True
+        if self.suffixes or self.names:
+            lowered = name.lower()
+            if lowered in self.names or lowered.endswith(self.suffixes):
+                return True
+        if self.regex is not None and self.regex.match(name) is not None:
+            return True
+        return any(regex.search(name) is not None for regex in self.separate)
+
+
+def compile_filter(spec: str) -> Callable[[str], bool]:
+    """Compile a comma-separated file filter into a name predicate.
+
+    Entries are globs (`*.jpg`, `IMG_????.*`, `[ab]*`), plain names,
+    or regexes prefixed with `re:`. Entries starting with `!` exclude names
+    matched by the rest of the entry. A name passes when it matches any
+    include entry (or there are none) and no exclude entry. An empty filter
+    or a bare `*` matches everything.
+    """
+    entries = split_filter(spec)
+    includes: List[str] = []
+    excludes: List[str] = []
+    for entry in entries:
+        if entry.startswith(EXCLUDE_PREFIX):
+            rest = entry[len(EXCLUDE_PREFIX):].strip()
+            if rest:
+                excludes.append(rest)
+        else:
+            includes.append(entry)
+
+    include = FilterMatcher(includes).match if includes else _match_all
+    if not excludes:
+        return include
+
+    exclude = FilterMatcher(excludes).match
+    if include is _match_all:
+        return lambda name: not exclude(name)
+    return lambda name: include(name) and not exclude(name)
+
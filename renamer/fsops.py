@@ -0,0 +1,114 @@
+import ctypes
+import errno
+import os
+import sys
+from typing import Callable, Dict, Optional
+
+# renameat2() flag: fail with EEXIST instead of replacing the target
+RENAME_NOREPLACE = 1
+AT_FDCWD = -100
+
+
+def _load_renameat2() -> Optional[Callable[..., int]]:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        renameat2 = libc.renameat2  # glibc 2.28+
+    except (OSError, AttributeError):
+        return None
+    renameat2.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+    renameat2.restype = ctypes.c_int
+    return renameat2
+
+
+_renameat2 = _load_renameat2()
+
+
+def _rename_checked(src: str, dst: str) -> None:
+    if os.path.lexists(dst) and not _same_entry(src, dst):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+    os.rename(src, dst)
+
+
+def _same_entry(src: str, dst: str) -> bool:
+    """True for case-only renames on case-insensitive folders, where dst "exists" as src"""
+    try:
+        return os.path.samefile(src, dst)
+    except OSError:
+        return False
+
+
+def rename_noreplace(src: str, dst: str) -> None:
+    """Rename src to dst, raising FileExistsError instead of replacing an existing dst.
+
+    On Linux this is a single renameat2(RENAME_NOREPLACE) call, atomic and
+    without a separate existence check; Windows' rename never replaces. On
+    other systems, or filesystems without renameat2 support, dst is checked
+    first.
+    """
+    if os.name == "nt":
+        try:
+            os.rename(src, dst)
+        except FileExistsError:
+            if not _same_entry(src, dst):
+                raise
+            os.replace(src, dst)
+        return
+    if _renameat2 is None:
+        _rename_checked(src, dst)
+        return
+
+    if _renameat2(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst), RENAME_NOREPLACE) == 0:
+        return
+    err = ctypes.get_errno()
+    if err in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+        # Filesystem (e.g. some network mounts) or kernel without RENAME_NOREPLACE
+        _rename_checked(src, dst)
+        return
+    if err == errno.EEXIST and _same_entry(src, dst):
+        os.rename(src, dst)
+        return
+    raise OSError(err, os.strerror(err), src, None, dst)
+
+
+class InodeCache:
+    """Inode numbers of the entries in folders, from one listing per folder.
+
+    On Linux and macOS the listing carries them, so this costs no stat per
+    entry. Names renamed after their folder was listed keep their old
+    numbers here; ask before renaming.
+    """
+
+    __slots__ = ("_folders",)
+
+    def __init__(self) -> None:
+        self._folders: Dict[str, Dict[str, int]] = {}
+
+    def get(self, path: str) -> Optional[int]:
+        folder, _, name = path.rpartition(os.sep)
+        inodes = self._folders.get(folder)
+        if inodes is None:
+            inodes = {}
+            try:
+                with os.scandir(folder or os.sep) as entries:
+                    for entry in entries:
+                        try:
+                            inodes[entry.name] = entry.inode()
+                        except OSError:
+                            pass
+            except OSError:
+                pass
+            self._folders[folder] = inodes
+        return inodes.get(name)
+
+    def clear(self) -> None:
+        self._folders.clear()
+
+
+def current_inode(path: str) -> Optional[int]:
+    """Inode number of the entry at path, or None if there is none"""
+    try:
+        return os.lstat(path).st_ino
+    except OSError:
+        return None
@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields, replace
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from .engine import ProgressCallback, RenameCancelled, RenameConfig, RenameEngine, RenameResult, RenamerError
+from .metrics import Metrics
+
+if TYPE_CHECKING:
+    from .journal import Journal
+
+# Version of the manifest and report layouts; bumped on incompatible changes
+MANIFEST_FORMAT = 1
+
+DEFAULT_JOBS = 4
+
+
+def _config(data: Dict[str, Any], base: Optional[RenameConfig] = None) -> RenameConfig:
+    known = {f.name for f in fields(RenameConfig)}
+    unknown = sorted(set(data) - known)
+    if unknown:
+        raise RenamerError(f"Unknown option(s) in manifest: {', '.join(unknown)}")
+    return replace(base, **data) if base is not None else RenameConfig(**data)
+
+
+@dataclass
+class JobManifest:
+    """Many rename jobs, one per root folder, sharing a set of default options.
+
+    Stored as JSON: "defaults" holds RenameConfig fields, and each entry of
+    "jobs" is either a folder path or an object with a "directory" and the
+    fields it overrides:
+
+        {"format": 1, "defaults": {"pattern": "{orig_name}_{date}"},
+         "jobs": ["/mnt/share1", {"directory": "/mnt/share2", "file_filter": "*.pdf"}]}
+    """
+    defaults: RenameConfig = field(default_factory=RenameConfig)
+    jobs: List[Dict[str, Any]] = field(default_factory=list)  # Per-root overrides, always with "directory"
+
+    @classmethod
+    def from_config(cls, config: RenameConfig, directories: List[str]) -> "JobManifest":
+        """One job per directory, all with the options of config"""
+        return cls(replace(config, directory=""), [{"directory": d} for d in directories])
+
+    @property
+    def directories(self) -> List[str]:
+        return [job["directory"] for job in self.jobs]
+
+    def configs(self) -> List[RenameConfig]:
+        """The full option set of every job, in manifest order"""
+        return [_config(job, self.defaults) for job in self.jobs]
+
+    def to_dict(self) -> Dict[str, Any]:
+        defaults = asdict(self.defaults)
+        del defaults["directory"]
+        return {"format": MANIFEST_FORMAT, "defaults": defaults,
+                "jobs": [job["directory"] if len(job) == 1 else job for job in self.jobs]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "JobManifest":
+        if data.get("format") != MANIFEST_FORMAT:
+            raise RenamerError(f"Unsupported manifest format: {data.get('format')!r}")
+        defaults = _config(data.get("defaults", {}))
+        jobs = []
+        for job in data.get("jobs", []):
+            entry: Dict[str, Any] = {"directory": job} if isinstance(job, str) else dict(job)
+            if not entry.get("directory"):
+                raise RenamerError("Every manifest job needs a directory")
+            _config(entry, defaults)  # Reject unknown options now rather than mid-run
+            jobs.append(entry)
+        return cls(defaults, jobs)
+
+    def save(self, path: str) -> None:
+        """Write the manifest as JSON, replacing any existing file atomically"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "JobManifest":
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise RenamerError(f"Cannot read manifest {path}: {e}") from None
+        if not isinstance(data, dict):
+            raise RenamerError(f"Cannot read manifest {path}: not a manifest")
+        return cls.from_dict(data)
+
+
+@dataclass
+class JobResult:
+    """Outcome of one root of a multi-root run"""
+    directory: str
+    planned: int = 0
+    collisions: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    result: Optional[RenameResult] = None  # None when the job failed before renaming or only previewed
+    error: Optional[str] = None  # Why the job failed as a whole
+    elapsed: float = 0.0
+
+    @property
+    def status(self) -> str:
+        if self.error is not None:
+            return "failed"
+        if self.result is None:
+            return "planned"
+        if self.result.cancelled:
+            return "cancelled"
+        return "errors" if self.result.errors else "ok"
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = self.result
+        return {
+            "directory": self.directory,
+            "status": self.status,
+            "planned": self.planned,
+            "renamed": result.renamed if result else 0,
+            "errors": (result.errors if result else []) + ([self.error] if self.error else []),
+            "collisions": self.collisions,
+            "warnings": self.warnings,
+            "seconds": round(self.elapsed, 3),
+        }
+
+
+@dataclass
+class JobReport:
+    """Results of all roots of a multi-root run, in manifest order"""
+    jobs: List[JobResult]
+    elapsed: float = 0.0
+
+    @property
+    def renamed(self) -> int:
+        return sum(job.result.renamed for job in self.jobs if job.result)
+
+    @property
+    def failed(self) -> List[JobResult]:
+        return [job for job in self.jobs if job.status in ("failed", "errors")]
+
+    def summary(self) -> List[str]:
+        """Human readable report, one line per root plus a total"""
+        lines = []
+        for job in self.jobs:
+            renamed = job.result.renamed if job.result else 0
+            detail = f": {job.error}" if job.error else ""
+            lines.append(f"{job.status:9s} {renamed:8d} of {job.planned:8d}  {job.elapsed:7.2f}s  "
+                         f"{job.directory}{detail}")
+        lines.append(f"total: {self.renamed} renamed in {len(self.jobs)} folders, "
+                     f"{len(self.failed)} with errors, in {self.elapsed:.2f}s")
+        return lines
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"format": MANIFEST_FORMAT, "seconds": round(self.elapsed, 3), "renamed": self.renamed,
+                "jobs": [job.to_dict() for job in self.jobs]}
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+
+class JobRunner:
+    """Runs the jobs of a manifest on a pool of workers, each root in its own engine.
+
+    A root whose scan, plan or renames fail is reported and the others carry
+    on. Every root is a separate journal batch, so each can be undone on its
+    own. Progress is reported over all roots together: the totals grow as
+    roots finish planning.
+    """
+
+    def __init__(self, configs: List[RenameConfig], journal: Optional["Journal"] = None,
+                 workers: int = DEFAULT_JOBS, rename: bool = True, metrics: Optional[Metrics] = None) -> None:
+        self.configs = configs
+        self.journal = journal
+        self.workers = max(1, workers)
+        self.rename = rename
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._engines: Dict[int, RenameEngine] = {}
+        self._progress: Dict[int, Tuple[int, int]] = {}
+
+    def cancel(self) -> None:
+        """Stop every running job; jobs not started yet are skipped"""
+        self._cancel.set()
+        with self._lock:
+            engines = list(self._engines.values())
+        for engine in engines:
+            engine.cancel()
+
+    def _report(self, index: int, progress: Optional[ProgressCallback]) -> Callable[[int, int], None]:
+        def report(done: int, total: int) -> None:
+            with self._lock:
+                self._progress[index] = (done, total)
+                done_all = sum(d for d, _ in self._progress.values())
+                total_all = sum(t for _, t in self._progress.values())
+            if progress:
+                progress(done_all, total_all)
+        return report
+
+    def _run_one(self, index: int, progress: Optional[ProgressCallback]) -> JobResult:
+        config = self.configs[index]
+        job = JobResult(config.directory)
+        if self._cancel.is_set():
+            job.result = RenameResult(total=0, cancelled=True)
+            return job
+        start = time.perf_counter()
+        engine = RenameEngine(config, self.journal, self.metrics)
+        with self._lock:
+            self._engines[index] = engine
+        report = self._report(index, progress)
+        try:
+            job.warnings = engine.check_config()
+            plan = engine.plan()
+            job.planned = len(plan)
+            job.collisions.extend(plan.collisions)
+            report(0, len(plan))
+            if self.rename and plan:
+                job.result = engine.execute(plan, report)
+        except RenameCancelled:
+            # A job stopped by cancel() is not a failure
+            job.result = RenameResult(total=job.planned, cancelled=True)
+        except RenamerError as e:
+            job.error = str(e)
+        except Exception as e:
+            job.error = f"Unexpected error: {str(e)}"
+        finally:
+            with self._lock:
+                del self._engines[index]
+            job.elapsed = time.perf_counter() - start
+        return job
+
+    def run(self, progress: Optional[ProgressCallback] = None) -> JobReport:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job") as pool:
+            futures = [pool.submit(self._run_one, i, progress) for i in range(len(self.configs))]
+            jobs = [future.result() for future in futures]
+        return JobReport(jobs, time.perf_counter() - start)
+
+
+def run_jobs(manifest: JobManifest, journal: Optional["Journal"] = None, workers: int = DEFAULT_JOBS,
+             rename: bool = True, progress: Optional[ProgressCallback] = None,
+             metrics: Optional[Metrics] = None) -> JobReport:
+    """Plan and (unless rename is False) execute every job of a manifest"""
+    return JobRunner(manifest.configs(), journal, workers, rename, metrics).run(progress)
@@ -0,0 +1,567 @@
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import IO, TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from .columns import PathPairs
+from .engine import ProgressCallback, RenameEngine, RenameResult, RenamerError
+from .fsops import current_inode, rename_noreplace
+from .metrics import Metrics
+
+if TYPE_CHECKING:
+    from .aio import AsyncBackend
+
+JOURNAL_ENV = "RENAMER_JOURNAL"
+
+# Threads moving entries back on undo, redo and recovery; moves are sharded by folder
+DEFAULT_UNDO_WORKERS = 8
+
+# Record types, one per line, fields separated by tabs:
+#   B <id> <time> <description>   batch started
+#   P <id> <src> <dst> [<inode>]  rename planned (written ahead, once per window), with
+#                                 the inode of the entry it moves if known
+#   F <id> <index>                planned rename <index> did not happen
+#   E <id>                        batch finished
+#   S <id> <undo|redo>            undo/redo run started
+#   T <id> <position>             run finished; the first <position> renames are applied
+#   K <id> <index>                rename <index> is applied although one before it is not
+#   R <id> <index>                kept rename <index> is no longer applied
+#   D <id>                        undone batch dropped from the redo history
+_ESCAPES = {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"}
+_UNESCAPES = {v[1]: k for k, v in _ESCAPES.items()}
+_ESCAPE_RE = re.compile(r"\\(.)")
+
+
+def default_journal_path() -> str:
+    return os.environ.get(JOURNAL_ENV) or os.path.join(os.path.expanduser("~"), ".renamer", "journal.log")
+
+
+def _escape(value: str) -> str:
+    if "\\" in value or "\t" in value or "\n" in value or "\r" in value:
+        for char, escaped in _ESCAPES.items():
+            value = value.replace(char, escaped)
+    return value
+
+
+def _unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    return _ESCAPE_RE.sub(lambda m: _UNESCAPES.get(m.group(1), m.group(1)), value)
+
+
+def _planned_line(batch_id: str, src: str, dst: str, inode: Optional[int]) -> str:
+    if inode is None:
+        return f"P\t{batch_id}\t{_escape(src)}\t{_escape(dst)}\n"
+    return f"P\t{batch_id}\t{_escape(src)}\t{_escape(dst)}\t{inode}\n"
+
+
+@dataclass
+class Batch:
+    """One rename batch as reconstructed from the journal"""
+    batch_id: str
+    created: float
+    description: str
+    planned: PathPairs = field(default_factory=PathPairs)  # (src, dst) in execution order
+    failed: Set[int] = field(default_factory=set)
+    complete: bool = False
+    position: int = 0  # ops[:position] are currently applied
+    run: Optional[str] = None  # undo/redo run that started but never finished
+    kept: Set[int] = field(default_factory=set)  # ops[i] with i >= position that are applied all the same
+    dropped: bool = False
+    _ops: Optional[PathPairs] = None
+
+    @property
+    def ops(self) -> PathPairs:
+        """Renames that actually happened, in execution order"""
+        if self._ops is None:
+            if not self.failed:
+                self._ops = self.planned
+            else:
+                self._ops = PathPairs((op for i, op in enumerate(self.planned) if i not in self.failed),
+                                      self.planned.folders)
+        return self._ops
+
+    @property
+    def interrupted(self) -> bool:
+        return not self.complete or self.run is not None
+
+    @property
+    def applied(self) -> int:
+        """How many of the renames are currently applied"""
+        return self.position + len(self.kept)
+
+
+class Journal:
+    """Append-only, line-oriented rename journal.
+
+    Planned renames are written ahead in windows and fsynced once per
+    window, so a crash never leaves a rename unrecorded while costing one
+    fsync per few thousand renames. Undo, redo and recovery replay the file.
+    """
+
+    def __init__(self, path: Optional[str] = None, sync: bool = True) -> None:
+        self.path = path or default_journal_path()
+        self.sync = sync
+        self._file: Optional[IO[str]] = None
+        self._lock = threading.Lock()
+        self._begin_lock = threading.Lock()
+        self._open: Set[str] = set()  # Batches this process is still writing, e.g. concurrent jobs
+
+    def _write(self, lines: Iterable[str], durable: bool = False) -> None:
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8", errors="surrogateescape", newline="\n")
+            self._file.write("".join(lines))
+            if durable:
+                self._file.flush()
+                if self.sync:
+                    os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # --- Writing ---
+    def begin(self, description: str) -> str:
+        """Start a batch; undone renames can no longer be redone after this.
+
+        Several batches may be open at once from one Journal (one per root of
+        a multi-root job); only batches left open by another process count
+        as interrupted.
+        """
+        with self._begin_lock:
+            lines: List[str] = []
+            for batch in self.batches():
+                if batch.batch_id in self._open:
+                    continue
+                if batch.interrupted:
+                    raise RenamerError("An interrupted batch must be recovered first")
+                if batch.applied == 0:
+                    lines.append(f"D\t{batch.batch_id}\n")
+                elif batch.applied < len(batch.ops):
+                    # Forget the undone renames of a partly undone batch, keeping the rest undoable
+                    applied = [i for i in range(len(batch.planned)) if i not in batch.failed]
+                    lines.extend(f"F\t{batch.batch_id}\t{applied[i]}\n"
+                                 for i in range(batch.position, len(applied)) if i not in batch.kept)
+                    if batch.kept:
+                        # What is left is applied throughout; kept indices are renumbered away
+                        lines.extend(f"R\t{batch.batch_id}\t{i}\n" for i in sorted(batch.kept))
+                        lines.append(f"T\t{batch.batch_id}\t{batch.applied}\n")
+
+            batch_id = f"{time.time_ns():x}"
+            while batch_id in self._open:
+                batch_id = f"{time.time_ns():x}"
+            lines.append(f"B\t{batch_id}\t{time.time():.3f}\t{_escape(description)}\n")
+            self._write(lines, durable=True)
+            self._open.add(batch_id)
+            return batch_id
+
+    def record_planned(self, batch_id: str, entries: Iterable[Tuple[str, str, Optional[int]]]) -> None:
+        """Write (src, dst, inode) renames ahead of executing them; paths are recorded absolute"""
+        self._write((_planned_line(batch_id, src, dst, inode) if os.path.isabs(src) and os.path.isabs(dst)
+                     else _planned_line(batch_id, os.path.abspath(src), os.path.abspath(dst), inode)
+                     for src, dst, inode in entries), durable=True)
+
+    def record_failed(self, batch_id: str, indices: Iterable[int]) -> None:
+        self._write(f"F\t{batch_id}\t{index}\n" for index in indices)
+
+    def end(self, batch_id: str) -> None:
+        self._write([f"E\t{batch_id}\n"], durable=True)
+        self._open.discard(batch_id)
+
+    def start_run(self, batch_id: str, direction: str) -> None:
+        self._write([f"S\t{batch_id}\t{direction}\n"], durable=True)
+
+    def end_run(self, batch_id: str, position: int, kept: Iterable[int] = (), released: Iterable[int] = ()) -> None:
+        """Finish a run: ops[:position] and the kept renames are applied, the released ones no longer"""
+        lines = [f"K\t{batch_id}\t{i}\n" for i in kept]
+        lines.extend(f"R\t{batch_id}\t{i}\n" for i in released)
+        lines.append(f"T\t{batch_id}\t{position}\n")
+        self._write(lines, durable=True)
+
+    # --- Replay ---
+    def batches(self) -> List[Batch]:
+        """Replay the journal into the list of batches, oldest first"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        if not os.path.exists(self.path):
+            return []
+
+        batches: Dict[str, Batch] = {}
+        with open(self.path, encoding="utf-8", errors="surrogateescape", newline="\n") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # Torn final write
+                fields = line[:-1].split("\t")
+                kind = fields[0]
+                if kind == "B" and len(fields) == 4:
+                    batches[fields[1]] = Batch(fields[1], float(fields[2]), _unescape(fields[3]))
+                    continue
+                batch = batches.get(fields[1]) if len(fields) > 1 else None
+                if batch is None:
+                    continue
+                if kind == "P" and len(fields) in (4, 5):
+                    batch.planned.append((_unescape(fields[2]), _unescape(fields[3])))
+                elif kind == "F" and len(fields) == 3:
+                    batch.failed.add(int(fields[2]))
+                    batch._ops = None
+                elif kind == "E":
+                    batch.complete = True
+                    batch.position = len(batch.ops)
+                elif kind == "S" and len(fields) == 3:
+                    batch.run = fields[2]
+                elif kind == "T" and len(fields) == 3:
+                    batch.run = None
+                    batch.position = int(fields[2])
+                    if batch.kept:
+                        batch.kept = {i for i in batch.kept if i >= batch.position}
+                elif kind == "K" and len(fields) == 3:
+                    batch.kept.add(int(fields[2]))
+                elif kind == "R" and len(fields) == 3:
+                    batch.kept.discard(int(fields[2]))
+                elif kind == "D":
+                    batch.dropped = True
+        return [b for b in batches.values() if not b.dropped]
+
+    def compact(self, keep: int = 50) -> None:
+        """Rewrite the journal with only the latest `keep` batches, in their current state"""
+        batches = self.batches()
+        if any(b.interrupted for b in batches):
+            raise RenamerError("An interrupted batch must be recovered first")
+        kept_batches = [b for b in (batches[-keep:] if keep > 0 else []) if b.applied > 0]
+        inodes = self.inodes(b.batch_id for b in kept_batches)
+        lines: List[str] = []
+        for batch in kept_batches:
+            lines.append(f"B\t{batch.batch_id}\t{batch.created:.3f}\t{_escape(batch.description)}\n")
+            batch_inodes = inodes.get(batch.batch_id, {})
+            lines.extend(_planned_line(batch.batch_id, src, dst, batch_inodes.get(i))
+                         for i, (src, dst) in zip(_planned_indices(batch), batch.ops))
+            lines.append(f"E\t{batch.batch_id}\n")
+            lines.extend(f"K\t{batch.batch_id}\t{i}\n" for i in sorted(batch.kept))
+            if batch.position < len(batch.ops):
+                lines.append(f"T\t{batch.batch_id}\t{batch.position}\n")
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8", errors="surrogateescape", newline="\n") as f:
+            f.writelines(lines)
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+        self.close()
+        os.replace(tmp_path, self.path)
+
+    def inodes(self, batch_ids: Iterable[str]) -> Dict[str, Dict[int, int]]:
+        """Inodes written ahead with the planned renames of the given batches, by planned index.
+
+        Only recovery needs them, so batches() leaves them out and this reads
+        the journal again.
+        """
+        wanted = set(batch_ids)
+        found: Dict[str, Dict[int, int]] = {batch_id: {} for batch_id in wanted}
+        counts = dict.fromkeys(wanted, 0)
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        if not wanted or not os.path.exists(self.path):
+            return found
+        with open(self.path, encoding="utf-8", errors="surrogateescape", newline="\n") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                if not line.startswith("P\t"):
+                    if line.startswith("B\t"):
+                        # A batch id seen again after compaction starts over
+                        batch_id = line.split("\t", 2)[1]
+                        if batch_id in wanted:
+                            found[batch_id] = {}
+                            counts[batch_id] = 0
+                    continue
+                fields = line[:-1].split("\t")
+                batch_id = fields[1]
+                if batch_id not in wanted or len(fields) not in (4, 5):
+                    continue
+                if len(fields) == 5:
+                    found[batch_id][counts[batch_id]] = int(fields[4])
+                counts[batch_id] += 1
+        return found
+
+    def undoable(self) -> Optional[Batch]:
+        """Most recent batch that still has applied renames, including ones an earlier undo failed on"""
+        for batch in reversed(self.batches()):
+            if batch.complete and batch.run is None and batch.applied > 0:
+                return batch
+        return None
+
+    def redoable(self) -> Optional[Batch]:
+        """Oldest batch that was (partly) undone"""
+        for batch in self.batches():
+            if batch.complete and batch.run is None and batch.applied < len(batch.ops):
+                return batch
+        return None
+
+    def undoable_count(self) -> int:
+        return sum(1 for b in self.batches() if b.complete and b.run is None and b.applied > 0)
+
+    def interrupted(self) -> Optional[Batch]:
+        """A batch whose rename, undo or redo never finished (e.g. the app died)"""
+        for batch in reversed(self.batches()):
+            if batch.interrupted:
+                return batch
+        return None
+
+
+def _planned_indices(batch: Batch) -> Iterable[int]:
+    """Planned index of each of batch.ops"""
+    if not batch.failed:
+        return range(len(batch.planned))
+    return [i for i in range(len(batch.planned)) if i not in batch.failed]
+
+
+def _applied(batch: Batch) -> Set[int]:
+    return set(range(batch.position)) | batch.kept
+
+
+def _settle(journal: Journal, batch: Batch, applied: Set[int]) -> None:
+    """Finish the batch's run with exactly the renames at applied in place"""
+    position = 0
+    while position in applied:
+        position += 1
+    kept = {i for i in applied if i >= position}
+    journal.end_run(batch.batch_id, position, sorted(kept - batch.kept), sorted(i for i in batch.kept - kept
+                                                                                if i >= position))
+    batch.run = None
+    batch.position = position
+    batch.kept = kept
+
+
+def _undo_order(batch: Batch) -> List[int]:
+    """Applied renames, newest first; reverse order restores parent folders before their contents"""
+    return sorted(batch.kept, reverse=True) + list(range(batch.position - 1, -1, -1))
+
+
+def _redo_order(batch: Batch) -> List[int]:
+    return [i for i in range(batch.position, len(batch.ops)) if i not in batch.kept]
+
+
+def _run_moves(journal: Journal, batch: Batch, direction: str, indices: List[int],
+               progress: Optional[ProgressCallback], cancel: Optional[threading.Event],
+               metrics: Optional[Metrics] = None, backend: Optional["AsyncBackend"] = None,
+               workers: int = DEFAULT_UNDO_WORKERS) -> RenameResult:
+    """Undo or redo the batch's renames at indices, in that order, and record where the batch stands.
+
+    Renames that fail stay where they are: a failed undo leaves its rename
+    kept (still applied past the position), a failed redo leaves a gap
+    that the position cannot pass. Either way the next undo or redo of the
+    batch retries exactly those renames.
+    """
+    ops = batch.ops
+    if direction == "undo":
+        moves = [(ops[i][1], ops[i][0]) for i in indices]
+    else:
+        moves = [ops[i] for i in indices]
+    journal.start_run(batch.batch_id, direction)
+    result = RenameEngine.apply_moves(moves, progress, cancel, metrics, direction, backend, workers, verify=True)
+
+    attempted = len(moves) - len(result.batch) if result.cancelled else len(moves)
+    failed = {indices[j] for j in result.failed}
+    changed = {i for i in indices[:attempted] if i not in failed}
+    applied = _applied(batch)
+    if direction == "undo":
+        applied -= changed
+    else:
+        applied |= changed
+    _settle(journal, batch, applied)
+    return result
+
+
+def undo_last(journal: Journal, progress: Optional[ProgressCallback] = None,
+              cancel: Optional[threading.Event] = None, metrics: Optional[Metrics] = None,
+              backend: Optional["AsyncBackend"] = None, workers: int = DEFAULT_UNDO_WORKERS) -> RenameResult:
+    """Revert the most recent batch still applied, newest rename first.
+
+    Renames a previous undo failed on are retried first, so running undo
+    again after fixing the cause finishes a partly failed rollback.
+    """
+    batch = journal.undoable()
+    if batch is None:
+        raise RenamerError("No actions to undo")
+    return _run_moves(journal, batch, "undo", _undo_order(batch), progress, cancel, metrics, backend, workers)
+
+
+def redo_last(journal: Journal, progress: Optional[ProgressCallback] = None,
+              cancel: Optional[threading.Event] = None, metrics: Optional[Metrics] = None,
+              backend: Optional["AsyncBackend"] = None, workers: int = DEFAULT_UNDO_WORKERS) -> RenameResult:
+    """Re-apply the oldest undone batch in its original order"""
+    batch = journal.redoable()
+    if batch is None:
+        raise RenamerError("No actions to redo")
+    return _run_moves(journal, batch, "redo", _redo_order(batch), progress, cancel, metrics, backend, workers)
+
+
+def _resolve(moved: Dict[str, str], path: str) -> str:
+    """Where path is now, given the folders moved by renames found in place"""
+    head, tail = path, ""
+    while head:
+        if head in moved:
+            return moved[head] + tail
+        head, sep, name = head.rpartition(os.sep)
+        if not sep:
+            break
+        tail = sep + name + tail
+    return path
+
+
+def _missing_planned(batch: Batch, inodes: Dict[int, int]) -> Dict[int, Tuple[str, str]]:
+    """The planned renames of an interrupted batch that are not on disk, with their paths as they are now.
+
+    Renames run deepest first, so an entry only moves after everything
+    beneath it. Reading the plan backwards, each rename is checked in its
+    folder as that folder is now, found through the later folder renames
+    that are in place. A rename written ahead with the inode of its entry
+    is in place if that entry is at its target, or moved on from there by
+    a later rename in place; chains and cycles of names through temporary
+    ones come out right. Without an inode, the rename is judged by which
+    of its two names its folder holds, reverting the renames found in
+    place in a model of the listing before earlier ones are checked.
+    """
+    listings: Dict[str, Set[str]] = {}  # Folder as planned -> names, as before the renames checked so far
+    moved: Dict[str, str] = {}  # Path as planned -> where renames found in place put it
+    moved_on: Dict[str, int] = {}  # Source of a rename found in place -> inode of the entry it moved
+    missing: Dict[int, Tuple[str, str]] = {}
+    planned = batch.planned
+    for i in range(len(planned) - 1, -1, -1):
+        if i in batch.failed:
+            continue
+        src, dst = planned[i]
+        folder, _, name = src.rpartition(os.sep)
+        new_name = dst.rpartition(os.sep)[2]
+        names = listings.get(folder)
+        if names is None:
+            try:
+                names = set(os.listdir(_resolve(moved, folder)))
+            except OSError:
+                names = set()
+            listings[folder] = names
+        inode = inodes.get(i)
+        if new_name.casefold() == name.casefold():
+            # A case-only rename shows up under exactly one spelling
+            applied = new_name in names
+        elif inode is not None:
+            applied = moved_on.get(dst) == inode or current_inode(_resolve(moved, dst)) == inode
+        else:
+            applied = new_name in names and name not in names
+        if applied:
+            moved[src] = _resolve(moved, dst)
+            names.discard(new_name)
+            names.add(name)
+            if inode is not None:
+                moved_on[src] = inode
+        else:
+            now = _resolve(moved, folder)
+            missing[i] = (os.path.join(now, name), os.path.join(now, new_name))
+    return missing
+
+
+def _check_inodes(ops: List[Tuple[str, str]], inodes: Dict[int, int], applied: Set[int],
+                  touched: Iterable[int]) -> Set[int]:
+    """Correct the touched renames of an interrupted run by where their entries are.
+
+    Reading the batch backwards, a rename with a known inode whose target
+    folder exists is applied if its entry is at the target, or moved on
+    from there by a later applied rename. Others keep the answer from the
+    listings in applied.
+    """
+    touched = set(touched)
+    applied = set(applied)
+    moved_on: Dict[str, int] = {}
+    for j in range(len(ops) - 1, -1, -1):
+        src, dst = ops[j]
+        inode = inodes.get(j)
+        if inode is None:
+            continue
+        if j in touched and src.rpartition(os.sep)[2].casefold() != dst.rpartition(os.sep)[2].casefold() \
+                and os.path.isdir(dst.rpartition(os.sep)[0] or os.sep):
+            if moved_on.get(dst) == inode or current_inode(dst) == inode:
+                applied.add(j)
+            else:
+                applied.discard(j)
+        if j in applied:
+            moved_on[src] = inode
+    return applied
+
+
+def recover(journal: Journal, rollback: bool = False, progress: Optional[ProgressCallback] = None,
+            metrics: Optional[Metrics] = None, backend: Optional["AsyncBackend"] = None,
+            workers: int = DEFAULT_UNDO_WORKERS) -> Optional[RenameResult]:
+    """Finish (default) or roll back the batch or undo/redo run that was interrupted.
+
+    Which renames already happened is read back from the filesystem, by
+    the inodes written ahead with them where known, so the result is right
+    whichever of the planned renames made it to disk.
+    Returns None when there is nothing to recover.
+    """
+    batch = journal.interrupted()
+    if batch is None:
+        return None
+
+    if not batch.complete:
+        # Interrupted rename: anything planned but not on disk never happened
+        missing = _missing_planned(batch, journal.inodes([batch.batch_id])[batch.batch_id])
+        if rollback:
+            journal.record_failed(batch.batch_id, sorted(missing))
+            journal.end(batch.batch_id)
+            batch.failed.update(missing)
+            batch._ops = None
+            batch.position = len(batch.ops)
+            return _run_moves(journal, batch, "undo", _undo_order(batch), progress, None, metrics, backend, workers)
+
+        # In plan order, so entries still move before the folders above them
+        result = RenameResult(total=len(missing))
+        failed: List[int] = []
+        for done, i in enumerate(sorted(missing)):
+            src, dst = missing[i]
+            try:
+                rename_noreplace(src, dst)
+                result.renamed += 1
+            except (FileExistsError, FileNotFoundError):
+                failed.append(i)
+                result.errors.append(f"Cannot finish {src} -> {dst}")
+            except OSError as e:
+                failed.append(i)
+                result.errors.append(f"Error renaming {src}: {str(e)}")
+            if progress:
+                progress(done + 1, len(missing))
+        journal.record_failed(batch.batch_id, failed)
+        journal.end(batch.batch_id)
+        return result
+
+    # Interrupted undo/redo: moves run concurrently, so check every rename the run
+    # could have touched, in one listing per folder, then continue or reverse it.
+    # A rename whose folder is gone lies beneath a folder rename that is still
+    # applied, which it ran before and is undone after: it is applied as well
+    ops = batch.ops
+    direction = batch.run
+    before = _applied(batch)
+    touched = sorted(before) if direction == "undo" else [i for i in range(len(ops)) if i not in before]
+    in_place = RenameEngine.verify_moves([ops[i] for i in touched], missing=True)
+    applied = (before - set(touched)) | {i for i, done in zip(touched, in_place) if done}
+    planned_inodes = journal.inodes([batch.batch_id])[batch.batch_id]
+    if planned_inodes:
+        inodes = {j: planned_inodes[i] for j, i in enumerate(_planned_indices(batch)) if i in planned_inodes}
+        applied = _check_inodes(ops, inodes, applied, touched)
+    _settle(journal, batch, applied)
+
+    if direction == "undo" and not rollback:
+        return _run_moves(journal, batch, "undo", _undo_order(batch), progress, None, metrics, backend, workers)
+    if direction == "undo":
+        return _run_moves(journal, batch, "redo", sorted(before - applied), progress, None, metrics, backend, workers)
+    if not rollback:
+        return _run_moves(journal, batch, "redo", _redo_order(batch), progress, None, metrics, backend, workers)
+    return _run_moves(journal, batch, "undo", sorted(applied - before, reverse=True), progress, None, metrics,
+                      backend, workers)
@@ -0,0 +1,280 @@
+import bisect
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Upper bounds (seconds) of the latency buckets, as in Prometheus client defaults but finer at the low end
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# os functions counted as syscalls while count_os_calls() is active
+COUNTED_CALLS = ("stat", "lstat", "scandir", "listdir", "rename", "replace")
+
+PROFILE_MODES = ("off", "cpu", "memory")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Per-bucket (not cumulative) counts plus sum and count of observed latencies"""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation"""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank and n:
+                return bound
+        return 0.0
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    """Counters and latency histograms for one or more rename runs.
+
+    Stage times are exclusive: time spent pulling from an inner
+    instrumented stage (the scan feeding the filter, say) is charged to
+    that stage only. Safe to update from executor threads.
+    """
+
+    def __init__(self) -> None:
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def _stack(self) -> List[float]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _charge(self, stage: str, stack: List[float], start: float) -> None:
+        elapsed = time.perf_counter() - start
+        child = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        self.inc("stage_seconds", elapsed - child, stage=stage)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """Time a block as one stage, minus time spent in stages nested inside it"""
+        stack = self._stack()
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._charge(stage, stack, start)
+
+    def wrap(self, stage: str, items: Iterable[T]) -> Iterator[T]:
+        """Charge the time spent producing each item of a pipeline stage, and count the items"""
+        it = iter(items)
+        count = 0
+        try:
+            while True:
+                stack = self._stack()
+                stack.append(0.0)
+                start = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    self._charge(stage, stack, start)
+                count += 1
+                yield item
+        finally:
+            self.inc("items", count, stage=stage)
+
+    def timed(self, operation: str, func: Callable[[T], Optional[str]]) -> Callable[[T], Optional[str]]:
+        """Wrap a per-item operation returning an error or None with a latency histogram"""
+        def call(task: T) -> Optional[str]:
+            start = time.perf_counter()
+            error = func(task)
+            self.observe("operation_seconds", time.perf_counter() - start, operation=operation)
+            if error:
+                self.inc("errors", operation=operation)
+            return error
+        return call
+
+    @contextmanager
+    def count_os_calls(self) -> Iterator[None]:
+        """Count the os calls in COUNTED_CALLS made by any thread while the block runs.
+
+        The functions are swapped on the os module for the duration, so use
+        this for diagnostic runs only. Renames done with renameat2 on Linux
+        do not go through os and are counted by the rename histogram instead.
+        """
+        originals = {name: getattr(os, name) for name in COUNTED_CALLS}
+
+        def wrap(name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+            def counted(*args: Any, **kwargs: Any) -> Any:
+                self.inc("syscalls", call=name)
+                return func(*args, **kwargs)
+            return counted
+
+        for name, func in originals.items():
+            setattr(os, name, wrap(name, func))
+        try:
+            yield
+        finally:
+            for name, func in originals.items():
+                setattr(os, name, func)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value}
+                           for (name, labels), value in sorted(self.gauges.items())],
+                "histograms": [{"name": name, "labels": dict(labels), "count": h.count, "sum": h.total,
+                                "p50": h.quantile(0.5), "p99": h.quantile(0.99),
+                                "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], h.counts))}
+                               for (name, labels), h in sorted(self.histograms.items())],
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=1)
+
+    def to_prometheus(self, prefix: str = "renamer_") -> str:
+        """Render in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f"{prefix}{name}_total"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                metric = prefix + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} gauge")
+                    typed.add(metric)
+                lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                metric = prefix + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                    lines.append(f"{metric}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {h.total:g}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, path: str) -> None:
+        """Write JSON, or the Prometheus text format for .prom/.txt files"""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def summary(self) -> List[str]:
+        """Human readable per-stage report"""
+        with self._lock:
+            stages = sorted((labels[0][1], value) for (name, labels), value in self.counters.items()
+                            if name == "stage_seconds")
+            items = {labels[0][1]: value for (name, labels), value in self.counters.items() if name == "items"}
+            lines = [f"{stage:10s} {seconds:8.3f}s" + (f"  {int(items[stage]):9d} items" if stage in items else "")
+                     for stage, seconds in stages]
+            for (name, labels), h in sorted(self.histograms.items()):
+                label = ",".join(value for _, value in labels)
+                lines.append(f"{label or name:10s} {h.count:9d} calls  p50 <= {h.quantile(0.5) * 1e3:.3f}ms  "
+                             f"p99 <= {h.quantile(0.99) * 1e3:.3f}ms")
+            for (name, labels), value in sorted(self.counters.items()):
+                if name in ("syscalls", "errors"):
+                    lines.append(f"{name}[{','.join(v for _, v in labels)}] {int(value)}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                lines.append(f"{name} {value:g}")
+        return lines
+
+
+@contextmanager
+def profiled(mode: str, path: str, metrics: Optional[Metrics] = None) -> Iterator[None]:
+    """Capture a cProfile ("cpu") or tracemalloc ("memory") profile of the block into path.
+
+    cProfile only sees the calling thread; run the block on the thread that
+    does the work. The memory report lists the top allocation sites and,
+    with metrics, records the peak as the memory_peak_bytes gauge.
+    """
+    if mode == "cpu":
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(path)
+    elif mode == "memory":
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(10)
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if started:
+                tracemalloc.stop()
+            if metrics is not None:
+                metrics.set_gauge("memory_peak_bytes", peak)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"peak traced memory: {peak / 1e6:.1f} MB\n")
+                for stat in snapshot.statistics("lineno")[:25]:
+                    f.write(f"{stat}\n")
+    else:
+        yield
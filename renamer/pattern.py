@@ -0,0 +1,173 @@
+import itertools
+import random
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+# Tokens whose value is the same for every item of a batch
+STATIC_TOKENS = {
+    "date": "%Y-%m-%d",
+    "time": "%H-%M-%S",
+    "datetime": "%Y-%m-%d_%H-%M-%S",
+}
+
+# Tokens computed per item, in the order the legacy implementation evaluated them
+DYNAMIC_TOKENS = ("list1", "prefix", "version", "counter", "random", "orig_name", "orig_ext")
+
+# Dynamic tokens drawing from the random generator
+RANDOM_TOKENS = ("list1", "prefix", "random")
+
+# Tokens read from the file itself rather than its name, by .content
+CONTENT_TOKENS = ("sha1", "size", "mtime", "exif_date")
+
+# Content tokens without a value for folders
+FILE_ONLY_TOKENS = ("sha1", "size")
+
+# Tokens taking a length, as in {sha1:8}
+LENGTH_TOKENS = ("sha1",)
+
+TOKEN_RE = re.compile(r"\{(" + "|".join(list(STATIC_TOKENS) + list(DYNAMIC_TOKENS) + list(CONTENT_TOKENS))
+                      + r")(?::(\d+))?\}")
+
+# Values {random} draws from, inclusive
+RANDOM_LOW, RANDOM_HIGH = 1, 1000
+
+# Largest random space tabulated by combinations(); larger ones draw token by token
+MAX_COMBINATIONS = 4096
+
+LIST1_FALLBACK = "Item"
+PREFIX_FALLBACK = "file"
+
+
+class CompiledPattern:
+    """A rename pattern parsed once into literal and token segments.
+
+    Static tokens ({date}, {time}, {datetime}) are frozen at compile time and
+    merged into the surrounding literals, so rendering a name only evaluates
+    the dynamic tokens actually present and joins the parts once. Content
+    tokens ({sha1:8}, {size}, ...) are looked up in values computed by the
+    caller; content lists the ones the pattern uses.
+    """
+
+    __slots__ = ("pattern", "now", "tokens", "content", "random", "_plain", "_parts", "_slots", "_lengths")
+
+    def __init__(self, pattern: str, now: Optional[datetime] = None) -> None:
+        self.pattern = pattern
+        self.now = now or datetime.now()
+
+        parts: List[str] = []
+        slots: List[Tuple[int, str]] = []
+        literal = ""
+        pos = 0
+        lengths: Dict[str, Tuple[str, Optional[int]]] = {}
+        for match in TOKEN_RE.finditer(pattern):
+            token, length = match.group(1), match.group(2)
+            if length is not None and token not in LENGTH_TOKENS:
+                continue  # Left in place as literal text, like any unknown token
+            literal += pattern[pos:match.start()]
+            if token in CONTENT_TOKENS:
+                if literal:
+                    parts.append(literal)
+                    literal = ""
+                key = match.group(0)[1:-1]
+                lengths[key] = (token, int(length) if length is not None else None)
+                slots.append((len(parts), key))
+                parts.append("")
+            elif token in STATIC_TOKENS:
+                literal += self.now.strftime(STATIC_TOKENS[token])
+            else:
+                if literal:
+                    parts.append(literal)
+                    literal = ""
+                slots.append((len(parts), token))
+                parts.append("")
+            pos = match.end()
+        literal += pattern[pos:]
+        if literal or not parts:
+            parts.append(literal)
+
+        self._parts = parts
+        self._slots = tuple(slots)
+        # Unique dynamic tokens, each evaluated once per item like str.replace did
+        self.tokens = tuple(t for t in DYNAMIC_TOKENS if any(t == s for _, s in slots))
+        self.random = any(t in RANDOM_TOKENS for t in self.tokens)
+        self._plain = tuple(t for t in self.tokens if t not in RANDOM_TOKENS)
+        self.content = tuple(t for t in CONTENT_TOKENS if any(t == name for name, _ in lengths.values()))
+        self._lengths = lengths
+
+    def values(self, name: str, ext: str, counter: int, version: float,
+               list1: Sequence[str], list2: Sequence[str], rng: Any = random,
+               content: Optional[Mapping[str, str]] = None,
+               drawn: Optional[Mapping[str, str]] = None) -> Dict[str, str]:
+        """Evaluate the dynamic tokens used by the pattern for one item.
+
+        drawn, an entry of combinations(), gives the random tokens instead of rng.
+        """
+        values: Dict[str, str] = dict(drawn) if drawn is not None else {}
+        for key, (token, length) in self._lengths.items():
+            value = content[token] if content else ""
+            values[key] = value[:length] if length is not None else value
+        for token in self._plain if drawn is not None else self.tokens:
+            if token == "list1":
+                values[token] = rng.choice(list1) if list1 else LIST1_FALLBACK
+            elif token == "prefix":
+                values[token] = rng.choice(list2) if list2 else PREFIX_FALLBACK
+            elif token == "version":
+                values[token] = str(version)
+            elif token == "counter":
+                values[token] = f"{counter:03d}"
+            elif token == "random":
+                values[token] = str(rng.randint(RANDOM_LOW, RANDOM_HIGH))
+            elif token == "orig_name":
+                values[token] = name
+            elif token == "orig_ext":
+                values[token] = ext
+        return values
+
+    def random_space(self, list1: Sequence[str], list2: Sequence[str]) -> int:
+        """How many different combinations the random tokens of the pattern can take"""
+        sizes = {"list1": len(list1) or 1, "prefix": len(list2) or 1, "random": RANDOM_HIGH - RANDOM_LOW + 1}
+        space = 1
+        for token in self.tokens:
+            space *= sizes.get(token, 1)
+        return space
+
+    def combinations(self, list1: Sequence[str], list2: Sequence[str]) -> Optional[List[Dict[str, str]]]:
+        """Random token values for every combination, or None past MAX_COMBINATIONS.
+
+        Combination (word * len(result)) >> 64 holds the values that
+        sequential draws from the 64-bit word would give, the first token
+        being the most significant digit.
+        """
+        if self.random_space(list1, list2) > MAX_COMBINATIONS:
+            return None
+        choices = {"list1": list1 or [LIST1_FALLBACK], "prefix": list2 or [PREFIX_FALLBACK],
+                   "random": [str(value) for value in range(RANDOM_LOW, RANDOM_HIGH + 1)]}
+        tokens = [t for t in self.tokens if t in RANDOM_TOKENS]
+        return [dict(zip(tokens, combination)) for combination in itertools.product(*(choices[t] for t in tokens))]
+
+    def render(self, values: Dict[str, str]) -> str:
+        """Join the literal segments with the given token values"""
+        parts = self._parts[:]
+        for index, token in self._slots:
+            parts[index] = values[token]
+        return "".join(parts)
+
+
+def split_ext(name: str) -> Tuple[str, str]:
+    """os.path.splitext for a bare file name, without the separator handling"""
+    dot = name.rfind(".")
+    if dot <= 0:
+        return name, ""
+    # Leading dots do not start an extension (".bashrc", "..config")
+    lead = 0
+    while lead < dot and name[lead] == ".":
+        lead += 1
+    if lead >= dot:
+        return name, ""
+    return name[:dot], name[dot:]
+
+
+def compile_pattern(pattern: str, now: Optional[datetime] = None) -> CompiledPattern:
+    """Parse a rename pattern into a reusable template"""
+    return CompiledPattern(pattern, now)
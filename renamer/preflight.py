@@ -0,0 +1,257 @@
+import os
+import sys
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from .pattern import split_ext
+from .rng import CounterRandom, Digits, Sampler
+
+if TYPE_CHECKING:
+    from .engine import RenameOp
+
+COLLISION_MODES = ("skip", "suffix", "unique")
+
+Fold = Callable[[str], str]
+
+
+def _same(name: str) -> str:
+    return name
+
+
+@dataclass
+class Collision:
+    """A planned rename whose target name is already taken"""
+    op: "RenameOp"
+    kind: str  # "exists" (on disk) or "duplicate" (another rename in the batch)
+    other: Optional["RenameOp"] = None
+
+    @property
+    def message(self) -> str:
+        name = self.op.new_name
+        if self.other is None:
+            return f"Skipping {self.op.rel_path}: {name} already exists"
+        return f"Skipping {self.op.rel_path}: {name} is also the new name of {self.other.rel_path}"
+
+
+def is_case_insensitive(directory: str) -> bool:
+    """Whether names in directory compare case-insensitively, probed with one stat"""
+    if os.name == "nt":
+        return True
+    path = os.path.abspath(directory)
+    swapped = path.swapcase()
+    if swapped == path:
+        # No letters to probe with; macOS volumes are case-insensitive by default
+        return sys.platform == "darwin"
+    try:
+        return os.path.samefile(path, swapped)
+    except OSError:
+        return False
+
+
+def _free_name(name: str, is_file: bool, taken: Callable[[str], bool],
+               suffixes: Optional[Dict[str, int]] = None) -> str:
+    """First of name_2, name_3, ... (before the extension) that is not taken.
+
+    suffixes remembers where the search for each name stopped, so giving
+    many items the same name costs O(1) per item instead of O(n).
+    """
+    stem, ext = split_ext(name) if is_file else (name, "")
+    n = suffixes.get(name, 2) if suffixes is not None else 2
+    while True:
+        candidate = f"{stem}_{n}{ext}"
+        if not taken(candidate):
+            if suffixes is not None:
+                suffixes[name] = n + 1
+            return candidate
+        n += 1
+
+
+class NameAllocator:
+    """Hands out new names that are unique within one folder, for on_collision="unique".
+
+    The random tokens of a pattern span space combinations; each item gets a
+    combination drawn without replacement, so items only share random parts
+    once all combinations are used up. A drawn name that is still taken (it
+    exists on disk, or the rest of the pattern makes two combinations look
+    alike) is drawn again, which a combination never repeats; after that
+    the name gets a _2, _3, ... suffix. Every name on disk counts as taken,
+    except the item's own, so the names are unique however the batch runs.
+    """
+
+    def __init__(self, existing: Iterable[str], space: int, case_insensitive: bool = False) -> None:
+        fold: Fold = str.casefold if case_insensitive else _same
+        self.fold = fold
+        self.taken = {fold(name) for name in existing}
+        self.sampler = Sampler(space) if space > 1 else None
+        self._suffixes: Dict[str, int] = {}
+
+    def allocate(self, current: str, is_file: bool, render: Callable[[Any], str], rng: CounterRandom) -> str:
+        """A free name for the item now called current; render(rng) names it from one set of draws"""
+        fold = self.fold
+        own = fold(current)
+        if self.sampler is not None:
+            while True:
+                value = self.sampler.draw(rng)
+                if value is None:
+                    break
+                name = render(Digits(value))
+                key = fold(name)
+                if key not in self.taken or key == own:
+                    self.taken.add(key)
+                    return name
+        name = render(rng)
+        key = fold(name)
+        if key in self.taken and key != own:
+            name = _free_name(name, is_file, lambda n: fold(n) in self.taken and fold(n) != own, self._suffixes)
+            key = fold(name)
+        self.taken.add(key)
+        return name
+
+
+def _resolve_folder(ops: List["RenameOp"], existing: Set[str], fold: Fold, on_collision: str,
+                    collisions: List[Collision]) -> Dict[int, "RenameOp"]:
+    """Pick a free target for each rename of one folder; returns position -> final op"""
+    sources = {fold(op.name): i for i, op in enumerate(ops)}
+    claimed: Dict[str, int] = {}
+    suffixes: Dict[str, int] = {}
+    skipped: Set[int] = set()
+    final: Dict[int, "RenameOp"] = {}
+
+    def taken(key: str) -> bool:
+        return key in existing or key in claimed
+
+    # Items keeping their name (or changing only its case) hold it before anyone else competes for it
+    work: Deque[int] = deque()
+    for i, op in enumerate(ops):
+        key = fold(op.new_name)
+        if sources.get(key) == i:
+            claimed[key] = i
+            final[i] = op
+        else:
+            work.append(i)
+    while work:
+        i = work.popleft()
+        op = ops[i]
+        key = fold(op.new_name)
+
+        other = claimed.get(key)
+        mover = sources.get(key)
+        if other is not None:
+            # A name kept by its own item counts as simply existing
+            clash: Optional[Collision] = Collision(op, "exists") if mover == other \
+                else Collision(op, "duplicate", ops[other])
+        elif key in existing and (mover is None or mover in skipped):
+            # The name is on disk and nothing in the batch moves it away
+            clash = Collision(op, "exists")
+        else:
+            clash = None
+
+        if clash is None:
+            claimed[key] = i
+            final[i] = op
+        elif on_collision != "skip":
+            name = _free_name(op.new_name, op.is_file, lambda name: taken(fold(name)), suffixes)
+            claimed[fold(name)] = i
+            final[i] = op.replace(new_name=name)
+        else:
+            collisions.append(clash)
+            skipped.add(i)
+            # The source stays put, so a rename that counted on it moving away has to pick again
+            source_key = fold(op.name)
+            waiter = claimed.get(source_key)
+            if waiter is not None and waiter != i:
+                del claimed[source_key]
+                del final[waiter]
+                work.append(waiter)
+    return final
+
+
+def resolve_collisions(ops: Iterable["RenameOp"], on_collision: str = "skip", case_insensitive: bool = False,
+                       listdir: Callable[[str], List[str]] = os.listdir
+                       ) -> Tuple[List["RenameOp"], List[Collision]]:
+    """Check every target against the folder contents and the rest of the batch.
+
+    Each folder touched by the plan is listed once into a hash set, so the
+    check costs one listing per folder instead of a stat per rename. A name
+    that is on disk but is itself renamed away by the batch is free, which
+    allows chains and swaps. With on_collision="suffix" (or "unique", whose
+    names were allocated free already), clashing targets get _2, _3, ...
+    before the extension; with "skip" they are dropped and reported. Returns the surviving ops, in plan order, and the collisions.
+    """
+    if on_collision not in COLLISION_MODES:
+        raise ValueError(f"on_collision must be one of {COLLISION_MODES}")
+    fold: Fold = str.casefold if case_insensitive else _same
+    ops = list(ops)
+    folders: Dict[str, List[int]] = {}
+    for i, op in enumerate(ops):
+        folders.setdefault(op.parent, []).append(i)
+
+    collisions: List[Collision] = []
+    final: Dict[int, "RenameOp"] = {}
+    for parent, positions in folders.items():
+        try:
+            existing = {fold(name) for name in listdir(parent)}
+        except OSError:
+            # Leave the error to the rename itself
+            existing = set()
+        group = [ops[i] for i in positions]
+        for j, op in _resolve_folder(group, existing, fold, on_collision, collisions).items():
+            final[positions[j]] = op
+    return [final[i] for i in sorted(final)], collisions
+
+
+def order_renames(ops: Iterable["RenameOp"], case_insensitive: bool = False) -> List["RenameOp"]:
+    """Order renames so no target is still occupied by a source that moves later.
+
+    Within a folder, a rename whose target is another rename's source waits
+    for that one. The waits form chains, which run from their free end, and
+    cycles (a -> b, b -> a), which are broken by first moving one source to
+    a temporary name. The temporary hop is marked so it is not counted as an
+    extra rename. Expects ops whose targets were resolved to be unique.
+    """
+    fold: Fold = str.casefold if case_insensitive else _same
+    folders: Dict[str, List["RenameOp"]] = {}
+    for op in ops:
+        folders.setdefault(op.parent, []).append(op)
+
+    ordered: List["RenameOp"] = []
+    for group in folders.values():
+        sources = {fold(op.name): i for i, op in enumerate(group)}
+        # waiter[k]: the rename whose target is the source name k of another rename
+        waiter: Dict[str, int] = {}
+        blocked: Set[int] = set()
+        for i, op in enumerate(group):
+            key = fold(op.new_name)
+            j = sources.get(key)
+            if j is not None and j != i:
+                waiter[key] = i
+                blocked.add(i)
+
+        done: Set[int] = set()
+
+        def follow(i: int, stop: int = -1) -> None:
+            # Run the renames that were waiting for the source of i to move away
+            nxt = waiter.get(fold(group[i].name))
+            while nxt is not None and nxt != stop and nxt not in done:
+                done.add(nxt)
+                ordered.append(group[nxt])
+                nxt = waiter.get(fold(group[nxt].name))
+
+        for i, op in enumerate(group):
+            if i not in blocked and i not in done:
+                done.add(i)
+                ordered.append(op)
+                follow(i)
+
+        for i, op in enumerate(group):
+            if i in done:
+                continue
+            # Everything left is on a cycle: park this source, run the rest, then land it
+            done.add(i)
+            temp = f".{op.name}.{uuid.uuid4().hex[:8]}.renaming"
+            ordered.append(op.replace(new_name=temp, temporary=True))
+            follow(i, stop=i)
+            ordered.append(op.replace(name=temp))
+    return ordered
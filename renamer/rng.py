@@ -0,0 +1,212 @@
+import random
+import secrets
+import sys
+from array import array
+from typing import Dict, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+# Independent streams per item, so adding {random} to a pattern does not change random versions
+STREAM_TOKENS = 0
+STREAM_VERSION = 1
+# Random walks and item draws of the sampling estimator
+STREAM_SAMPLE = 2
+# Streams per item: (index, stream) gets counter block index * STREAMS + stream
+STREAMS = 3
+
+
+def mix64(z: int) -> int:
+    """SplitMix64 finalizer: a bijective scramble of a 64-bit integer"""
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB & MASK64
+    return z ^ (z >> 31)
+
+
+def new_seed() -> int:
+    """A fresh seed for a batch that was not given one"""
+    return secrets.randbits(63)
+
+
+# Bits of the generator counter left for the draws of one item
+DRAW_BITS = 24
+
+# Counter step from one (item, stream) to the next
+STREAM_GAMMA = (GOLDEN_GAMMA << DRAW_BITS) & MASK64
+
+# Fresh bits kept in reserve: a draw from n choices takes a new word once fewer
+# than log2(n) + 32 bits are left, so the bias stays below n / 2**32
+RESERVE_BITS = 32
+
+# Items per block of first words: one Mersenne Twister seeding and one
+# getrandbits() call per block instead of a SplitMix64 mix per item
+BLOCK_SIZE = 256
+
+
+def _block_random(seed: int, stream: int, block: int) -> random.Random:
+    # The stream takes the low bits, so blocks of different streams never share a seed
+    return random.Random(((seed & MASK64) << 66) | ((block & MASK64) << 2) | stream)
+
+
+def block_words(seed: int, stream: int, block: int) -> "array[int]":
+    """The first words of items block * BLOCK_SIZE onwards in one stream"""
+    bits = _block_random(seed, stream, block).getrandbits(64 * BLOCK_SIZE)
+    words = array("Q")
+    words.frombytes(bits.to_bytes(8 * BLOCK_SIZE, "little"))
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words
+
+
+class CounterRandom:
+    """Random draws for one item, computed from (seed, item index, stream) alone.
+
+    Nothing is carried over from item to item, so item N gets the same
+    values whether the batch is named serially, sharded across workers or
+    regenerated later from the seed. Implements the subset of the random
+    module's interface the pattern tokens use.
+
+    The first word comes from the item's block of the stream (see
+    block_words(); StreamBlocks hands it over when items are named in order),
+    the rest are SplitMix64 outputs at counter (index, stream, word number),
+    so the common one- or two-token pattern never mixes a word. A draw from n
+    choices takes the integer part of word * n / 2**64 and keeps the
+    fraction for the next draw, so one word serves several small draws.
+    """
+
+    __slots__ = ("_counter", "_word", "_left")
+
+    def __init__(self, seed: int, index: int, stream: int = STREAM_TOKENS, word: Optional[int] = None) -> None:
+        self._counter = (seed + (index * STREAMS + stream) * STREAM_GAMMA + GOLDEN_GAMMA) & MASK64
+        if word is None:
+            # Only this item's word of the block: getrandbits() fills from the low bits up
+            block, offset = divmod(index, BLOCK_SIZE)
+            word = _block_random(seed, stream, block).getrandbits(64 * (offset + 1)) >> (64 * offset)
+        self._word = word
+        self._left = 1 << 64  # Range the rest of _word still covers
+
+    def next64(self) -> int:
+        z = self._counter = (self._counter + GOLDEN_GAMMA) & MASK64
+        z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+        z = (z ^ (z >> 27)) * 0x94D049BB133111EB & MASK64
+        return z ^ (z >> 31)
+
+    def below(self, n: int) -> int:
+        """Integer in [0, n) by multiply-and-shift; the bias is at most n / 2**32"""
+        if self._left >> RESERVE_BITS < n:
+            product = self.next64() * n
+            self._left = (1 << 64) // n
+        else:
+            product = self._word * n
+            self._left //= n
+        self._word = product & MASK64
+        return product >> 64
+
+    def random(self) -> float:
+        if self._left == 1 << 64:
+            # First word still whole: spend it rather than mixing another
+            self._left = 0
+            return (self._word >> 11) * (1.0 / (1 << 53))
+        return (self.next64() >> 11) * (1.0 / (1 << 53))
+
+    def randint(self, a: int, b: int) -> int:
+        return a + self.below(b - a + 1)
+
+    def uniform(self, a: float, b: float) -> float:
+        return a + (b - a) * self.random()
+
+    def choice(self, seq: Sequence[T]) -> T:
+        n = len(seq)
+        if not n:
+            raise IndexError("Cannot choose from an empty sequence")
+        # below() with next64() inlined: choice is the draw every {list1} and {prefix} makes
+        if self._left >> RESERVE_BITS < n:
+            z = self._counter = (self._counter + GOLDEN_GAMMA) & MASK64
+            z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+            z = (z ^ (z >> 27)) * 0x94D049BB133111EB & MASK64
+            product = (z ^ (z >> 31)) * n
+            self._left = (1 << 64) // n
+        else:
+            product = self._word * n
+            self._left //= n
+        self._word = product & MASK64
+        return seq[product >> 64]
+
+
+class StreamBlocks:
+    """Generators for the items of one stream, with first words drawn a block at a time
+
+    get(index) gives the same draws as CounterRandom(seed, index, stream);
+    the last block is kept, so naming items in order draws each block once.
+    """
+
+    __slots__ = ("seed", "stream", "_block")
+
+    def __init__(self, seed: int, stream: int = STREAM_TOKENS) -> None:
+        self.seed = seed
+        self.stream = stream
+        # (block number, words) in one attribute, so threads never see a torn pair
+        self._block: Tuple[Optional[int], "array[int]"] = (None, array("Q"))
+
+    def word(self, index: int) -> int:
+        """The first word of item index"""
+        block, offset = divmod(index, BLOCK_SIZE)
+        cached, words = self._block
+        if block != cached:
+            words = block_words(self.seed, self.stream, block)
+            self._block = (block, words)
+        return words[offset]
+
+    def get(self, index: int) -> CounterRandom:
+        return CounterRandom(self.seed, index, self.stream, self.word(index))
+
+
+class Digits:
+    """Stands in for a generator, handing out the mixed-radix digits of value as its draws.
+
+    Drawing a token from n choices takes value % n and moves on to value // n,
+    so every value below the product of the choice counts gives a different
+    combination of tokens.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: int) -> None:
+        self.value = value
+
+    def below(self, n: int) -> int:
+        self.value, digit = divmod(self.value, n)
+        return digit
+
+    def randint(self, a: int, b: int) -> int:
+        return a + self.below(b - a + 1)
+
+    def choice(self, seq: Sequence[T]) -> T:
+        return seq[self.below(len(seq))]
+
+
+class Sampler:
+    """Draws distinct integers from range(size) in random order, in O(1) time per draw.
+
+    A Fisher-Yates shuffle run lazily: only positions that were swapped are
+    stored, so memory grows with the draws made, not with size.
+    """
+
+    __slots__ = ("size", "drawn", "_swaps")
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.drawn = 0
+        self._swaps: Dict[int, int] = {}
+
+    def draw(self, rng: CounterRandom) -> Optional[int]:
+        """The next value, or None once all of range(size) has been drawn"""
+        if self.drawn >= self.size:
+            return None
+        pick = self.drawn + rng.below(self.size - self.drawn)
+        value = self._swaps.get(pick, pick)
+        self._swaps[pick] = self._swaps.pop(self.drawn, self.drawn)
+        self.drawn += 1
+        return value
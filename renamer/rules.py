@@ -0,0 +1,234 @@
+import json
+import os
+import re
+import unicodedata
+from functools import partial
+from operator import methodcaller
+from typing import Any, Callable, Dict, List, Optional, Pattern, Sequence
+
+from .pattern import split_ext
+
+PRESETS_ENV = "RENAMER_PRESETS"
+
+RULE_KINDS = ("replace", "strip", "transliterate", "trim", "case")
+CASE_MODES = ("upper", "lower", "title")
+
+# strip "where" values other than "all", and the str method doing each
+STRIP_METHODS = {"ends": "strip", "start": "lstrip", "end": "rstrip"}
+
+# Letters NFKD does not decompose into an ASCII base letter
+ASCII_EXTRA = {"ß": "ss", "æ": "ae", "Æ": "AE", "œ": "oe", "Œ": "OE", "ø": "o", "Ø": "O", "đ": "d", "Đ": "D",
+               "ł": "l", "Ł": "L", "þ": "th", "Þ": "Th", "ð": "d", "Ð": "D", "ı": "i"}
+
+# Shipped presets; saved presets of the same name take precedence
+BUILTIN_PRESETS: Dict[str, List[Dict[str, Any]]] = {
+    "tidy-spaces": [
+        {"kind": "replace", "pattern": r"\s+", "replacement": " "},
+        {"kind": "strip", "chars": " ", "where": "ends"},
+    ],
+    "web-safe": [
+        {"kind": "transliterate", "ascii": True},
+        {"kind": "replace", "pattern": r"[^\w.-]+", "replacement": "-"},
+        {"kind": "strip", "chars": "-", "where": "ends"},
+        {"kind": "case", "mode": "lower"},
+    ],
+}
+
+Rule = Dict[str, Any]
+
+
+class RuleError(ValueError):
+    """Raised when a rename rule cannot be compiled"""
+
+
+class AsciiTable(dict):
+    """str.translate table folding characters to ASCII, filled in as characters are first seen"""
+
+    def __missing__(self, code: int) -> str:
+        char = chr(code)
+        folded = ASCII_EXTRA.get(char)
+        if folded is None:
+            folded = "".join(c for c in unicodedata.normalize("NFKD", char) if ord(c) < 128)
+        self[code] = folded
+        return folded
+
+
+def _regex(rule: Rule, key: str = "pattern") -> Pattern[str]:
+    flags = re.IGNORECASE if rule.get("ignore_case") else 0
+    try:
+        return re.compile(rule[key], flags)
+    except re.error as e:
+        raise RuleError(f"Invalid {rule['kind']} regex {rule[key]!r}: {e}") from None
+
+
+def _trim(length: int, name: str) -> str:
+    """Cut name to length characters, keeping its extension"""
+    if len(name) <= length:
+        return name
+    stem, ext = split_ext(name)
+    if len(ext) >= length:
+        return name[:length]
+    return stem[:length - len(ext)] + ext
+
+
+def _case_group(change: Callable[[str], str], group: int, match: "re.Match[str]") -> str:
+    whole = match.group(0)
+    start, end = match.span(group)
+    if start < 0:
+        return whole
+    offset = match.start()
+    return whole[:start - offset] + change(match.group(group)) + whole[end - offset:]
+
+
+def compile_rule(rule: Rule) -> Callable[[str], str]:
+    """Turn one rule into a str -> str function, with its regex or table built now"""
+    kind = rule.get("kind")
+    try:
+        if kind == "replace":
+            return partial(_regex(rule).sub, rule.get("replacement", ""), count=int(rule.get("count", 0)))
+        if kind == "strip":
+            chars = rule["chars"]
+            where = rule.get("where", "all")
+            if where == "all":
+                return methodcaller("translate", str.maketrans("", "", chars))
+            if where in STRIP_METHODS:
+                return methodcaller(STRIP_METHODS[where], chars)
+            raise RuleError(f"strip where must be all, ends, start or end, not {where!r}")
+        if kind == "transliterate":
+            if rule.get("ascii"):
+                table: Dict[int, Any] = AsciiTable()
+            else:
+                source, target = rule["from"], rule.get("to", "")
+                if len(source) != len(target):
+                    raise RuleError("transliterate needs from and to of the same length")
+                table = str.maketrans(source, target)
+            return methodcaller("translate", table)
+        if kind == "trim":
+            length = int(rule["length"])
+            if length < 1:
+                raise RuleError("trim length must be at least 1")
+            return partial(_trim, length)
+        if kind == "case":
+            mode = rule["mode"]
+            if mode not in CASE_MODES:
+                raise RuleError(f"case mode must be one of {', '.join(CASE_MODES)}, not {mode!r}")
+            change: Callable[[str], str] = getattr(str, mode)
+            if not rule.get("pattern"):
+                return change
+            regex = _regex(rule)
+            # Without a group, the first one if the regex has any, else the whole match
+            group = int(rule.get("group", 1 if regex.groups else 0))
+            if group > regex.groups:
+                raise RuleError(f"case pattern {rule['pattern']!r} has no group {group}")
+            return partial(regex.sub, partial(_case_group, change, group))
+    except RuleError:
+        raise
+    except KeyError as e:
+        raise RuleError(f"Incomplete {kind} rule {rule!r}: missing {e}") from None
+    except (TypeError, ValueError) as e:
+        raise RuleError(f"Invalid {kind} rule {rule!r}: {e}") from None
+    raise RuleError(f"Unknown rule kind {kind!r}; expected one of {', '.join(RULE_KINDS)}")
+
+
+class RulePipeline:
+    """A chain of rename rules compiled once per batch.
+
+    Every regex is compiled and every translate table built up front, so
+    applying the pipeline is one call per rule and no per-name setup.
+    """
+
+    __slots__ = ("rules", "steps")
+
+    def __init__(self, rules: Sequence[Rule]) -> None:
+        self.rules = list(rules)
+        self.steps = tuple(compile_rule(rule) for rule in self.rules)
+
+    def __bool__(self) -> bool:
+        return bool(self.steps)
+
+    def __call__(self, name: str) -> str:
+        for step in self.steps:
+            name = step(name)
+        return name
+
+
+def compile_rules(rules: Sequence[Rule]) -> RulePipeline:
+    """Compile a list of rule dicts, in order, into a reusable pipeline"""
+    return RulePipeline(rules)
+
+
+def describe_rule(rule: Rule) -> str:
+    """One-line summary of a rule, for listings"""
+    kind = rule.get("kind")
+    if kind == "replace":
+        return f"replace /{rule.get('pattern')}/ with {rule.get('replacement', '')!r}"
+    if kind == "strip":
+        return f"strip {rule.get('chars')!r} ({rule.get('where', 'all')})"
+    if kind == "transliterate":
+        return "transliterate to ASCII" if rule.get("ascii") else \
+            f"transliterate {rule.get('from')!r} -> {rule.get('to')!r}"
+    if kind == "trim":
+        return f"trim to {rule.get('length')} characters"
+    if kind == "case":
+        group = f" group {rule['group']}" if "group" in rule else ""
+        where = f" in /{rule['pattern']}/{group}" if rule.get("pattern") else ""
+        return f"{rule.get('mode')}case{where}"
+    return str(rule)
+
+
+def default_presets_path() -> str:
+    return os.environ.get(PRESETS_ENV) or os.path.join(os.path.expanduser("~"), ".renamer", "presets.json")
+
+
+def _read_presets(path: str) -> Dict[str, List[Rule]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        raise RuleError(f"Cannot read presets {path}: {e}") from None
+    if not isinstance(data, dict):
+        raise RuleError(f"Cannot read presets {path}: not a preset file")
+    return data
+
+
+def _write_presets(presets: Dict[str, List[Rule]], path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(presets, f, indent=1, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_presets(path: Optional[str] = None) -> Dict[str, List[Rule]]:
+    """Built-in and saved presets by name"""
+    presets = dict(BUILTIN_PRESETS)
+    presets.update(_read_presets(path or default_presets_path()))
+    return presets
+
+
+def get_preset(name: str, path: Optional[str] = None) -> List[Rule]:
+    presets = load_presets(path)
+    if name not in presets:
+        raise RuleError(f"No preset named {name!r}; known: {', '.join(sorted(presets))}")
+    return [dict(rule) for rule in presets[name]]
+
+
+def save_preset(name: str, rules: Sequence[Rule], path: Optional[str] = None) -> None:
+    """Store rules under name, after checking they compile"""
+    compile_rules(rules)
+    path = path or default_presets_path()
+    presets = _read_presets(path)
+    presets[name] = [dict(rule) for rule in rules]
+    _write_presets(presets, path)
+
+
+def delete_preset(name: str, path: Optional[str] = None) -> bool:
+    """Remove a saved preset; built-in presets cannot be deleted. Returns whether one was removed"""
+    path = path or default_presets_path()
+    presets = _read_presets(path)
+    if presets.pop(name, None) is None:
+        return False
+    _write_presets(presets, path)
+    return True
@@ -0,0 +1,107 @@
+import os
+from typing import Callable, Iterable, Iterator, List, Optional
+
+
+class Folder:
+    """A scanned folder, shared by every entry in it so its path is stored once"""
+
+    __slots__ = ("rel", "prefix", "path", "depth")
+
+    def __init__(self, rel: str, prefix: str) -> None:
+        self.rel = rel  # Relative path with a trailing separator; "" for the root
+        self.prefix = prefix  # Full path with a trailing separator
+        self.path = prefix.rpartition(os.sep)[0]
+        self.depth = rel.count(os.sep)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Folder):
+            return NotImplemented
+        return self.rel == other.rel and self.prefix == other.prefix
+
+    def __hash__(self) -> int:
+        return hash((self.rel, self.prefix))
+
+    def __repr__(self) -> str:
+        return f"Folder({self.rel!r}, {self.prefix!r})"
+
+
+class Item:
+    """A directory entry found by a scan, with its type cached from the DirEntry.
+
+    Only the name is stored per entry; the paths are built from the shared
+    Folder on access.
+    """
+
+    __slots__ = ("folder", "name", "is_file", "is_dir")
+
+    def __init__(self, folder: Folder, name: str, is_file: bool, is_dir: bool) -> None:
+        self.folder = folder
+        self.name = name
+        self.is_file = is_file
+        self.is_dir = is_dir
+
+    @property
+    def rel_path(self) -> str:
+        return self.folder.rel + self.name
+
+    @property
+    def full_path(self) -> str:
+        return self.folder.prefix + self.name
+
+    def __repr__(self) -> str:
+        return f"Item({self.rel_path!r}, is_file={self.is_file}, is_dir={self.is_dir})"
+
+
+def iter_directory(directory: str, recursive: bool = False, include_files: bool = True,
+                   include_folders: bool = True) -> Iterator[Item]:
+    """Walk a directory with one os.scandir call per visited folder, yielding entries as found.
+
+    The file/folder type comes from the DirEntry (d_type on POSIX, the find
+    data on Windows), so no extra stat call is made per entry except for
+    symlinks. Like os.walk, symlinked folders are listed but not descended.
+    """
+    pending = [(directory, "")]
+
+    while pending:
+        path, rel_root = pending.pop()
+        try:
+            entries = os.scandir(path)
+        except OSError:
+            # Unreadable subfolders are skipped, as os.walk does
+            if path == directory:
+                raise
+            continue
+
+        folder = Folder(rel_root, os.path.join(path, ""))
+        with entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                    is_file = not is_dir and entry.is_file()
+                except OSError:
+                    continue
+
+                if is_dir:
+                    if include_folders:
+                        yield Item(folder, entry.name, False, True)
+                    if recursive and not entry.is_symlink():
+                        pending.append((entry.path, rel_root + entry.name + os.sep))
+                elif is_file and include_files:
+                    yield Item(folder, entry.name, True, False)
+
+
+def filter_items(items: Iterable[Item], matches: Callable[[str], bool]) -> Iterator[Item]:
+    """Drop files whose name does not match; folders always pass, as before"""
+    for item in items:
+        if item.is_dir or matches(item.name):
+            yield item
+
+
+def scan_directory(directory: str, recursive: bool = False, include_files: bool = True,
+                   include_folders: bool = True,
+                   matches: Optional[Callable[[str], bool]] = None) -> List[Item]:
+    """Collect a whole directory scan into a list"""
+    items = iter_directory(directory, recursive, include_files, include_folders)
+    if matches is not None:
+        items = filter_items(items, matches)
+    return list(items)
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Iterator, List, Optional
+
+from .scan import Folder, Item, iter_directory
+
+INDEX_ENV = "RENAMER_INDEX_DIR"
+
+# Entry kinds stored in the index, as the first character of each entry
+FILE, FOLDER, LINKED_FOLDER = "f", "d", "l"
+
+# Listings are stored as one blob per folder: kind+name entries joined by NUL,
+# which cannot occur in a file name. surrogatepass round-trips any str,
+# including undecodable POSIX names
+SEPARATOR = "\0"
+
+# Directories modified this close to the scan may change again within the same
+# mtime tick (2s on FAT), so their listing is stored but never trusted
+RACY_WINDOW_NS = 2_000_000_000
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS dirs (rel BLOB PRIMARY KEY, mtime_ns INTEGER NOT NULL, listing BLOB NOT NULL)"
+
+
+def default_index_path(directory: str) -> str:
+    """One index file per scanned root, named after a hash of its absolute path"""
+    root = os.path.abspath(directory)
+    digest = hashlib.sha1(os.fsencode(root)).hexdigest()[:16]
+    base = os.environ.get(INDEX_ENV) or os.path.join(os.path.expanduser("~"), ".renamer", "index")
+    return os.path.join(base, f"{digest}.sqlite")
+
+
+def _encode(value: str) -> bytes:
+    return value.encode("utf-8", "surrogatepass")
+
+
+def _decode(value: bytes) -> str:
+    return value.decode("utf-8", "surrogatepass")
+
+
+def _list(path: str) -> List[str]:
+    """Read one directory into kind+name entries, skipping entries that are neither"""
+    listing = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    listing.append((LINKED_FOLDER if entry.is_symlink() else FOLDER) + entry.name)
+                elif entry.is_file():
+                    listing.append(FILE + entry.name)
+            except OSError:
+                continue
+    return listing
+
+
+class SnapshotIndex:
+    """Persistent listing of a directory tree, keyed by directory mtime.
+
+    A directory's mtime changes whenever an entry is added, removed or
+    renamed directly inside it, so a folder whose mtime matches the stored
+    one is listed from the index with a single stat instead of a scandir.
+    Stats and listings are still per directory: an unchanged folder can
+    hold changed subfolders, which are rescanned on their own.
+    """
+
+    def __init__(self, directory: str, path: Optional[str] = None) -> None:
+        self.directory = directory
+        self.path = path or default_index_path(directory)
+        self.reused = 0  # Directories served from the index during the last scan
+        self.rescanned = 0  # Directories read from disk during the last scan
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        db = sqlite3.connect(self.path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        return db
+
+    def _listing(self, db: sqlite3.Connection, path: str, rel_root: str, scan_started: int) -> List[str]:
+        """Entries of one directory, from the index when its mtime is unchanged"""
+        mtime_ns = os.stat(path).st_mtime_ns
+        key = _encode(rel_root)
+        row = db.execute("SELECT mtime_ns, listing FROM dirs WHERE rel = ?", (key,)).fetchone()
+        if row is not None and row[0] == mtime_ns:
+            self.reused += 1
+            return _decode(row[1]).split(SEPARATOR) if row[1] else []
+
+        listing = _list(path)
+        self.rescanned += 1
+        if row is not None and row[1]:
+            folders = {entry for entry in listing if entry[0] == FOLDER}
+            for entry in _decode(row[1]).split(SEPARATOR):
+                if entry[0] == FOLDER and entry not in folders:
+                    self._forget(db, rel_root + entry[1:] + os.sep)
+        trusted = mtime_ns if mtime_ns < scan_started - RACY_WINDOW_NS else -1
+        db.execute("INSERT OR REPLACE INTO dirs (rel, mtime_ns, listing) VALUES (?, ?, ?)",
+                   (key, trusted, _encode(SEPARATOR.join(listing))))
+        return listing
+
+    @staticmethod
+    def _forget(db: sqlite3.Connection, rel_root: str) -> None:
+        """Drop a vanished folder and everything below it"""
+        # Every key under rel_root sorts between it and the same prefix with the separator bumped by one
+        upper = rel_root[:-1] + chr(ord(os.sep) + 1)
+        db.execute("DELETE FROM dirs WHERE rel >= ? AND rel < ?", (_encode(rel_root), _encode(upper)))
+
+    def iter_directory(self, recursive: bool = False, include_files: bool = True,
+                       include_folders: bool = True) -> Iterator[Item]:
+        """Yield the same items as scan.iter_directory, refreshing the index on the way"""
+        directory = self.directory
+        self.reused = self.rescanned = 0
+        scan_started = time.time_ns()
+        try:
+            db = self._connect()
+        except (OSError, sqlite3.Error):
+            # An unwritable index only costs speed
+            yield from iter_directory(directory, recursive, include_files, include_folders)
+            return
+        try:
+            pending = [(directory, "")]
+            while pending:
+                path, rel_root = pending.pop()
+                try:
+                    listing = self._listing(db, path, rel_root, scan_started)
+                except OSError:
+                    # Unreadable subfolders are skipped, as os.walk does
+                    if path == directory:
+                        raise
+                    continue
+
+                # Names never contain a separator, so joining is plain concatenation
+                prefix = os.path.join(path, "")
+                folder = Folder(rel_root, prefix)
+                for entry in listing:
+                    kind, name = entry[0], entry[1:]
+                    if kind == FILE:
+                        if include_files:
+                            yield Item(folder, name, True, False)
+                        continue
+                    if include_folders:
+                        yield Item(folder, name, False, True)
+                    if recursive and kind == FOLDER:
+                        pending.append((prefix + name, rel_root + name + os.sep))
+        finally:
+            # Each listing is written whole before its items are yielded, so an
+            # abandoned scan still leaves a consistent index for the folders it saw
+            try:
+                db.commit()
+            except sqlite3.Error:
+                pass
+            db.close()
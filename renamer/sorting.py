@@ -0,0 +1,66 @@
+import heapq
+import pickle
+import tempfile
+from typing import IO, Callable, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Records are pickled in blocks so each spill run costs few pickle calls
+BLOCK_SIZE = 1024
+
+
+def _write_run(records: List[T], tmpdir: Optional[str]) -> IO[bytes]:
+    run = tempfile.TemporaryFile(dir=tmpdir)
+    for start in range(0, len(records), BLOCK_SIZE):
+        pickle.dump(records[start:start + BLOCK_SIZE], run, pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+
+def _read_run(run: IO[bytes]) -> Iterator[T]:
+    try:
+        while True:
+            try:
+                block = pickle.load(run)
+            except EOFError:
+                return
+            yield from block
+    finally:
+        run.close()
+
+
+def external_sort(records: Iterable[T], key: Callable[[T], object], buffer_size: int,
+                  tmpdir: Optional[str] = None) -> Iterator[T]:
+    """Sort a stream while holding at most buffer_size records in memory.
+
+    Records are collected into sorted runs of buffer_size, spilled to
+    temporary files and merged lazily. Streams that fit in one run never
+    touch the disk. The sort is stable, like sorted().
+    """
+    if buffer_size <= 0:
+        raise ValueError("buffer_size must be positive")
+
+    runs: List[IO[bytes]] = []
+    buffer: List[T] = []
+    try:
+        for record in records:
+            buffer.append(record)
+            if len(buffer) >= buffer_size:
+                buffer.sort(key=key)
+                runs.append(_write_run(buffer, tmpdir))
+                buffer = []
+        buffer.sort(key=key)
+    except BaseException:
+        for run in runs:
+            run.close()
+        raise
+
+    if not runs:
+        yield from buffer
+        return
+
+    if buffer:
+        runs.append(_write_run(buffer, tmpdir))
+        buffer = []
+    # heapq.merge keeps equal keys in run order, so the merge stays stable
+    yield from heapq.merge(*(_read_run(run) for run in runs), key=key)
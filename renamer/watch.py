@@ -0,0 +1,515 @@
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import json
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .engine import RenameConfig, RenameEngine, RenameResult, RenamerError
+from .journal import Journal
+from .metrics import Metrics
+from .rng import new_seed
+from .scan import Folder, Item
+
+WATCH_ENV = "RENAMER_WATCH_DIR"
+
+# Layout version of the state file
+STATE_FORMAT = 1
+
+# Seconds an arrival must go without events before it is renamed; a copy in
+# progress keeps refreshing it with writes
+DEFAULT_SETTLE = 0.2
+
+# Seconds between listings of the tree when inotify is not available
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Longest the loop blocks, so a stop request is noticed
+WAKE_INTERVAL = 0.5
+
+# Kinds of event reported by the watchers
+CREATED, MODIFIED, REMOVED = "created", "modified", "removed"
+Event = Tuple[str, str]
+
+# inotify(7) constants
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_MODIFY | IN_CLOSE_WRITE
+              | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+
+# struct inotify_event header: wd, mask, cookie, length of the NUL-padded name
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+def default_state_path(directory: str) -> str:
+    """One state file per watched root, named after a hash of its absolute path"""
+    root = os.path.abspath(directory)
+    digest = hashlib.sha1(os.fsencode(root)).hexdigest()[:16]
+    base = os.environ.get(WATCH_ENV) or os.path.join(os.path.expanduser("~"), ".renamer", "watch")
+    return os.path.join(base, f"{digest}.json")
+
+
+@dataclass
+class WatchState:
+    """Next counter and the seed of a watched root, kept across restarts of the daemon"""
+    directory: str
+    counter: int
+    seed: int
+
+    @classmethod
+    def load(cls, path: str, directory: str, counter: int, seed: Optional[int] = None) -> "WatchState":
+        """Read the state file, or start at counter if there is none yet"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(directory, counter, seed if seed is not None else new_seed())
+        except (OSError, ValueError) as e:
+            raise RenamerError(f"Cannot read watch state {path}: {e}") from None
+        if not isinstance(data, dict) or data.get("format") != STATE_FORMAT:
+            raise RenamerError(f"Cannot read watch state {path}: not a state file of format {STATE_FORMAT}")
+        try:
+            return cls(str(data["directory"]), int(data["counter"]), int(data["seed"]))
+        except (KeyError, TypeError, ValueError) as e:
+            raise RenamerError(f"Cannot read watch state {path}: {e}") from None
+
+    def save(self, path: str) -> None:
+        """Write the state durably; the counter must survive a crash right after it is used"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"format": STATE_FORMAT, "directory": self.directory, "counter": self.counter,
+                       "seed": self.seed}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+class Arrivals:
+    """New paths waiting to settle; each is released once no event has touched it for settle seconds"""
+
+    def __init__(self, settle: float) -> None:
+        self.settle = settle
+        self._pending: Dict[str, float] = {}  # Path -> time of its last event, oldest first
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, path: str, now: float) -> None:
+        # Re-inserting moves the path to the end, keeping the dict ordered by time
+        self._pending.pop(path, None)
+        self._pending[path] = now
+
+    def touch(self, path: str, now: float) -> None:
+        """Restart the wait of a pending path; paths not pending are left alone"""
+        if path in self._pending:
+            self.add(path, now)
+
+    def discard(self, path: str) -> None:
+        self._pending.pop(path, None)
+
+    def move(self, old: str, new: str) -> None:
+        """Follow a renamed folder: pending paths inside it now live under new"""
+        prefix = old + os.sep
+        for path in [p for p in self._pending if p.startswith(prefix)]:
+            self._pending[new + path[len(old):]] = self._pending.pop(path)
+
+    def deadline(self) -> Optional[float]:
+        """When the oldest pending path settles, if nothing touches it"""
+        for seen in self._pending.values():
+            return seen + self.settle
+        return None
+
+    def ready(self, now: float) -> List[str]:
+        """Take the paths that have settled, oldest first"""
+        limit = now - self.settle
+        ready = []
+        for path, seen in self._pending.items():
+            if seen > limit:
+                break
+            ready.append(path)
+        for path in ready:
+            del self._pending[path]
+        return ready
+
+
+def _libc() -> Any:
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        raise OSError(errno.ENOSYS, "the C library has no inotify")
+    return libc
+
+
+class InotifyWatcher:
+    """Reports entries appearing under root from the kernel's inotify queue (Linux only).
+
+    With recursive, every folder gets a watch, and a folder that arrives is
+    listed once its watch is in place, so entries created in it before that
+    are reported too.
+    """
+
+    name = "inotify"
+
+    def __init__(self, root: str, recursive: bool) -> None:
+        self.root = root
+        self.recursive = recursive
+        self.overflowed = False  # The kernel dropped events; raise fs.inotify.max_queued_events
+        self._libc = _libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1: {os.strerror(err)}")
+        self._paths: Dict[int, str] = {}  # Watch descriptor -> folder
+        self._watches: Dict[str, int] = {}
+        self._expected: Dict[str, None] = {}  # Paths the daemon renamed entries to
+        self._moved: Dict[int, str] = {}  # Folders moved away, by cookie, to follow moves within the tree
+        try:
+            if not self._add(root):
+                raise OSError(errno.ENOENT, f"Cannot watch {root}")
+            if recursive:
+                self._add_tree(root, None)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _add(self, path: str) -> bool:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached; raise fs.inotify.max_user_watches")
+            return False  # Gone or not a folder any more
+        self._paths[wd] = path
+        self._watches[path] = wd
+        return True
+
+    def _add_tree(self, directory: str, events: Optional[List[Event]]) -> None:
+        """Watch every folder below directory; with events, also report everything in them as created"""
+        pending = [directory]
+        while pending:
+            path = pending.pop()
+            if path != directory and not self._add(path):
+                continue
+            try:
+                entries = os.scandir(path)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if events is not None:
+                        events.append((entry.path, CREATED))
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                    except OSError:
+                        pass
+
+    def _rename_watches(self, old: str, new: str) -> None:
+        # Queued events are read with the folder's new path, so expected paths move along
+        prefix = old + os.sep
+        for wd, path in list(self._paths.items()):
+            if path == old or path.startswith(prefix):
+                moved = new + path[len(old):]
+                self._paths[wd] = moved
+                self._watches.pop(path, None)
+                self._watches[moved] = wd
+        for path in [p for p in self._expected if p.startswith(prefix)]:
+            del self._expected[path]
+            self._expected[new + path[len(old):]] = None
+
+    def renamed(self, old: str, new: str) -> bool:
+        """Note a rename made by the daemon so it is not reported as an arrival; returns whether it was a folder"""
+        self._expected[new] = None
+        if old in self._watches:
+            self._rename_watches(old, new)
+            return True
+        return False
+
+    def wait(self, timeout: float) -> List[Event]:
+        """Events read within timeout seconds"""
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return []
+        events: List[Event] = []
+        while True:
+            try:
+                data = os.read(self._fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            self._parse(data, events)
+        return events
+
+    def _parse(self, data: bytes, events: List[Event]) -> None:
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                path = self._paths.pop(wd, None)
+                if path is not None and self._watches.get(path) == wd:
+                    del self._watches[path]
+                continue
+            folder = self._paths.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, name)
+
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                moved_from = self._moved.pop(cookie, None) if mask & IN_MOVED_TO else None
+                if path in self._expected:
+                    del self._expected[path]
+                elif mask & IN_ISDIR and moved_from is not None:
+                    # A folder moved within the tree keeps its watches; only the folder itself is new
+                    self._rename_watches(moved_from, path)
+                    events.append((path, CREATED))
+                else:
+                    events.append((path, CREATED))
+                    if mask & IN_ISDIR and self.recursive and self._add(path):
+                        self._add_tree(path, events)
+            elif mask & IN_MOVED_FROM:
+                if mask & IN_ISDIR:
+                    self._moved[cookie] = path
+                events.append((path, REMOVED))
+            elif mask & IN_DELETE:
+                events.append((path, REMOVED))
+            else:
+                events.append((path, MODIFIED))
+
+
+class PollingWatcher:
+    """Finds arrivals by listing the tree every interval seconds; works on any platform and filesystem"""
+
+    name = "polling"
+
+    def __init__(self, root: str, recursive: bool, interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        self.root = root
+        self.recursive = recursive
+        self.interval = interval
+        self.overflowed = False
+        self._known = self._list()
+        self._due = time.monotonic() + interval
+
+    def close(self) -> None:
+        pass
+
+    def _list(self) -> Dict[str, Tuple[int, int, bool]]:
+        """Size, mtime and whether it is a folder, by path"""
+        listing = {}
+        pending = [self.root]
+        while pending:
+            path = pending.pop()
+            try:
+                entries = os.scandir(path)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    is_dir = stat.S_ISDIR(st.st_mode)
+                    listing[entry.path] = (st.st_size, st.st_mtime_ns, is_dir)
+                    if is_dir and self.recursive:
+                        pending.append(entry.path)
+        return listing
+
+    def renamed(self, old: str, new: str) -> bool:
+        """Note a rename made by the daemon so it is not reported as an arrival; returns whether it was a folder"""
+        known = self._known
+        entry = known.pop(old, None)
+        if entry is None:
+            return False
+        known[new] = entry
+        if not entry[2]:
+            return False
+        prefix = old + os.sep
+        for path in [p for p in known if p.startswith(prefix)]:
+            known[new + path[len(old):]] = known.pop(path)
+        return True
+
+    def wait(self, timeout: float) -> List[Event]:
+        delay = self._due - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        if delay > 0:
+            time.sleep(delay)
+        listing = self._list()
+        self._due = time.monotonic() + self.interval
+        known = self._known
+        events = [(path, CREATED if path not in known else MODIFIED)
+                  for path, entry in listing.items() if known.get(path) != entry]
+        events.extend((path, REMOVED) for path in known if path not in listing)
+        self._known = listing
+        return events
+
+
+class WatchDaemon:
+    """Renames entries as they arrive under config.directory.
+
+    Entries already there when the daemon starts are left alone. Arrivals
+    are renamed in groups once they settle, each group one journal batch;
+    counters continue from the state file, so {counter} keeps counting up
+    across restarts. The counters of a group are reserved in the state file
+    before its renames, so a crash can skip numbers but never repeat one; a
+    group that cannot start, e.g. while another process has a batch open,
+    gives them back and keeps its arrivals for the next try. The journal is
+    shared with every other run and is never compacted here.
+    """
+
+    def __init__(self, config: RenameConfig, journal: Optional[Journal] = None, metrics: Optional[Metrics] = None,
+                 state_path: Optional[str] = None, settle: float = DEFAULT_SETTLE, poll: bool = False,
+                 interval: float = DEFAULT_POLL_INTERVAL, reset: bool = False) -> None:
+        self.root = os.path.abspath(config.directory)
+        if not os.path.isdir(self.root):
+            raise RenamerError(f"Not a directory: {config.directory}")
+        self.state_path = state_path or default_state_path(self.root)
+        self.state = WatchState.load(self.state_path, self.root, config.start_counter, config.seed)
+        if reset:
+            self.state.counter = config.start_counter
+        if config.seed is not None:
+            self.state.seed = config.seed
+        self.engine = RenameEngine(replace(config, directory=self.root, seed=self.state.seed), journal, metrics)
+        self.matches = self.engine.compile_filter()
+        self.engine.compile()
+        self.warnings: List[str] = []
+        self.arrivals = Arrivals(settle)
+        self.watcher: Any = None
+        if not poll:
+            try:
+                self.watcher = InotifyWatcher(self.root, config.recursive)
+            except OSError as e:
+                self.warnings.append(f"Cannot use inotify ({e.strerror or e}); listing the tree every {interval}s")
+        if self.watcher is None:
+            self.watcher = PollingWatcher(self.root, config.recursive, interval)
+
+    def close(self) -> None:
+        self.watcher.close()
+
+    def items(self, paths: List[str]) -> List[Item]:
+        """The arrivals still there that the config selects, in scan order"""
+        config = self.engine.config
+        folders: Dict[str, Folder] = {}
+        items = []
+        for path in paths:
+            parent, name = os.path.split(path)
+            try:
+                mode = os.stat(path).st_mode
+            except OSError:
+                continue  # Gone again, e.g. a temporary file
+            is_dir = stat.S_ISDIR(mode)
+            is_file = stat.S_ISREG(mode)
+            if is_dir and not config.include_folders or is_file and not config.include_files:
+                continue
+            if not (is_dir or is_file) or is_file and not self.matches(name):
+                continue
+            folder = folders.get(parent)
+            if folder is None:
+                rel = os.path.relpath(parent, self.root)
+                folder = folders[parent] = Folder("" if rel == os.curdir else rel + os.sep,
+                                                  os.path.join(parent, ""))
+            items.append(Item(folder, name, is_file, is_dir))
+        items.sort(key=lambda item: item.rel_path)
+        return items
+
+    def process(self, paths: List[str]) -> Optional[RenameResult]:
+        """Rename one group of settled arrivals; None if none of them is to be renamed"""
+        items = self.items(paths)
+        if not items:
+            return None
+
+        counter = self.state.counter
+        self.state.counter += len(items)
+        self.state.save(self.state_path)
+
+        # Each group gets the date and time it was renamed at
+        self.engine.now = None
+        try:
+            result = self.engine.execute(list(self.engine.name_items(items, counter)))
+        except RenamerError:
+            # The batch never started, so nothing used the counters
+            self.state.counter = counter
+            self.state.save(self.state_path)
+            raise
+        for new_path, old_path in result.batch:
+            if self.watcher.renamed(old_path, new_path):
+                self.arrivals.move(old_path, new_path)
+        return result
+
+    def run(self, stop: Optional[threading.Event] = None,
+            report: Optional[Callable[[RenameResult], None]] = None,
+            warn: Optional[Callable[[str], None]] = None) -> None:
+        """Watch until stop is set, handing each group's result to report"""
+        stop = stop or threading.Event()
+        if warn:
+            for warning in self.warnings:
+                warn(warning)
+        arrivals = self.arrivals
+        blocked = False  # Warned that groups cannot start; said once until one does
+        while not stop.is_set():
+            deadline = arrivals.deadline()
+            timeout = WAKE_INTERVAL if deadline is None else min(WAKE_INTERVAL, deadline - time.monotonic())
+            events = self.watcher.wait(max(0.0, timeout))
+            now = time.monotonic()
+            for path, kind in events:
+                if kind == CREATED:
+                    arrivals.add(path, now)
+                elif kind == MODIFIED:
+                    arrivals.touch(path, now)
+                else:
+                    arrivals.discard(path)
+            if self.watcher.overflowed:
+                self.watcher.overflowed = False
+                if warn:
+                    warn("The inotify queue overflowed and arrivals were missed; "
+                         "raise fs.inotify.max_queued_events")
+
+            ready = arrivals.ready(time.monotonic())
+            if ready:
+                try:
+                    result = self.process(ready)
+                except RenamerError as e:
+                    # Nothing was renamed; the group settles again and is retried
+                    if warn and not blocked:
+                        warn(f"Cannot rename arrivals yet, retrying: {e}")
+                    blocked = True
+                    now = time.monotonic()
+                    for path in ready:
+                        arrivals.add(path, now)
+                    continue
+                blocked = False
+                if result is not None and report:
+                    report(result)
@@ -0,0 +1,46 @@
+"""Content tokens: lazy imports, the worker pool, and folders"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from renamer import RenameConfig, RenameEngine, RenamerError
+from renamer.content import POOL_MIN_FILES, ContentReader, hash_file
+
+
+def test_cli_import_skips_heavy_modules():
+    code = ("import sys, renamer.cli; "
+            "print(sorted(m for m in ('asyncio', 'multiprocessing', 'concurrent.futures.process') "
+            "if m in sys.modules))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+
+def test_pool_reads_match_serial_reads(tmp_path):
+    paths = []
+    for i in range(POOL_MIN_FILES * 2):
+        path = tmp_path / f"file_{i}.bin"
+        path.write_bytes(os.urandom(1000 + i))
+        paths.append(str(path))
+    reader = ContentReader(["sha1"], cache_path=str(tmp_path / "cache.sqlite"), workers=2)
+    try:
+        values = reader.read(paths)
+    finally:
+        reader.close()
+    assert [v["sha1"] for v in values] == [hash_file(path) for path in paths]
+
+
+@pytest.mark.parametrize("token", ["{sha1:8}", "{size}"])
+def test_file_only_tokens_reject_folders(tmp_path, token):
+    with pytest.raises(RenamerError):
+        RenameEngine(RenameConfig(directory=str(tmp_path), pattern=f"x_{token}")).compile()
+
+
+def test_file_only_tokens_with_folders_excluded(tmp_path, monkeypatch):
+    monkeypatch.setenv("RENAMER_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "d").mkdir()
+    (tmp_path / "a.txt").write_text("hello")
+    engine = RenameEngine(RenameConfig(directory=str(tmp_path), pattern="x_{size}", include_folders=False))
+    assert [op.new_name for op in engine.plan()] == ["x_5.txt"]
@@ -0,0 +1,33 @@
+"""File filters: regexes that cannot be joined into the combined regex still match as written"""
+import re
+
+import pytest
+
+import renamer.filters
+from renamer.filters import FilterError, compile_filter
+
+
+@pytest.mark.parametrize("spec, matching, other", [
+    ("re:(a)\\1,*.txt", ["xaay.jpg", "b.txt"], ["ab.jpg"]),
+    ("re:(?P<x>a)(?P=x),re:(?P<x>b)", ["aa.jpg", "b.jpg"], ["c.jpg"]),
+    ("re:(?i)foo,*.txt", ["xFOOy.jpg", "a.txt"], ["b.jpg"]),
+    ("re:(?x) f o o ,re:bar", ["xfoo.jpg", "bar.jpg"], ["f o o.jpg"]),
+    ("*.jpg,!re:(?i)^tmp", ["a.jpg"], ["TMP_a.jpg", "a.png"]),
+])
+def test_regexes_match_as_written(spec, matching, other):
+    match = compile_filter(spec)
+    assert all(match(name) for name in matching)
+    assert not any(match(name) for name in other)
+
+
+def test_falls_back_to_separate_regexes_when_joining_fails(monkeypatch):
+    # Without the flag check, joining "(?i)foo" with the others fails to compile
+    monkeypatch.setattr(renamer.filters, "GLOBAL_FLAGS_RE", re.compile(r"(?!)"))
+    match = compile_filter("re:(?i)foo,re:bar,IMG_*")
+    assert match("xFOO.jpg") and match("bar.jpg") and match("img_1.jpg")
+    assert not match("baz.jpg")
+
+
+def test_invalid_regex_is_reported():
+    with pytest.raises(FilterError):
+        compile_filter("re:^a(?i)b")
@@ -0,0 +1,27 @@
+"""Cancelling a multi-root run does not hide the failures of its jobs"""
+from renamer import RenameConfig, RenameEngine
+from renamer.engine import RenameCancelled
+from renamer.jobs import JobRunner
+
+
+def run_cancelled(tmp_path, monkeypatch, failure):
+    runner = JobRunner([RenameConfig(directory=str(tmp_path), pattern="n_{counter}")])
+
+    def plan(engine):
+        runner.cancel()
+        raise failure
+
+    monkeypatch.setattr(RenameEngine, "plan", plan)
+    return runner.run().jobs[0]
+
+
+def test_cancelled_job_is_not_a_failure(tmp_path, monkeypatch):
+    job = run_cancelled(tmp_path, monkeypatch, RenameCancelled("Cancelled"))
+    assert job.error is None
+    assert job.result.cancelled
+
+
+def test_error_after_cancel_is_kept(tmp_path, monkeypatch):
+    job = run_cancelled(tmp_path, monkeypatch, OSError("disk gone"))
+    assert job.status == "failed"
+    assert "disk gone" in job.error
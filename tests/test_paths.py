@@ -0,0 +1,45 @@
+"""Relative directories are resolved once, so journals and plans work from any working directory"""
+import os
+
+from renamer import RenameConfig, RenameEngine, RenamePlan
+from renamer.journal import Journal, undo_last
+
+
+def make_folder(tmp_path) -> str:
+    folder = tmp_path / "d"
+    folder.mkdir()
+    for name in ("a.txt", "b.txt"):
+        (folder / name).write_text(name)
+    return str(folder)
+
+
+def test_undo_from_another_working_directory(tmp_path, monkeypatch):
+    folder = make_folder(tmp_path)
+    journal = Journal(str(tmp_path / "journal.log"))
+    monkeypatch.chdir(tmp_path)
+    engine = RenameEngine(RenameConfig(directory="d", pattern="n_{counter}"), journal)
+    engine.execute(engine.plan())
+    assert sorted(os.listdir(folder)) == ["n_001.txt", "n_002.txt"]
+
+    monkeypatch.chdir(os.sep)
+    result = undo_last(journal)
+    journal.close()
+
+    assert not result.errors
+    assert sorted(os.listdir(folder)) == ["a.txt", "b.txt"]
+
+
+def test_saved_plan_applies_from_another_working_directory(tmp_path, monkeypatch):
+    folder = make_folder(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    plan = RenameEngine(RenameConfig(directory="d", pattern="n_{counter}")).plan()
+    assert plan.config.directory == folder
+    plan_path = str(tmp_path / "plan.json")
+    plan.save(plan_path)
+
+    monkeypatch.chdir(os.sep)
+    plan = RenamePlan.load(plan_path)
+    result = RenameEngine.for_plan(plan).execute(plan.ops)
+
+    assert not result.errors
+    assert sorted(os.listdir(folder)) == ["n_001.txt", "n_002.txt"]
@@ -0,0 +1,29 @@
+"""Random tokens depend only on the seed and the item, however the names are drawn"""
+import pytest
+
+from renamer import RenameConfig, RenameEngine
+from renamer.rng import BLOCK_SIZE, CounterRandom, StreamBlocks
+
+PATTERNS = [
+    ("{list1}_{prefix}{counter}_v{version}", ["Project", "Report", "Draft"], ["doc", "img"]),
+    ("{random}_{list1}", ["a", "b", "c", "d", "e"], []),
+    ("{prefix}{random}{list1}", [], ["x", "y", "z"]),
+]
+
+
+@pytest.mark.parametrize("pattern, list1, list2", PATTERNS)
+def test_tabulated_draws_match_token_by_token_draws(pattern, list1, list2):
+    engine = RenameEngine(RenameConfig(pattern=pattern, list1=list1, list2=list2, seed=42))
+    engine.compile()
+    for index in list(range(2 * BLOCK_SIZE + 3)) + [-1, 10 ** 9]:
+        counter = index + engine.config.start_counter
+        name = engine.generate_new_name(f"f{index}.txt", counter, 1.0, True)
+        drawn = engine.generate_new_name(f"f{index}.txt", counter, 1.0, True, rng=CounterRandom(42, index))
+        assert name == drawn
+
+
+def test_item_draws_do_not_depend_on_order():
+    blocks = StreamBlocks(7)
+    indexes = [3, BLOCK_SIZE * 5 + 1, 0, BLOCK_SIZE - 1, BLOCK_SIZE * 5 + 1]
+    for index in indexes:
+        assert blocks.get(index).choice(range(1000)) == CounterRandom(7, index).choice(range(1000))
@@ -0,0 +1,152 @@
+"""Recovery of rename batches interrupted at every point, including swaps and cycles of names"""
+import os
+
+import pytest
+
+import renamer.engine
+from renamer import RenameConfig, RenameEngine
+from renamer.engine import RenameOp
+from renamer.journal import Journal, recover, undo_last
+from renamer.scan import Folder
+
+
+class Crash(BaseException):
+    """Stands in for the process dying; not caught like an OSError would be"""
+
+
+def contents(root: str) -> dict:
+    found = {}
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            found.update({f"{name}/{k}": v for k, v in contents(path).items()})
+        else:
+            with open(path) as f:
+                found[name] = f.read()
+    return found
+
+
+def make_files(root: str, names) -> None:
+    for name in names:
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(name)
+
+
+def die_after(monkeypatch, after: int) -> None:
+    """Make the process "die" once `after` renames reached the disk"""
+    rename_noreplace = renamer.engine.rename_noreplace
+    done = 0
+
+    def dying_rename(src, dst):
+        nonlocal done
+        if done == after:
+            raise Crash()
+        rename_noreplace(src, dst)
+        done += 1
+
+    monkeypatch.setattr(renamer.engine, "rename_noreplace", dying_rename)
+
+
+def run_batch(journal: Journal, root: str, renames) -> None:
+    """Execute (folder, name, new_name) renames as one batch"""
+    ops = []
+    for rel, name, new_name in renames:
+        folder = Folder(rel + os.sep if rel else "", os.path.join(root, rel, ""))
+        ops.append(RenameOp(folder, name, new_name, not os.path.isdir(folder.prefix + name), 1.0))
+    RenameEngine(RenameConfig(directory=root, recursive=True, include_folders=True), journal).execute(ops)
+
+
+def crash_batch(monkeypatch, journal_path: str, root: str, renames, after: int) -> None:
+    """Execute renames and die after `after` of them reached the disk"""
+    journal = Journal(journal_path)
+    # A dead process writes neither the failed renames nor the end of the batch
+    monkeypatch.setattr(journal, "record_failed", lambda batch_id, indices: None)
+    monkeypatch.setattr(journal, "end", lambda batch_id: None)
+    die_after(monkeypatch, after)
+    with pytest.raises(Crash):
+        run_batch(journal, root, renames)
+    journal.close()
+    monkeypatch.undo()
+
+
+def crash_undo(monkeypatch, journal_path: str, root: str, renames, after: int) -> None:
+    """Execute renames, then die after `after` moves of their undo reached the disk"""
+    journal = Journal(journal_path)
+    run_batch(journal, root, renames)
+    monkeypatch.setattr(journal, "end_run", lambda *args: None)
+    die_after(monkeypatch, after)
+    with pytest.raises(Crash):
+        undo_last(journal, workers=1)
+    journal.close()
+    monkeypatch.undo()
+
+
+SWAP = [("", "a", "b"), ("", "b", "a")]
+CYCLE = [("", "a", "b"), ("", "b", "c"), ("", "c", "a")]
+FOLDER = [("d", "x", "y"), ("", "d", "e")]
+
+CASES = {
+    # name: (files, renames, files after the batch, renames executed including temporary hops)
+    "swap": (["a", "b"], SWAP, {"a": "b", "b": "a"}, 3),
+    "cycle": (["a", "b", "c"], CYCLE, {"a": "c", "b": "a", "c": "b"}, 4),
+    "folder": (["d/x"], FOLDER, {"e/y": "d/x"}, 2),
+}
+
+
+def interrupted_cases() -> list:
+    return [pytest.param(files, renames, finished, after, id=f"{name}-after-{after}")
+            for name, (files, renames, finished, steps) in CASES.items() for after in range(steps)]
+
+
+@pytest.mark.parametrize("files, renames, finished, after", interrupted_cases())
+def test_recover_finishes_the_batch(tmp_path, monkeypatch, files, renames, finished, after):
+    root = str(tmp_path / "root")
+    make_files(root, files)
+    journal_path = str(tmp_path / "journal.log")
+    crash_batch(monkeypatch, journal_path, root, renames, after)
+
+    journal = Journal(journal_path)
+    result = recover(journal)
+
+    assert not result.errors
+    assert contents(root) == finished
+    assert journal.interrupted() is None
+    journal.close()
+
+
+@pytest.mark.parametrize("files, renames, finished, after", interrupted_cases())
+def test_recover_rollback_restores_the_tree(tmp_path, monkeypatch, files, renames, finished, after):
+    root = str(tmp_path / "root")
+    make_files(root, files)
+    original = contents(root)
+    journal_path = str(tmp_path / "journal.log")
+    crash_batch(monkeypatch, journal_path, root, renames, after)
+
+    journal = Journal(journal_path)
+    result = recover(journal, rollback=True)
+
+    assert not result.errors
+    assert contents(root) == original
+    assert journal.interrupted() is None
+    journal.close()
+
+
+@pytest.mark.parametrize("rollback", [False, True])
+@pytest.mark.parametrize("files, renames, finished, after", interrupted_cases())
+def test_recover_interrupted_undo(tmp_path, monkeypatch, files, renames, finished, after, rollback):
+    root = str(tmp_path / "root")
+    make_files(root, files)
+    original = contents(root)
+    journal_path = str(tmp_path / "journal.log")
+    crash_undo(monkeypatch, journal_path, root, renames, after)
+
+    journal = Journal(journal_path)
+    result = recover(journal, rollback=rollback)
+
+    assert not result.errors
+    # Finishing completes the undo; rolling back re-applies what it had undone
+    assert contents(root) == (finished if rollback else original)
+    assert journal.interrupted() is None
+    journal.close()
@@ -0,0 +1,98 @@
+"""Recursive renames of deep synthetic trees: deepest-first order and the undo round trip"""
+import os
+
+import pytest
+
+from renamer import RenameConfig, RenameEngine
+from renamer.journal import Journal, redo_last, undo_last
+
+
+def make_tree(root: str, depth: int, fanout: int = 2, files: int = 2) -> None:
+    """A full tree of the given depth, with files in every folder"""
+    for i in range(files):
+        open(os.path.join(root, f"file_{i}.txt"), "w").close()
+    if depth:
+        for i in range(fanout):
+            folder = os.path.join(root, f"dir_{i}")
+            os.mkdir(folder)
+            make_tree(folder, depth - 1, fanout, files)
+
+
+def listing(root: str) -> list:
+    return sorted(os.path.relpath(os.path.join(parent, name), root)
+                  for parent, folders, files in os.walk(root) for name in folders + files)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = str(tmp_path / "tree")
+    os.mkdir(root)
+    make_tree(root, depth=5)
+    return root
+
+
+def recursive_config(root: str, **options) -> RenameConfig:
+    return RenameConfig(directory=root, pattern="{orig_name}_r{counter}", recursive=True,
+                        include_folders=True, **options)
+
+
+def rename_tree(root: str, **options):
+    engine = RenameEngine(recursive_config(root, **options))
+    return engine.execute(engine.plan())
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_children_are_renamed_before_their_folder(tree, workers):
+    result = rename_tree(tree, workers=workers)
+
+    assert not result.errors
+    renamed_folders = set()
+    for _, old_path in result.batch:
+        parent = os.path.dirname(old_path)
+        while parent != tree:
+            assert parent not in renamed_folders, f"{old_path} renamed after its folder"
+            parent = os.path.dirname(parent)
+        renamed_folders.add(old_path)
+
+
+def test_every_entry_is_renamed_in_one_pass(tree):
+    before = listing(tree)
+    result = rename_tree(tree)
+
+    assert not result.errors
+    assert result.renamed == len(before)
+    assert all("_r" in os.path.basename(path) for path in listing(tree))
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_undo_restores_the_tree(tree, workers):
+    before = listing(tree)
+    result = rename_tree(tree, workers=workers)
+    assert listing(tree) != before
+
+    undo = RenameEngine.undo(result.batch, workers=workers)
+
+    assert not undo.errors
+    assert undo.renamed == len(before)
+    assert listing(tree) == before
+
+
+def test_journal_undo_and_redo_round_trip(tree, tmp_path):
+    before = listing(tree)
+    journal = Journal(str(tmp_path / "journal.log"))
+    try:
+        engine = RenameEngine(recursive_config(tree), journal)
+        engine.execute(engine.plan())
+        renamed = listing(tree)
+
+        undo = undo_last(journal)
+        assert not undo.errors
+        assert listing(tree) == before
+        assert journal.undoable() is None
+
+        redo = redo_last(journal)
+        assert not redo.errors
+        assert listing(tree) == renamed
+        assert journal.redoable() is None
+    finally:
+        journal.close()
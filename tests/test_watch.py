@@ -0,0 +1,87 @@
+"""The watch daemon's counter state and its use of the shared journal"""
+import json
+import os
+
+import pytest
+
+from renamer import RenameConfig, RenamerError
+from renamer.journal import Journal
+from renamer.watch import WatchDaemon
+
+
+@pytest.fixture
+def daemon_setup(tmp_path):
+    folder = tmp_path / "in"
+    folder.mkdir()
+    journal = Journal(str(tmp_path / "journal.log"))
+    daemon = WatchDaemon(RenameConfig(directory=str(folder), pattern="n_{counter}"), journal,
+                         state_path=str(tmp_path / "state.json"), poll=True)
+    yield daemon, journal, str(folder), str(tmp_path / "state.json")
+    daemon.close()
+    journal.close()
+
+
+def arrive(folder: str, name: str) -> str:
+    path = os.path.join(folder, name)
+    open(path, "w").close()
+    return path
+
+
+def saved_counter(state_path: str) -> int:
+    with open(state_path) as f:
+        return json.load(f)["counter"]
+
+
+def test_group_waits_while_another_process_has_a_batch_open(daemon_setup):
+    daemon, journal, folder, state_path = daemon_setup
+    other = Journal(journal.path)
+    batch_id = other.begin("another process")
+    path = arrive(folder, "a.txt")
+
+    with pytest.raises(RenamerError):
+        daemon.process([path])
+    assert os.listdir(folder) == ["a.txt"]
+    assert daemon.state.counter == 1
+    assert saved_counter(state_path) == 1
+
+    other.end(batch_id)
+    other.close()
+    result = daemon.process([path])
+    assert result.renamed == 1
+    assert os.listdir(folder) == ["n_001.txt"]
+    assert saved_counter(state_path) == 2
+
+
+def test_counter_is_reserved_before_renaming(daemon_setup, monkeypatch):
+    daemon, journal, folder, state_path = daemon_setup
+    paths = [arrive(folder, f"{name}.txt") for name in "abc"]
+
+    def crash(ops, progress=None):
+        # The state file must already cover this group when the renames start
+        assert saved_counter(state_path) == 4
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(daemon.engine, "execute", crash)
+    with pytest.raises(KeyboardInterrupt):
+        daemon.process(paths)
+    assert saved_counter(state_path) == 4
+
+
+def record_batch(journal: Journal, description: str) -> None:
+    batch_id = journal.begin(description)
+    journal.record_planned(batch_id, [("/elsewhere/old", "/elsewhere/new", None)])
+    journal.end(batch_id)
+
+
+def test_history_of_other_runs_is_kept(daemon_setup):
+    daemon, journal, folder, state_path = daemon_setup
+    other = Journal(journal.path)
+    record_batch(other, "another process")
+    for i in range(5):
+        daemon.process([arrive(folder, f"file_{i}.txt")])
+    record_batch(other, "another process, later")
+    other.close()
+
+    descriptions = [batch.description for batch in Journal(journal.path).batches()]
+    assert descriptions[0] == "another process" and descriptions[-1] == "another process, later"
+    assert len(descriptions) == 7